@@ -15,15 +15,28 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 
+import atexit
 import json
 import datetime
 import os
+import queue
+import threading
+from app.services.utils.metrics import Timed
 
 
 LOG_FILE_PATH = 'logs/log.txt'
+LOG_LEVELS = ['INFO', 'OK', 'WARNING', 'ERROR']  # From least to most severe
+LOG_MIN_LEVEL = 'INFO'
+LOG_FORMAT = 'text'
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUPS = 5
+LOG_BATCH_SIZE = 500
 
+_log_lock = threading.Lock()
+_log_state = {'pid': None, 'queue': None}
 
-def DictionarySaveJSON(dictionary: dict, name_folder: str, name_file: str):
+
+def DictionarySaveJSON(dictionary: dict, name_folder: str, name_file: str, platform: str = None):
     """
     Saves a dictionary to a JSON file.
 
@@ -31,14 +44,18 @@ def DictionarySaveJSON(dictionary: dict, name_folder: str, name_file: str):
         dictionary (dict): The dictionary to be saved.
         name_folder (str): The folder where the JSON file will be saved.
         name_file (str): The name of the JSON file to be saved.
+        platform (str, optional): The platform whose stage metrics time the save. Defaults to the
+                                  platform of the run.
 
     Example:
         >>> DictionarySaveJSON({'name': 'I', 'age': 29}, 'my_folder', 'my_dictionary.json')
     """
     try:
         output_path = os.path.join(name_folder, name_file)
-        with open(output_path, 'w', encoding='utf-8') as file:
-            json.dump(dictionary, file, ensure_ascii=False, indent=4)
+        with Timed('serialize', platform):
+            content = json.dumps(dictionary, ensure_ascii=False, indent=4)
+        with Timed('write', platform), open(output_path, 'w', encoding='utf-8') as file:
+            file.write(content)
         LogMessage('OK', f"Data saved successfully in {output_path}.")
     except Exception as error:
         LogMessage('ERROR', f"An error occurred while saving the dictionary: {error}")
@@ -48,8 +65,10 @@ def LogMessage(level: str, message: str):
     """
     Logs a message with a specified level and timestamps it.
 
-    This function prints the log message to the console and appends it to a log file.
-    The log entry includes the timestamp, log level, and the message.
+    This function prints the log message to the console and queues it to be appended to the
+    log file by a background thread, so the caller never waits on disk I/O. Messages below
+    `LOG_MIN_LEVEL` are dropped. The log entry includes the timestamp, log level, and the
+    message, as plain text or as a JSON line depending on `LOG_FORMAT`.
 
     Args:
         level (str): The severity level of the log (e.g., 'INFO', 'WARNING', 'ERROR', 'OK').
@@ -58,8 +77,118 @@ def LogMessage(level: str, message: str):
     Example:
         >>> LogMessage("OK", "Processing complete.")
     """
+    if level in LOG_LEVELS and LOG_LEVELS.index(level) < LOG_LEVELS.index(LOG_MIN_LEVEL):
+        return
     timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_entry = f"[{timestamp}] [{level}] {message}"    
+    log_entry = f"[{timestamp}] [{level}] {message}"
     print(log_entry)
-    with open(LOG_FILE_PATH, 'a', encoding='utf-8') as log_file:
-        log_file.write(log_entry + '\n')
+    if LOG_FORMAT == 'json':
+        log_entry = json.dumps({'timestamp': timestamp, 'level': level, 'message': message}, ensure_ascii=False)
+    _log_queue().put((LOG_FILE_PATH, log_entry))
+
+
+def ConfigureLogging(level: str = None, log_format: str = None, max_bytes: int = None, backups: int = None):
+    """
+    Changes the settings used by `LogMessage`.
+
+    Args:
+        level (str, optional): Minimum level written, one of `LOG_LEVELS`.
+        log_format (str, optional): 'text' for plain lines or 'json' for JSON lines.
+        max_bytes (int, optional): Size in bytes after which the log file is rotated.
+        backups (int, optional): Number of rotated log files kept.
+
+    Example:
+        >>> ConfigureLogging(level='WARNING', log_format='json')
+    """
+    global LOG_MIN_LEVEL, LOG_FORMAT, LOG_MAX_BYTES, LOG_BACKUPS
+    if level:
+        if level not in LOG_LEVELS:
+            raise ValueError(f"Unknown log level: '{level}'.")
+        LOG_MIN_LEVEL = level
+    if log_format:
+        if log_format not in ['text', 'json']:
+            raise ValueError(f"Unknown log format: '{log_format}'.")
+        LOG_FORMAT = log_format
+    if max_bytes:
+        LOG_MAX_BYTES = max_bytes
+    if backups is not None:
+        LOG_BACKUPS = backups
+
+
+def FlushLogs():
+    """
+    Waits until every queued log entry has been written to disk.
+    """
+    if _log_state['queue'] is not None and _log_state['pid'] == os.getpid():
+        _log_state['queue'].join()
+
+
+def _log_queue() -> queue.Queue:
+    """
+    Returns the queue of pending log entries, starting the writer thread if needed.
+
+    The writer is restarted after a fork, since threads are not inherited by child processes.
+
+    Returns:
+        queue.Queue: The queue consumed by `_log_writer`.
+    """
+    if _log_state['pid'] != os.getpid():
+        with _log_lock:
+            if _log_state['pid'] != os.getpid():
+                _log_state['queue'] = queue.Queue()
+                threading.Thread(target=_log_writer, args=(_log_state['queue'],), daemon=True).start()
+                _log_state['pid'] = os.getpid()
+    return _log_state['queue']
+
+
+def _log_writer(entries: queue.Queue):
+    """
+    Writes queued log entries to their files in batches.
+
+    Args:
+        entries (queue.Queue): Queue of (path, entry) tuples.
+    """
+    while True:
+        batch = [entries.get()]
+        while len(batch) < LOG_BATCH_SIZE:
+            try:
+                batch.append(entries.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            lines = {}
+            for path, entry in batch:
+                lines.setdefault(path, []).append(entry + '\n')
+            for path, path_lines in lines.items():
+                _rotate_log(path)
+                with open(path, 'a', encoding='utf-8') as log_file:
+                    log_file.writelines(path_lines)
+        except Exception as error:
+            print(f"Could not write the log file: {error}")
+        finally:
+            for _ in batch:
+                entries.task_done()
+
+
+def _rotate_log(path: str):
+    """
+    Rotates a log file once it exceeds `LOG_MAX_BYTES`.
+
+    The file is renamed to 'path.1', the previous 'path.1' to 'path.2' and so on, keeping
+    `LOG_BACKUPS` files.
+
+    Args:
+        path (str): Path of the log file.
+    """
+    if not os.path.isfile(path) or os.path.getsize(path) < LOG_MAX_BYTES:
+        return
+    for index in range(LOG_BACKUPS - 1, 0, -1):
+        if os.path.isfile(f'{path}.{index}'):
+            os.replace(f'{path}.{index}', f'{path}.{index + 1}')
+    if LOG_BACKUPS > 0:
+        os.replace(path, f'{path}.1')
+    else:
+        os.remove(path)
+
+
+atexit.register(FlushLogs)
@@ -0,0 +1,150 @@
+# Digimonitor is part of the DIGIBOOK collection.
+# DIGIBOOK Copyright (C) 2024 Daniel Alcalá.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import datetime
+import gzip
+import json
+import os
+
+try:
+    import zstandard
+except ImportError:  # Optional, the snapshots are compressed with gzip without it
+    zstandard = None
+
+
+DEFAULT_ARCHIVE_PATH = 'data/archive'
+INDEX_FILE = 'index.jsonl'
+
+# Platforms whose pages hold the extracted data once the extraction ends; a Twitch chat is live
+ARCHIVED_PLATFORMS = ('youtube', 'tiktok')
+
+
+class SnapshotArchive:
+    def __init__(self, root: str = DEFAULT_ARCHIVE_PATH):
+        """
+        Initializes the archive of the pages scraped, kept so the extractors can be run again offline.
+
+        Each snapshot is the HTML of the page when its extraction ended, compressed with zstd if the
+        `zstandard` package is installed and with gzip otherwise, and saved as
+        '{root}/{platform}/{content_id}/{time}.html.zst' (or '.html.gz'). Every snapshot is also
+        appended to '{root}/index.jsonl' with its platform, content ID, URL and time.
+
+        Args:
+            root (str, optional): The folder of the archive. Defaults to `DEFAULT_ARCHIVE_PATH`.
+
+        Example:
+            >>> archive = SnapshotArchive()
+            >>> archive.Save('youtube', 'abc', 'https://www.youtube.com/watch?v=abc', '<html>...</html>')
+        """
+        self.root = root
+
+
+    def Save(self, platform: str, content_id: str, url: str, html: str) -> str:
+        """
+        Compresses and saves the snapshot of a page.
+
+        Args:
+            platform (str): The platform of the page.
+            content_id (str): The ID of the content, see `CanonicalURL`.
+            url (str): The URL of the page.
+            html (str): The HTML of the page.
+
+        Returns:
+            str: The path of the snapshot.
+        """
+        captured = datetime.datetime.now()
+        folder = os.path.join(self.root, platform, content_id)
+        os.makedirs(folder, exist_ok=True)
+        extension = '.html.zst' if zstandard else '.html.gz'
+        path = os.path.join(folder, captured.strftime("%Y-%m-%d_%H_%M_%S") + extension)
+        data = html.encode('utf-8')
+        with open(path, 'wb') as file:
+            file.write(zstandard.ZstdCompressor().compress(data) if zstandard else gzip.compress(data))
+        entry = {
+            'platform': platform,
+            'content_id': content_id,
+            'url': url,
+            'captured': captured.strftime("%Y-%m-%d %H:%M:%S"),
+            'path': os.path.relpath(path, self.root),
+        }
+        # One write per line, so the workers of a run can share the index
+        with open(os.path.join(self.root, INDEX_FILE), 'a', encoding='utf-8') as index:
+            index.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        return path
+
+
+    def Entries(self, platform: str = None, latest: bool = False) -> list:
+        """
+        Returns the snapshots of the archive.
+
+        Args:
+            platform (str, optional): Only the snapshots of this platform.
+            latest (bool, optional): Only the last snapshot of each content. Defaults to False.
+
+        Returns:
+            list of dict: The index entries, oldest first, with the keys 'platform', 'content_id',
+                          'url', 'captured' and 'path' (relative to the archive folder).
+        """
+        index_path = os.path.join(self.root, INDEX_FILE)
+        if not os.path.isfile(index_path):
+            return []
+        entries = []
+        with open(index_path, 'r', encoding='utf-8') as index:
+            for line in index:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # A line cut by an interrupted run
+                if platform is None or entry.get('platform') == platform:
+                    entries.append(entry)
+        if latest:
+            entries = list({(entry['platform'], entry['content_id']): entry for entry in entries}.values())
+        return entries
+
+
+    def Load(self, entry: dict) -> str:
+        """
+        Reads the HTML of a snapshot.
+
+        Args:
+            entry (dict): An entry returned by `Entries`.
+
+        Returns:
+            str: The HTML of the page.
+        """
+        return ReadSnapshot(os.path.join(self.root, entry['path']))
+
+
+def ReadSnapshot(path: str) -> str:
+    """
+    Decompresses a snapshot file saved by `SnapshotArchive.Save`.
+
+    Args:
+        path (str): The path of the snapshot.
+
+    Returns:
+        str: The HTML of the page.
+    """
+    with open(path, 'rb') as file:
+        data = file.read()
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError(f"The zstandard package is needed to read '{path}'.")
+        data = zstandard.ZstdDecompressor().decompress(data)
+    elif path.endswith('.gz'):
+        data = gzip.decompress(data)
+    return data.decode('utf-8')
@@ -0,0 +1,112 @@
+# Digimonitor is part of the DIGIBOOK collection.
+# DIGIBOOK Copyright (C) 2024 Daniel Alcalá.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import datetime
+import os
+import sqlite3
+import time
+
+
+# Platforms whose results can be reused; a Twitch chat is live, so it is always captured again
+CACHED_PLATFORMS = ('youtube', 'tiktok')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    platform TEXT NOT NULL,
+    content_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    output TEXT,
+    scraped REAL NOT NULL,
+    updated TEXT,
+    PRIMARY KEY (platform, content_id)
+)
+"""
+
+
+class ResultCache:
+    def __init__(self, path: str):
+        """
+        Opens the index of the results already extracted, keyed by platform and content ID.
+
+        The index is a table of a SQLite file, usually the file of the job store. It keeps, for
+        each video, the URL that was processed, the path of its output and when it was extracted,
+        so a later run can skip the content extracted recently whatever URL points to it.
+
+        Args:
+            path (str): Path of the SQLite file.
+
+        Example:
+            >>> cache = ResultCache('data/jobs.sqlite3')
+            >>> cache.Fresh('youtube', ['abc'], ttl=3600)
+            {}
+        """
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute(_SCHEMA)
+
+
+    def Record(self, platform: str, content_id: str, url: str, output: str = None) -> None:
+        """
+        Records that a content has just been extracted.
+
+        Args:
+            platform (str): The platform of the content.
+            content_id (str): The ID of the content, see `CanonicalURL`.
+            url (str): The URL that was processed.
+            output (str, optional): The path of the file with the extracted data.
+        """
+        if platform not in CACHED_PLATFORMS or not content_id:
+            return
+        self.connection.execute(
+            "INSERT OR REPLACE INTO results (platform, content_id, url, output, scraped, updated) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (platform, content_id, url, output, time.time(), datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        )
+
+
+    def Fresh(self, platform: str, content_ids: list, ttl: float) -> dict:
+        """
+        Returns the contents extracted less than `ttl` seconds ago.
+
+        Args:
+            platform (str): The platform of the contents.
+            content_ids (list of str): The IDs to look up.
+            ttl (float): Seconds during which a result is considered fresh.
+
+        Returns:
+            dict: The output path of each fresh content, by content ID.
+        """
+        if platform not in CACHED_PLATFORMS:
+            return {}
+        wanted = set(content_ids)
+        rows = self.connection.execute(
+            "SELECT content_id, output FROM results WHERE platform = ? AND scraped >= ?",
+            (platform, time.time() - ttl)
+        )
+        return {row['content_id']: row['output'] for row in rows if row['content_id'] in wanted}
+
+
+    def Close(self) -> None:
+        """
+        Closes the connection to the index.
+        """
+        self.connection.close()
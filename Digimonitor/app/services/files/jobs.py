@@ -0,0 +1,234 @@
+# Digimonitor is part of the DIGIBOOK collection.
+# DIGIBOOK Copyright (C) 2024 Daniel Alcalá.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import datetime
+import os
+import sqlite3
+import time
+
+
+DEFAULT_JOBS_PATH = 'data/jobs.sqlite3'
+
+RETRY_BASE = 30  # Seconds before the first retry of a failed URL
+RETRY_MAX = 900  # Upper bound of the wait between retries
+
+RETRYABLE_STATUSES = ('pending', 'error', 'blocked')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    url TEXT NOT NULL,
+    platform TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    tries INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    output TEXT,
+    next_attempt REAL NOT NULL DEFAULT 0,
+    updated TEXT,
+    PRIMARY KEY (url, platform)
+)
+"""
+
+
+class JobStore:
+    def __init__(self, path: str = DEFAULT_JOBS_PATH):
+        """
+        Opens the SQLite store that records the state of each URL of the batch runs.
+
+        Each job keeps its status ('pending', 'running', 'ok', 'error' or 'blocked'), the number of
+        attempts over every run, the tries of the current run, the last error, the output path and
+        the time of its next attempt. Several processes can use the same store.
+
+        Args:
+            path (str, optional): Path of the SQLite file. Defaults to `DEFAULT_JOBS_PATH`.
+
+        Example:
+            >>> store = JobStore()
+            >>> store.Add(['https://www.youtube.com/watch?v=abc'], 'youtube', resume=True)
+        """
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute(_SCHEMA)
+
+
+    def Add(self, urls: list, platform: str, resume: bool = False) -> None:
+        """
+        Registers the URLs of a run.
+
+        Without `resume` every URL starts again from scratch. With `resume` the URLs already done
+        are kept, and the failed ones, or those left running by a run that died, are retried now.
+
+        Args:
+            urls (list of str): The URLs of the run.
+            platform (str): The platform of the URLs.
+            resume (bool, optional): Keep the work of previous runs. Defaults to False.
+        """
+        now = _now()
+        self.connection.execute('BEGIN')
+        try:
+            if resume:
+                self.connection.executemany(
+                    "INSERT OR IGNORE INTO jobs (url, platform, updated) VALUES (?, ?, ?)",
+                    [(url, platform, now) for url in urls]
+                )
+                self.connection.executemany(
+                    "UPDATE jobs SET status = 'pending', tries = 0, next_attempt = 0, updated = ? "
+                    "WHERE url = ? AND platform = ? AND status != 'ok'",
+                    [(now, url, platform) for url in urls]
+                )
+            else:
+                self.connection.executemany(
+                    "INSERT INTO jobs (url, platform, updated) VALUES (?, ?, ?) "
+                    "ON CONFLICT (url, platform) DO UPDATE SET status = 'pending', attempts = 0, tries = 0, "
+                    "last_error = NULL, output = NULL, next_attempt = 0, updated = excluded.updated",
+                    [(url, platform, now) for url in urls]
+                )
+            self.connection.execute('COMMIT')
+        except Exception:
+            self.connection.execute('ROLLBACK')
+            raise
+
+
+    def Remaining(self, urls: list, platform: str) -> list:
+        """
+        Returns the URLs that are not done yet, in their original order.
+
+        Args:
+            urls (list of str): The URLs of the run.
+            platform (str): The platform of the URLs.
+
+        Returns:
+            list of str: The URLs whose status is not 'ok'.
+        """
+        done = {
+            row['url'] for row in
+            self.connection.execute("SELECT url FROM jobs WHERE platform = ? AND status = 'ok'", (platform,))
+        }
+        return [url for url in urls if url not in done]
+
+
+    def Next(self, urls: list, platform: str, max_tries: int) -> tuple:
+        """
+        Returns the URLs of a run that can be attempted now.
+
+        Args:
+            urls (list of str): The URLs of the run.
+            platform (str): The platform of the URLs.
+            max_tries (int): Attempts allowed for a URL in this run.
+
+        Returns:
+            tuple: The list of URLs due now, in their original order, and the seconds until the next
+                   retry is due, or None if no retry is left.
+        """
+        rows = self.connection.execute(
+            f"SELECT url, next_attempt FROM jobs WHERE platform = ? AND tries < ? "
+            f"AND status IN ({', '.join('?' for _ in RETRYABLE_STATUSES)})",
+            (platform, max_tries, *RETRYABLE_STATUSES)
+        )
+        next_attempts = {row['url']: row['next_attempt'] for row in rows}
+        now = time.time()
+        due = [url for url in urls if next_attempts.get(url, now + 1) <= now]
+        waits = [next_attempts[url] - now for url in urls if next_attempts.get(url, 0) > now]
+        return due, (min(waits) if waits else None)
+
+
+    def Start(self, url: str, platform: str) -> None:
+        """
+        Marks a URL as running and counts the attempt.
+
+        Args:
+            url (str): The URL.
+            platform (str): The platform of the URL.
+        """
+        self.connection.execute(
+            "UPDATE jobs SET status = 'running', attempts = attempts + 1, tries = tries + 1, updated = ? "
+            "WHERE url = ? AND platform = ?",
+            (_now(), url, platform)
+        )
+
+
+    def Finish(self, url: str, platform: str, output: str = None) -> None:
+        """
+        Marks a URL as done.
+
+        Args:
+            url (str): The URL.
+            platform (str): The platform of the URL.
+            output (str, optional): The path of the file with the extracted data.
+        """
+        self.connection.execute(
+            "UPDATE jobs SET status = 'ok', output = ?, last_error = NULL, updated = ? WHERE url = ? AND platform = ?",
+            (output, _now(), url, platform)
+        )
+
+
+    def Fail(self, url: str, platform: str, error: str, status: str = 'error') -> float:
+        """
+        Records a failed attempt and schedules the next one with an exponential backoff.
+
+        Args:
+            url (str): The URL.
+            platform (str): The platform of the URL.
+            error (str): The error of the attempt.
+            status (str, optional): 'error', or 'blocked' for a captcha or login wall. Defaults to 'error'.
+
+        Returns:
+            float: The seconds until the URL can be retried.
+        """
+        row = self.connection.execute(
+            "SELECT tries FROM jobs WHERE url = ? AND platform = ?", (url, platform)
+        ).fetchone()
+        tries = row['tries'] if row else 1
+        delay = min(RETRY_MAX, RETRY_BASE * 2 ** max(0, tries - 1))
+        self.connection.execute(
+            "UPDATE jobs SET status = ?, last_error = ?, next_attempt = ?, updated = ? WHERE url = ? AND platform = ?",
+            (status, error, time.time() + delay, _now(), url, platform)
+        )
+        return delay
+
+
+    def Get(self, url: str, platform: str) -> dict:
+        """
+        Returns the state of a URL.
+
+        Args:
+            url (str): The URL.
+            platform (str): The platform of the URL.
+
+        Returns:
+            dict: The columns of the job, or None if the URL is not registered.
+        """
+        row = self.connection.execute(
+            "SELECT * FROM jobs WHERE url = ? AND platform = ?", (url, platform)
+        ).fetchone()
+        return dict(row) if row else None
+
+
+    def Close(self) -> None:
+        """
+        Closes the connection to the store.
+        """
+        self.connection.close()
+
+
+def _now() -> str:
+    return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
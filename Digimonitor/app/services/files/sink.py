@@ -0,0 +1,176 @@
+# Digimonitor is part of the DIGIBOOK collection.
+# DIGIBOOK Copyright (C) 2024 Daniel Alcalá.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import csv
+import datetime
+import json
+import os
+import time
+from app.services.files.actions import LogMessage
+
+
+class AppendOnlyWriter:
+    def __init__(self, name_folder: str, name_file: str, columns: list, flush_every: int = 200,
+                 flush_interval: float = 5.0, rotate_bytes: int = None, rotate_hourly: bool = False):
+        """
+        Initializes a writer that appends rows to a CSV or JSON lines file through an open handle.
+
+        Rows are buffered by the file object and flushed every `flush_every` rows or every
+        `flush_interval` seconds, whichever comes first, so the cost of a flush does not depend
+        on how much was already written. The file is rotated when it reaches `rotate_bytes` or,
+        with `rotate_hourly`, when the hour changes.
+
+        Args:
+            name_folder (str): The folder where the files will be saved.
+            name_file (str): The name of the file; its extension ('.csv' or '.jsonl') selects the format.
+            columns (list of str): The names of the columns, in order.
+            flush_every (int, optional): Rows written between flushes. Defaults to 200.
+            flush_interval (float, optional): Seconds between flushes. Defaults to 5.0.
+            rotate_bytes (int, optional): Size after which a new file is started. Defaults to None (never).
+            rotate_hourly (bool, optional): Start a new file every hour. Defaults to False.
+
+        Example:
+            >>> with AppendOnlyWriter('data/twitch', 'chat.csv', ['username', 'comment']) as writer:
+            ...     writer.Write({'username': 'I', 'comment': 'Hi'})
+        """
+        self.name_folder = name_folder
+        self.stem, self.extension = os.path.splitext(name_file)
+        if self.extension not in ['.csv', '.jsonl']:
+            raise ValueError(f"Unsupported file format: '{self.extension}'.")
+        self.columns = columns
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.rotate_bytes = rotate_bytes
+        self.rotate_hourly = rotate_hourly
+        self.count = 0
+        self.path = None
+        self.file = None
+        self.writer = None
+        self.part = 0
+        self.hour = None
+        self.pending = 0
+        self.last_flush = time.monotonic()
+        os.makedirs(name_folder, exist_ok=True)
+
+
+    def Write(self, row: dict) -> None:
+        """
+        Appends a row to the current file.
+
+        Args:
+            row (dict): The values of the row, keyed by column name.
+        """
+        if self.file is None or self._needs_rotation():
+            self._open()
+        if self.writer:
+            self.writer.writerow([row.get(column) for column in self.columns])
+        else:
+            self.file.write(json.dumps({column: row.get(column) for column in self.columns}, ensure_ascii=False) + '\n')
+        self.count += 1
+        self.pending += 1
+        if self.pending >= self.flush_every:
+            self.Flush()
+        else:
+            self.FlushIfDue()
+
+
+    def WriteMany(self, rows: list) -> None:
+        """
+        Appends several rows to the current file.
+
+        Args:
+            rows (list of dict): The rows to append.
+        """
+        for row in rows:
+            self.Write(row)
+
+
+    def FlushIfDue(self) -> None:
+        """
+        Writes the buffered rows to disk if `flush_interval` seconds have passed since the last flush.
+
+        Capture loops also call it while no rows arrive, so the rows of a quiet source do not wait
+        in memory for the next row.
+        """
+        if self.pending and time.monotonic() - self.last_flush >= self.flush_interval:
+            self.Flush()
+
+
+    def Flush(self) -> None:
+        """
+        Writes the buffered rows to disk.
+        """
+        if self.file:
+            self.file.flush()
+        self.pending = 0
+        self.last_flush = time.monotonic()
+
+
+    def Close(self) -> None:
+        """
+        Flushes and closes the current file.
+        """
+        if self.file:
+            self.Flush()
+            self.file.close()
+            LogMessage('OK', f"{self.count} rows saved, last file {self.path}.")
+        self.file = None
+        self.writer = None
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.Close()
+
+
+    def _needs_rotation(self) -> bool:
+        """
+        Checks whether the current file has to be closed and a new one started.
+
+        Returns:
+            bool: True if the file reached `rotate_bytes` or the hour changed.
+        """
+        if self.rotate_hourly and self.hour != datetime.datetime.now().strftime("%Y-%m-%d_%H"):
+            return True
+        return bool(self.rotate_bytes and self.file.tell() >= self.rotate_bytes)
+
+
+    def _open(self) -> None:
+        """
+        Opens the next file in append mode and writes the CSV header if the file is new.
+        """
+        hour = datetime.datetime.now().strftime("%Y-%m-%d_%H")
+        if self.file:
+            self.Close()
+            self.part = 0 if self.rotate_hourly and hour != self.hour else self.part + 1
+        self.hour = hour
+        name = self.stem
+        if self.rotate_hourly:
+            name += f'_{self.hour}'
+        if self.part:
+            name += f'_{self.part:03d}'
+        self.path = os.path.join(self.name_folder, name + self.extension)
+        is_new = not os.path.isfile(self.path) or os.path.getsize(self.path) == 0
+        self.file = open(self.path, 'a', encoding='utf-8', newline='')
+        if self.extension == '.csv':
+            self.writer = csv.writer(self.file)
+            if is_new:
+                self.writer.writerow(self.columns)
+        LogMessage('OK', f"Writing rows to {self.path}.")
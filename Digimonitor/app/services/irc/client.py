@@ -0,0 +1,332 @@
+# Digimonitor is part of the DIGIBOOK collection.
+# DIGIBOOK Copyright (C) 2024 Daniel Alcalá.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import asyncio
+import datetime
+import random
+import ssl
+from urllib.parse import urlparse
+from app.services.files.actions import LogMessage
+from app.services.files.sink import AppendOnlyWriter
+from app.services.utils.chat import CHAT_COLUMNS
+
+
+TWITCH_IRC_SERVER = 'ircs://irc.chat.twitch.tv:6697'
+
+JOIN_BATCH = 20  # Channels joined per JOIN command
+JOIN_INTERVAL = 10.5  # Seconds between JOIN commands, below the anonymous join limit
+READ_TIMEOUT = 360  # Seconds without any line, including PINGs, after which the connection is dead
+MAX_RECONNECT_DELAY = 60  # Upper bound of the reconnection backoff in seconds
+
+# Unescaping of IRCv3 tag values
+_TAG_ESCAPES = {':': ';', 's': ' ', '\\': '\\', 'r': '\r', 'n': '\n'}
+
+
+class ChatSinkError(OSError):
+    """
+    Raised when a chat message cannot be saved, such as when its file cannot be opened. The client
+    stops instead of reconnecting, since a new connection does not fix the storage.
+    """
+
+
+class TwitchChatClient:
+    def __init__(self, channels: list, on_message, server: str = TWITCH_IRC_SERVER, nickname: str = None,
+                 token: str = None):
+        """
+        Initializes an asyncio client of the Twitch chat over IRC.
+
+        A single connection follows every channel. Without a token the client logs in anonymously,
+        which is enough to read the chat. The connection is opened again with an exponential backoff
+        when it drops or the server asks for a reconnection.
+
+        Args:
+            channels (list of str): The channels to follow, with or without '#'.
+            on_message (callable): Receives the channel and a dict with 'username', 'comment',
+                                   'badges' and 'timestamp_client' for every chat message.
+            server (str, optional): 'ircs://host:port' for TLS or 'irc://host:port' for plain TCP,
+                                    such as a local stand-in server. Defaults to `TWITCH_IRC_SERVER`.
+            nickname (str, optional): The login name. Defaults to an anonymous 'justinfan' name.
+            token (str, optional): An OAuth token for the nickname. Defaults to None.
+
+        Example:
+            >>> client = TwitchChatClient(['somechannel'], lambda channel, message: print(message))
+            >>> asyncio.run(client.Run())
+        """
+        parsed = urlparse(server)
+        if parsed.scheme not in ['irc', 'ircs'] or not parsed.hostname:
+            raise ValueError(f"Unsupported IRC server: '{server}'.")
+        self.channels = [channel.lower().lstrip('#') for channel in channels]
+        self.on_message = on_message
+        self.host = parsed.hostname
+        self.tls = parsed.scheme == 'ircs'
+        self.port = parsed.port or (6697 if self.tls else 6667)
+        self.nickname = nickname or f'justinfan{random.randint(10000, 99999)}'
+        self.token = token
+        self.count = 0
+        self.welcomed = False
+        self.joiner = None
+
+
+    async def Run(self) -> None:
+        """
+        Follows the channels until the task is cancelled.
+
+        Raises:
+            PermissionError: If the server rejects the login.
+            ChatSinkError: If `on_message` cannot save a message.
+        """
+        delay = 1
+        while True:
+            self.welcomed = False
+            try:
+                await self._session()
+            except (PermissionError, ChatSinkError):
+                raise
+            except (OSError, ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError) as error:
+                LogMessage("WARNING", f"Twitch chat connection lost: {str(error) or type(error).__name__}.")
+            if self.welcomed:
+                delay = 1
+            LogMessage("INFO", f"Reconnecting to the Twitch chat in {delay} seconds.")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+
+    async def _session(self) -> None:
+        """
+        Opens a connection, logs in and reads lines until the connection ends.
+
+        The channels are joined once the server welcomes the client, see `_handle`.
+        """
+        context = ssl.create_default_context() if self.tls else None
+        reader, writer = await asyncio.open_connection(self.host, self.port, ssl=context)
+        try:
+            self._send(writer, f'PASS oauth:{self.token}' if self.token else 'PASS SCHMOOPIIE')
+            self._send(writer, f'NICK {self.nickname}')
+            self._send(writer, 'CAP REQ :twitch.tv/tags twitch.tv/commands')
+            await writer.drain()
+            while True:
+                line = await asyncio.wait_for(reader.readline(), READ_TIMEOUT)
+                if not line:
+                    raise ConnectionError("closed by the server")
+                self._handle(ParseIRCMessage(line.decode('utf-8', errors='replace').rstrip('\r\n')), writer)
+                await writer.drain()
+        finally:
+            if self.joiner:
+                self.joiner.cancel()
+                self.joiner = None
+            writer.close()
+
+
+    async def _join(self, writer: asyncio.StreamWriter) -> None:
+        """
+        Joins the channels in batches of `JOIN_BATCH`, waiting `JOIN_INTERVAL` seconds between batches.
+
+        Args:
+            writer (asyncio.StreamWriter): The stream of the connection.
+        """
+        for index in range(0, len(self.channels), JOIN_BATCH):
+            if index:
+                await asyncio.sleep(JOIN_INTERVAL)
+            batch = self.channels[index:index + JOIN_BATCH]
+            self._send(writer, 'JOIN ' + ','.join(f'#{channel}' for channel in batch))
+            await writer.drain()
+            LogMessage("OK", f"Joined the Twitch chat of {', '.join(batch)}.")
+
+
+    def _handle(self, message: dict, writer: asyncio.StreamWriter) -> None:
+        """
+        Answers the server commands and passes the chat messages to `on_message`.
+
+        Args:
+            message (dict): A message parsed with `ParseIRCMessage`.
+            writer (asyncio.StreamWriter): The stream of the connection.
+        """
+        command, params = message['command'], message['params']
+        if command == 'PING':
+            self._send(writer, 'PONG :' + (params[0] if params else 'tmi.twitch.tv'))
+        elif command == 'RECONNECT':
+            raise ConnectionError("reconnection requested by the server")
+        elif command == 'NOTICE' and params and 'authentication failed' in params[-1].lower():
+            raise PermissionError(f"Twitch chat login rejected: {params[-1]}")
+        elif command == '001':
+            self.welcomed = True
+            LogMessage("OK", f"Connected to the Twitch chat at {self.host}:{self.port}.")
+            # Commands sent before the registration is complete may be dropped by the server
+            if self.joiner is None:
+                self.joiner = asyncio.ensure_future(self._join(writer))
+        elif command == 'PRIVMSG' and len(params) == 2:
+            tags = message['tags']
+            text = params[1]
+            if text.startswith('\x01ACTION ') and text.endswith('\x01'):
+                text = text[8:-1]
+            username = tags.get('display-name') or (message['prefix'] or '').split('!')[0]
+            sent = tags.get('tmi-sent-ts')
+            timestamp_client = (datetime.datetime.fromtimestamp(int(sent) / 1000, datetime.timezone.utc).isoformat()
+                                if sent and sent.isdigit() else None)
+            self.count += 1
+            try:
+                self.on_message(params[0].lstrip('#'), {
+                    'username': username,
+                    'comment': text,
+                    'badges': tags.get('badges'),
+                    'timestamp_client': timestamp_client
+                })
+            except OSError as error:
+                raise ChatSinkError(f"The chat of {params[0]} could not be saved: {error}") from error
+
+
+    @staticmethod
+    def _send(writer: asyncio.StreamWriter, line: str) -> None:
+        writer.write((line + '\r\n').encode('utf-8'))
+
+
+def ParseIRCMessage(line: str) -> dict:
+    """
+    Parses a line of the IRC protocol with IRCv3 tags.
+
+    Args:
+        line (str): The line without the trailing CRLF.
+
+    Returns:
+        dict: The 'tags' (dict), 'prefix' (str or None), 'command' (str) and 'params' (list of str).
+
+    Example:
+        >>> ParseIRCMessage('@display-name=Foo :foo!foo@foo.tmi.twitch.tv PRIVMSG #bar :Hi there')['params']
+        ['#bar', 'Hi there']
+    """
+    tags = {}
+    if line.startswith('@'):
+        raw_tags, _, line = line[1:].partition(' ')
+        for item in raw_tags.split(';'):
+            key, _, value = item.partition('=')
+            tags[key] = _unescape_tag(value)
+    prefix = None
+    if line.startswith(':'):
+        prefix, _, line = line[1:].partition(' ')
+    line, separator, trailing = line.partition(' :')
+    params = line.split()
+    command = params.pop(0).upper() if params else ''
+    if separator:
+        params.append(trailing)
+    return {'tags': tags, 'prefix': prefix, 'command': command, 'params': params}
+
+
+def _unescape_tag(value: str) -> str:
+    """
+    Unescapes the value of an IRCv3 tag, such as '\\s' for a space.
+
+    Args:
+        value (str): The escaped value.
+
+    Returns:
+        str: The unescaped value.
+    """
+    if '\\' not in value:
+        return value
+    result, index = [], 0
+    while index < len(value):
+        if value[index] == '\\' and index + 1 < len(value):
+            result.append(_TAG_ESCAPES.get(value[index + 1], value[index + 1]))
+            index += 2
+        else:
+            if value[index] != '\\':
+                result.append(value[index])
+            index += 1
+    return ''.join(result)
+
+
+def TwitchChannelFromURL(url: str) -> str:
+    """
+    Returns the channel of a Twitch URL, such as 'somechannel' for 'https://www.twitch.tv/somechannel'.
+
+    Args:
+        url (str): The URL of the channel.
+
+    Returns:
+        str: The channel name in lower case.
+    """
+    path = urlparse(url if '://' in url else 'https://' + url).path
+    channel = path.strip('/').split('/')[0].lower()
+    if not channel:
+        raise ValueError(f"URL without a Twitch channel: '{url}'.")
+    return channel
+
+
+def FollowTwitchChats(channels: list, name_folder: str, name_files: dict, server: str = TWITCH_IRC_SERVER,
+                      rotate_bytes: int = None, rotate_hourly: bool = False, columns: list = CHAT_COLUMNS) -> dict:
+    """
+    Saves the chat of several Twitch channels over IRC, without a browser, until it is interrupted.
+
+    Each channel is appended to its own file with an `AppendOnlyWriter`, whose rows are also flushed
+    while the channel is quiet. The 'time_live' and 'views' columns are left empty, since the chat
+    protocol does not carry them. An error that ends the capture, such as a chat file that cannot
+    be opened or a rejected login, is logged and the files written so far are closed.
+
+    Args:
+        channels (list of str): The channels to follow.
+        name_folder (str): The folder where the chat files will be saved.
+        name_files (dict): The name of the chat file of each channel; '.csv' or '.jsonl'.
+        server (str, optional): The IRC server, see `TwitchChatClient`. Defaults to `TWITCH_IRC_SERVER`.
+        rotate_bytes (int, optional): Size after which a new chat file is started. Defaults to None (never).
+        rotate_hourly (bool, optional): Start a new chat file every hour. Defaults to False.
+        columns (list of str, optional): The columns of the files. Defaults to the columns of the browser capture.
+
+    Returns:
+        dict: For each channel, the path of its last chat file ('file') and the number of messages saved ('count').
+    """
+    writers = {}
+
+    def save(channel, message):
+        writer = writers.get(channel)
+        if writer:
+            writer.Write(dict(message, date_scraping=datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+
+    async def follow():
+        flusher = asyncio.ensure_future(_flush_periodically(list(writers.values())))
+        try:
+            await client.Run()
+        finally:
+            flusher.cancel()
+
+    client = TwitchChatClient(channels, save, server=server)
+    try:
+        for channel in channels:
+            writers[channel] = AppendOnlyWriter(name_folder, name_files[channel], columns,
+                                                rotate_bytes=rotate_bytes, rotate_hourly=rotate_hourly)
+        asyncio.run(follow())
+    except KeyboardInterrupt:
+        LogMessage("WARNING", "Keyboard interruption detected. Ending scraping.")
+    except OSError as error:
+        LogMessage("ERROR", f"Twitch chat capture stopped: {error}")
+    finally:
+        for writer in writers.values():
+            writer.Close()
+    return {channel: {'file': writer.path, 'count': writer.count} for channel, writer in writers.items()}
+
+
+async def _flush_periodically(writers: list, interval: float = 1) -> None:
+    """
+    Flushes the rows due of every writer, so the files of quiet channels are kept up to date.
+
+    Args:
+        writers (list of AppendOnlyWriter): The writers of the chat files.
+        interval (float, optional): Seconds between checks. Defaults to 1.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        for writer in writers:
+            writer.FlushIfDue()
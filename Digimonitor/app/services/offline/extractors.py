@@ -0,0 +1,160 @@
+# Digimonitor is part of the DIGIBOOK collection.
+# DIGIBOOK Copyright (C) 2024 Daniel Alcalá.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+from urllib.parse import urljoin
+from app.services.selenium.platforms.youtube import CommentRecordsToColumns
+from app.services.selenium.platforms.tiktok import CommentHarvest
+from app.services.utils.parsing import ParseHTML
+
+
+# The same elements read in the live page by the scripts of each platform
+YOUTUBE_SELECTORS = {
+    'channel': 'yt-formatted-string[class="style-scope ytd-channel-name complex-string"] > a',
+    'subscribers': 'yt-formatted-string[class="style-scope ytd-video-owner-renderer"]',
+    'title': 'h1 > yt-formatted-string[class="style-scope ytd-watch-metadata"]',
+    'description': 'ytd-text-inline-expander#description-inline-expander yt-attributed-string',
+    'description_fallback': 'ytd-text-inline-expander#description-inline-expander',
+    'bold': 'span[class="style-scope yt-formatted-string bold"]',
+    'info': 'div#info-container',
+    'count_comment': 'yt-formatted-string[class*="count-text"] span',
+    'likes': 'button[class*="yt-spec-button-shape-next--segmented-start"] '
+             'div[class="yt-spec-button-shape-next__button-text-content"]',
+    'thread': 'ytd-comment-thread-renderer',
+    'header': '#header-author',
+    'author_link': 'a#author-text',
+    'content': '#content-text',
+    'n_like': '#vote-count-middle',
+    'n_response': 'ytd-comment-replies-renderer button[aria-label]',
+    'date': '#published-time-text a',
+}
+
+TIKTOK_SELECTORS = {
+    'container': 'div[class*="css-1i7ohvi-DivCommentItemContainer"]',
+    'text': 'p[class*="css-xm2h10-PCommentText"] span',
+    'n_like': 'span[class*="css-gb2mrc-SpanCount"]',
+    'date': 'span[class*="css-1esugaz-SpanCreatedTime"]',
+    'n_response': 'p[class*="css-16xv7y2-PReplyActionTex"]',
+}
+
+
+def ExtractYouTubeHTML(html: str, url: str, date_scraping: str, records: bool = False) -> dict:
+    """
+    Extracts the data of a YouTube video page from its HTML, without a browser.
+
+    The same elements as `ExtractDataPageYouTubeSnapshot` are read, so an archived page gives
+    the data its live extraction would have given.
+
+    Args:
+        html (str): The HTML of the page.
+        url (str): The URL of the page.
+        date_scraping (str): When the page was captured.
+        records (bool, optional): Return one record per comment under the 'comments' key instead
+                                  of the 'comment' lists. Defaults to False.
+
+    Returns:
+        dict: A dictionary with the keys of the one returned by `ExtractDataPageYouTube`.
+    """
+    document = ParseHTML(html)
+    select = YOUTUBE_SELECTORS
+    channel = document.SelectOne(select['channel'])
+    bold = document.Select(select['bold'])
+    info = document.SelectOne(select['info'])
+    info_text = info.Text().replace('\n', '').strip() if info else 'None'
+    description = document.SelectOne(select['description']) or document.SelectOne(select['description_fallback'])
+    data = {
+        "date_scraping": date_scraping,
+        "url_post": url,
+        "channel_name": _text(channel),
+        "count_subscribers": _text(document.SelectOne(select['subscribers'])),
+        "id_channel": urljoin(url, channel.Attr('href')) if channel and channel.Attr('href') else 'None',
+        "title": _text(document.SelectOne(select['title'])),
+        'description': description.Text().strip() if description else 'None',
+        "views": _text(bold[0]) if bold else info_text,
+        "count_comment": ' '.join(_text(span) for span in document.Select(select['count_comment'])),
+        "count_likes": _text(document.SelectOne(select['likes'])),
+        "upload": _text(bold[2]) if len(bold) > 2 else info_text,
+    }
+    comments = []
+    for thread in document.Select(select['thread']):
+        header = thread.SelectOne(select['header'])
+        username = None
+        if header:
+            link = header.SelectOne(select['author_link']) or header.SelectOne('a')
+            span = header.SelectOne('span')
+            if link:
+                username = link.Text().strip() or urljoin(url, link.Attr('href', ''))
+            elif span:
+                username = span.Text().strip()
+        content = thread.SelectOne(select['content'])
+        replies = thread.SelectOne(select['n_response'])
+        likes = thread.SelectOne(select['n_like'])
+        date = thread.SelectOne(select['date'])
+        record = {
+            'username': username,
+            'text': content.Text() if content else '',
+            'emojis': [img.Attr('src') for img in content.Select('img')] if content else [],
+            'n_like': likes.Text().strip() if likes else '',
+            'n_response': replies.Attr('aria-label') if replies else None,
+            'date': date.Text().strip() if date else '',
+        }
+        if record['username'] or record['text'] or record['emojis']:
+            comments.append(record)
+    if records:
+        data['comments'] = comments
+    else:
+        data['comment'] = CommentRecordsToColumns(comments)
+    return data
+
+
+def ExtractTiktokHTML(html: str, url: str, date_scraping: str) -> dict:
+    """
+    Extracts the comments of a TikTok video page from its HTML, without a browser.
+
+    The same elements as the live extraction are read, see `extract_all_data`.
+
+    Args:
+        html (str): The HTML of the page.
+        url (str): The URL of the page.
+        date_scraping (str): When the page was captured.
+
+    Returns:
+        dict: A dictionary with the keys of the one returned by `ExtractDataPageTiktok`.
+    """
+    document = ParseHTML(html)
+    select = TIKTOK_SELECTORS
+    harvest = CommentHarvest(url)
+    harvest.data['date_scraping'] = date_scraping
+    records = []
+    for container in document.Select(select['container']):
+        link = container.SelectOne('a')
+        text = container.SelectOne(select['text'])
+        likes = container.SelectOne(select['n_like'])
+        date = container.SelectOne(select['date'])
+        replies = container.SelectOne(select['n_response'])
+        records.append({
+            'username': urljoin(url, link.Attr('href')) if link and link.Attr('href') else None,
+            'text': (text.Text() or text.Attr('href')) if text else None,
+            'n_like': likes.Text() if likes else None,
+            'date': date.Text() if date else None,
+            'n_response': (replies.Text() if replies else None) or 0,
+        })
+    harvest.Add(records)
+    return harvest.data
+
+
+def _text(element) -> str:
+    return element.Text().strip() if element else 'None'
@@ -0,0 +1,103 @@
+# Digimonitor is part of the DIGIBOOK collection.
+# DIGIBOOK Copyright (C) 2024 Daniel Alcalá.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from app.services.files.actions import LogMessage
+from app.services.files.archive import DEFAULT_ARCHIVE_PATH, SnapshotArchive
+from app.services.offline.extractors import ExtractTiktokHTML, ExtractYouTubeHTML
+
+
+DEFAULT_REPLAY_PATH = 'data/replay'
+
+
+def ReplayArchive(root: str = DEFAULT_ARCHIVE_PATH, platform: str = None, workers: int = None,
+                  records: bool = False, latest: bool = False, output_folder: str = DEFAULT_REPLAY_PATH) -> list:
+    """
+    Runs the extractors again on the archived snapshots, without a browser.
+
+    The snapshots are parsed as static HTML by `ExtractYouTubeHTML` or `ExtractTiktokHTML` in a
+    pool of processes, one per CPU core by default. The data of each snapshot is saved as
+    '{output_folder}/{platform}/{content_id}_{time}.json', with the same keys as a live extraction.
+
+    Args:
+        root (str, optional): The folder of the archive. Defaults to `DEFAULT_ARCHIVE_PATH`.
+        platform (str, optional): Only replay the snapshots of this platform.
+        workers (int, optional): Number of processes. Defaults to the number of CPU cores.
+        records (bool, optional): Save the YouTube comments as one record per comment. Defaults to False.
+        latest (bool, optional): Only replay the last snapshot of each content. Defaults to False.
+        output_folder (str, optional): Where the data is saved. Defaults to `DEFAULT_REPLAY_PATH`.
+
+    Returns:
+        list of dict: One entry per snapshot with the keys 'snapshot', 'output', 'count' (number of
+                      comments) and 'error'.
+    """
+    entries = SnapshotArchive(root).Entries(platform, latest)
+    if not entries:
+        LogMessage("WARNING", f"No snapshots to replay in {root}.")
+        return []
+    workers = max(1, min(workers or os.cpu_count() or 1, len(entries)))
+    LogMessage("OK", f"Replaying {len(entries)} snapshots with {workers} processes.")
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(_replay_entry, root, entry, records, output_folder): entry
+            for entry in entries
+        }
+        for future in as_completed(futures):
+            entry = futures[future]
+            try:
+                results.append(future.result())
+            except Exception as error:
+                LogMessage("WARNING", f"Snapshot {entry['path']} could not be replayed: {error}")
+                results.append({'snapshot': entry['path'], 'output': None, 'count': 0, 'error': str(error)})
+    failed = sum(1 for result in results if result['error'])
+    LogMessage("OK", f"Replay finished: {len(results) - failed} snapshots extracted, {failed} failed.")
+    return results
+
+
+def _replay_entry(root: str, entry: dict, records: bool, output_folder: str) -> dict:
+    """
+    Extracts the data of one snapshot and saves it.
+
+    Args:
+        root (str): The folder of the archive.
+        entry (dict): The index entry of the snapshot.
+        records (bool): Save the YouTube comments as one record per comment.
+        output_folder (str): Where the data is saved.
+
+    Returns:
+        dict: The result of the snapshot, see `ReplayArchive`.
+    """
+    html = SnapshotArchive(root).Load(entry)
+    if entry['platform'] == 'youtube':
+        data = ExtractYouTubeHTML(html, entry['url'], entry['captured'], records)
+        count = len(data['comments']) if records else len(data['comment']['username'])
+    elif entry['platform'] == 'tiktok':
+        data = ExtractTiktokHTML(html, entry['url'], entry['captured'])
+        count = len(data['comment']['username'])
+    else:
+        raise ValueError(f"Plataforma no soportada especificada: '{entry['platform']}'.")
+    folder = os.path.join(output_folder, entry['platform'])
+    os.makedirs(folder, exist_ok=True)
+    stamp = os.path.basename(entry['path']).split('.')[0]
+    output_path = os.path.join(folder, f"{entry['content_id']}_{stamp}.json")
+    with open(output_path, 'w', encoding='utf-8') as file:
+        json.dump(data, file, ensure_ascii=False, indent=4)
+    return {'snapshot': entry['path'], 'output': output_path, 'count': count, 'error': None}
@@ -15,17 +15,56 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 
-import time
+import os
+import shutil
 from selenium import webdriver
+from selenium.webdriver.common.by import By
 from selenium.webdriver.firefox.options import Options
-from app.services.selenium.platforms.youtube import ScrollDownPageYouTube, ExtractDataPageYouTube
+from selenium.webdriver.support import expected_conditions
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException
+from app.services.selenium.platforms import youtube, twitch, tiktok
+from app.services.selenium.platforms.youtube import (
+    ScrollDownPageYouTube, ExtractDataPageYouTube, ExtractDataPageYouTubeSnapshot, StreamDataPageYouTube,
+    CaptureDataPageYouTube
+)
 from app.services.selenium.platforms.twitch import ExtractDataPageTwitch
 from app.services.selenium.platforms.tiktok import ExtractDataPageTiktok
 from app.services.files.actions import LogMessage
+from app.services.utils.metrics import Timed
+from app.services.utils.pacing import Pace
+
+
+# Element whose presence means that the page of each platform can be scraped
+READY_PROBES = {
+    'youtube': youtube.READY_XPATH,
+    'twitch': twitch.READY_XPATH,
+    'tiktok': tiktok.READY_XPATH,
+}
+
+PAGE_READY_TIMEOUT = 20  # Seconds to wait for a readiness probe
+
+LEAN_WINDOW_SIZE = (1366, 900)  # Fixed viewport used in lean mode
+
+# Firefox preferences that strip what the scrapers never read
+LEAN_PREFERENCES = {
+    'media.autoplay.default': 5,  # Block audio and video autoplay
+    'media.autoplay.blocking_policy': 2,
+    'media.volume_scale': '0.0',
+    'gfx.downloadable_fonts.enabled': False,  # No web fonts
+    'browser.display.use_document_fonts': 0,
+    'privacy.trackingprotection.enabled': True,  # Block third-party trackers
+    'privacy.trackingprotection.socialtracking.enabled': True,
+    'privacy.trackingprotection.cryptomining.enabled': True,
+    'privacy.trackingprotection.fingerprinting.enabled': True,
+    'browser.cache.disk.enable': False,
+    'dom.webnotifications.enabled': False,
+}
 
 
 class FirefoxWebDriver:
-    def __init__(self, root_path: str = None):
+    def __init__(self, root_path: str = None, lean: bool = False, keep_images: bool = False,
+                 temporary_profile: bool = False):
         """
         Initializes an instance of FirefoxWebDriver.
 
@@ -33,8 +72,17 @@ class FirefoxWebDriver:
             root_path (str, optional): The root directory where the Firefox profile is located.
                                         If not provided, the default is None, meaning that the WebDriver
                                         will start with a default profile.
+            lean (bool, optional): Run headless with a fixed viewport and without media autoplay, images,
+                                   web fonts or trackers. Defaults to False.
+            keep_images (bool, optional): Keep loading images in lean mode, for extractors that need
+                                          loaded emoji images. Defaults to False.
+            temporary_profile (bool, optional): The profile at `root_path` is a private copy that is
+                                                deleted when the driver stops. Defaults to False.
         """
         self.root_path = root_path
+        self.lean = lean
+        self.keep_images = keep_images
+        self.temporary_profile = temporary_profile
         self.driver = None
 
 
@@ -43,7 +91,7 @@ class FirefoxWebDriver:
         Initializes a WebDriver instance for the Firefox browser.
 
         This method configures the WebDriver options, including specifying an existing Firefox profile.
-        The 'headless' mode can be enabled or disabled by uncommenting or commenting the corresponding option.
+        In lean mode the browser runs headless with a fixed viewport and the `LEAN_PREFERENCES`.
 
         Returns:
             webdriver.Firefox: An instance of the Firefox WebDriver.
@@ -53,8 +101,18 @@ class FirefoxWebDriver:
             if self.root_path:
                 options.add_argument("-profile")
                 options.add_argument(self.root_path)
-            # options.add_argument('--headless')  # Uncomment to enable headless mode
-            self.driver = webdriver.Firefox(options=options)
+            if self.lean:
+                options.add_argument('--headless')
+                options.add_argument(f'--width={LEAN_WINDOW_SIZE[0]}')
+                options.add_argument(f'--height={LEAN_WINDOW_SIZE[1]}')
+                for name, value in LEAN_PREFERENCES.items():
+                    options.set_preference(name, value)
+                if not self.keep_images:
+                    options.set_preference('permissions.default.image', 2)  # Block images
+            with Timed('driver_start'):
+                self.driver = webdriver.Firefox(options=options)
+                if self.lean:
+                    self.driver.set_window_size(*LEAN_WINDOW_SIZE)
             LogMessage("OK", "Starting WebDriver.")
             return self.driver
         except Exception as e:
@@ -62,31 +120,70 @@ class FirefoxWebDriver:
             raise
 
 
-    def OpenPage(self, url: str) -> None:
+    def OpenPage(self, url: str, platform: str = None, timeout: float = PAGE_READY_TIMEOUT) -> None:
         """
         Opens a web page in the Firefox WebDriver instance.
 
-        This function receives a URL and uses the WebDriver instance to load the corresponding page. 
-        A fixed wait time is included after opening the page.
+        This function receives a URL and uses the WebDriver instance to load the corresponding page.
+        The load waits for the shared pacing of the platform, see `Pace`. It then waits until the
+        page of the platform is ready to be scraped, see `WaitPageReady`.
 
         Args:
             url (str): The URL of the web page to be opened.
+            platform (str, optional): The platform of the URL, used to pick the readiness probe.
+            timeout (float, optional): Maximum number of seconds to wait for the page.
         """
-        self.driver.get(url)
-        self.driver.maximize_window()
+        Pace(platform or 'default')
+        with Timed('page_load', platform):
+            self.driver.get(url)
+            if not self.lean:
+                self.driver.maximize_window()
         LogMessage('OK', f"Opened URL: {url}")
-        time.sleep(9)
+        with Timed('page_ready', platform):
+            self.WaitPageReady(platform, timeout)
+
+
+    def WaitPageReady(self, platform: str = None, timeout: float = PAGE_READY_TIMEOUT) -> bool:
+        """
+        Waits until the loaded page can be scraped.
+
+        The wait returns as soon as the readiness probe of the platform (see `READY_PROBES`) is
+        present. Without a probe, it waits for the document to finish loading. If the timeout
+        expires, a warning is logged and the extraction goes on with whatever has loaded.
 
+        Args:
+            platform (str, optional): The platform of the page ('youtube', 'twitch' or 'tiktok').
+            timeout (float, optional): Maximum number of seconds to wait.
 
-    def ScrollDownPageYT(self):
+        Returns:
+            bool: True if the page became ready before the timeout, False otherwise.
+        """
+        xpath = READY_PROBES.get(platform)
+        try:
+            if xpath:
+                condition = expected_conditions.presence_of_element_located((By.XPATH, xpath))
+            else:
+                condition = lambda driver: driver.execute_script("return document.readyState;") == 'complete'
+            WebDriverWait(self.driver, timeout).until(condition)
+            return True
+        except TimeoutException:
+            LogMessage('WARNING', f"Page not ready after {timeout} seconds, continuing with the loaded content.")
+            return False
+
+
+    def ScrollDownPageYT(self, max_comments: int = None):
         """
         Scrolls down the page to load additional content, such as comments, on YouTube.
 
         This method initiates the scrolling process to load more content. The scrolling action is
         performed using the `ScrollDownPageYouTube` function.
+
+        Args:
+            max_comments (int, optional): Stop scrolling once this number of comments is loaded.
         """
         LogMessage("OK", "Scrolling process to load comments has started.")
-        ScrollDownPageYouTube(self.driver)
+        with Timed('scroll', 'youtube'):
+            ScrollDownPageYouTube(self.driver, max_comments)
         LogMessage("OK", "End of scrolling.")
 
 
@@ -95,43 +192,159 @@ class FirefoxWebDriver:
         Closes and terminates the Firefox WebDriver instance.
 
         This function ensures that the browser is properly closed and releases any resources associated
-        with the WebDriver instance.
+        with the WebDriver instance. A temporary profile is deleted afterwards.
         """
-        if self.driver:
-            self.driver.quit()
-            LogMessage('OK', "Stopping WebDriver.")
-        else:
-            LogMessage('WARNING', "WebDriver was not running.")
+        try:
+            if self.driver:
+                self.driver.quit()
+                LogMessage('OK', "Stopping WebDriver.")
+            else:
+                LogMessage('WARNING', "WebDriver was not running.")
+        finally:
+            if self.temporary_profile and self.root_path:
+                shutil.rmtree(self.root_path, ignore_errors=True)
+
+
+    def PageSource(self) -> str:
+        """
+        Returns the HTML of the current page, as rendered at this moment.
+
+        Returns:
+            str: The HTML of the page.
+        """
+        return self.driver.page_source
 
 
-    def ExtractDataPageYT(self) -> dict:
+    def MemoryUsageMB(self) -> float:
+        """
+        Returns the resident memory of the browser and its content processes.
+
+        The memory is read from /proc, so it is only available on Linux.
+
+        Returns:
+            float: The memory in MB, or None if it cannot be measured.
+        """
+        try:
+            pid = self.driver.capabilities.get('moz:processID')
+            if not pid:
+                return None
+            pids = [pid]
+            for entry in os.listdir('/proc'):
+                if entry.isdigit():
+                    try:
+                        with open(f'/proc/{entry}/stat', 'r') as file:
+                            # The parent PID is the second field after the process name
+                            if int(file.read().rsplit(')', 1)[1].split()[1]) == pid:
+                                pids.append(int(entry))
+                    except (OSError, IndexError, ValueError):
+                        continue
+            total_kb = 0
+            for process_id in pids:
+                try:
+                    with open(f'/proc/{process_id}/status', 'r') as file:
+                        for line in file:
+                            if line.startswith('VmRSS:'):
+                                total_kb += int(line.split()[1])
+                except OSError:
+                    continue
+            return total_kb / 1024
+        except Exception:
+            return None
+
+
+    def ExtractDataPageYT(self, snapshot: bool = False, records: bool = False) -> dict:
         """
         Extracts data from a YouTube page.
 
         This method initiates the data extraction process using the `ExtractDataPageYouTube` function,
-        and returns the extracted data.
+        or the `ExtractDataPageYouTubeSnapshot` function when `snapshot` is enabled, and returns the
+        extracted data.
+
+        Args:
+            snapshot (bool, optional): Gather all the data with a single injected script. Defaults to False.
+            records (bool, optional): Return one record per comment instead of parallel lists. Defaults to False.
 
         Returns:
             dict: A dictionary containing the extracted data from the YouTube page.
         """
         LogMessage("OK", "Data extraction process has started.")
-        data = ExtractDataPageYouTube(self.driver)
+        if snapshot:
+            with Timed('extract_snapshot', 'youtube'):
+                data = ExtractDataPageYouTubeSnapshot(self.driver, records)
+        else:
+            data = ExtractDataPageYouTube(self.driver, records)
         LogMessage("OK", "Data extraction process has been completed satisfactorily.")
         return data
 
 
-    def ExtractDataPageTW(self, name_folder: str, name_file: str):
+    def StreamDataPageYT(self, name_folder: str, name_file: str, max_comments: int = None) -> dict:
+        """
+        Scrolls a YouTube page and saves its comments to disk while they load.
+
+        This method initiates the streaming process using the `StreamDataPageYouTube` function and
+        returns the video data, which points to the file with the comments.
+
+        Args:
+            name_folder (str): The folder path where the comments file will be saved.
+            name_file (str): The filename of the JSON file of the video.
+            max_comments (int, optional): Stop once this number of comments is saved.
+
+        Returns:
+            dict: A dictionary containing the video data and the path of the comments file.
+        """
+        LogMessage("OK", "Streaming extraction process has started.")
+        with Timed('stream', 'youtube'):
+            data = StreamDataPageYouTube(self.driver, name_folder, name_file, max_comments)
+        LogMessage("OK", "Streaming extraction process has been completed.")
+        return data
+
+
+    def CaptureDataPageYT(self, records: bool = False, max_comments: int = None) -> dict:
+        """
+        Scrolls a YouTube page and extracts its comments from the captured network responses.
+
+        This method initiates the capture process using the `CaptureDataPageYouTube` function and
+        returns the extracted data.
+
+        Args:
+            records (bool, optional): Return one record per comment instead of parallel lists. Defaults to False.
+            max_comments (int, optional): Stop once this number of comments is captured.
+
+        Returns:
+            dict: A dictionary containing the extracted data from the YouTube page.
+        """
+        LogMessage("OK", "Network capture process has started.")
+        with Timed('capture', 'youtube'):
+            data = CaptureDataPageYouTube(self.driver, records, max_comments)
+        LogMessage("OK", "Network capture process has been completed.")
+        return data
+
+
+    def ExtractDataPageTW(self, name_folder: str, name_file: str, rotate_bytes: int = None, rotate_hourly: bool = False,
+                          capture: str = 'poll', dedupe_window: float = 120,
+                          sample_interval: float = 30):
         """
         Extracts data from a Twitch page.
 
         This method initiates the data extraction process using the `ExtractDataPageTwitch` function.
+
+        Parameters:
+        name_folder (str): The folder path where the chat file will be saved.
+        name_file (str): The filename of the chat file, '.csv' or '.jsonl'.
+        rotate_bytes (int, optional): Size after which a new chat file is started.
+        rotate_hourly (bool, optional): Start a new chat file every hour.
+        capture (str, optional): 'poll' to parse the page source or 'observer' to drain an injected observer.
+        dedupe_window (float, optional): Seconds a chat message is remembered to skip repetitions.
+        sample_interval (float, optional): Seconds between samples of the viewers and the live time.
         """
         LogMessage("OK", "Data extraction process for Twitch has started.")
-        ExtractDataPageTwitch(self.driver, name_folder, name_file)
+        ExtractDataPageTwitch(self.driver, name_folder, name_file, rotate_bytes, rotate_hourly, capture, dedupe_window,
+                              sample_interval)
         LogMessage("OK", "Data extraction process for Twitch has been completed.")
 
 
-    def ExtractDataPageTK(self, name_folder: str, name_file: str):
+    def ExtractDataPageTK(self, name_folder: str, name_file: str, unattended: bool = False, target_comments: int = None,
+                          max_stalls: int = None, time_budget: float = None):
         """
         Extracts data from a TikTok page.
 
@@ -140,7 +353,11 @@ class FirefoxWebDriver:
         Parameters:
         name_folder (str): The folder path where the extracted data will be saved.
         name_file (str): The filename for the JSON file where data will be stored.
+        unattended (bool, optional): Run without console prompts; captcha and login walls raise a BlockedPageError.
+        target_comments (int, optional): Stop once this number of comments is extracted.
+        max_stalls (int, optional): Stop after this number of passes without new comments.
+        time_budget (float, optional): Stop after this number of seconds.
         """
         LogMessage("OK", "Data extraction process for TikTok has started.")
-        ExtractDataPageTiktok(self.driver, name_folder, name_file)
+        ExtractDataPageTiktok(self.driver, name_folder, name_file, unattended, target_comments, max_stalls, time_budget)
         LogMessage("OK", "Data extraction process for TikTok has been completed.")
@@ -0,0 +1,260 @@
+# Digimonitor is part of the DIGIBOOK collection.
+# DIGIBOOK Copyright (C) 2024 Daniel Alcalá.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import queue
+import threading
+from selenium.common.exceptions import WebDriverException
+from app.services.files.actions import LogMessage
+
+
+ACQUIRE_TIMEOUT = 300  # Seconds to wait for a free session
+
+
+class DriverPool:
+    def __init__(self, factory, size: int = 1, spares: int = 0, recycle_pages: int = None,
+                 max_memory_mb: float = None):
+        """
+        Initializes a pool of pre-started FirefoxWebDriver sessions.
+
+        Sessions are recycled after `recycle_pages` pages or when the browser uses more than
+        `max_memory_mb`, and replaced when they crash. Replacements are taken from a set of warm
+        spare sessions, which are started again in the background, so the run does not wait for
+        a cold start of Firefox. If a replacement cannot be started, the next `Acquire` tries
+        again instead of waiting for a session that will never come back.
+
+        Args:
+            factory (callable): Returns a new FirefoxWebDriver that has not been started yet.
+            size (int, optional): Number of sessions handed out at the same time. Defaults to 1.
+            spares (int, optional): Number of warm sessions kept ready for replacements. Defaults to 0.
+            recycle_pages (int, optional): Pages after which a session is recycled. Defaults to None (never).
+            max_memory_mb (float, optional): Browser memory in MB after which a session is recycled.
+                                             Defaults to None (never).
+        """
+        self.factory = factory
+        self.size = size
+        self.spares = spares
+        self.recycle_pages = recycle_pages
+        self.max_memory_mb = max_memory_mb
+        self.idle = queue.Queue()  # None stands for a session that still has to be started
+        self.warm = queue.Queue()
+        self.busy = {}
+        self.pages = {}
+        self.threads = []
+
+
+    def Start(self) -> None:
+        """
+        Starts the sessions of the pool and its spare sessions in parallel.
+
+        Raises:
+            WebDriverException: If no session could be started.
+        """
+        for _ in range(self.size):
+            self._start_async(self.idle)
+        for _ in range(self.spares):
+            self._start_async(self.warm)
+        for thread in list(self.threads):
+            thread.join()
+        if self.idle.empty():
+            raise WebDriverException("No browser session of the pool could be started.")
+        LogMessage("OK", f"Driver pool ready with {self.idle.qsize()} sessions and {self.warm.qsize()} spares.")
+
+
+    def Acquire(self):
+        """
+        Takes a session from the pool, waiting until one is free.
+
+        Returns:
+            FirefoxWebDriver: A started session.
+
+        Raises:
+            WebDriverException: If no session is free after `ACQUIRE_TIMEOUT` seconds, or if a
+                                session that failed to start cannot be started now either.
+        """
+        try:
+            driver = self.idle.get(timeout=ACQUIRE_TIMEOUT)
+        except queue.Empty:
+            raise WebDriverException("No browser session of the pool is available.")
+        if driver is None:
+            try:
+                driver = self._start()
+            except Exception as error:
+                self.idle.put(None)
+                raise WebDriverException(f"No browser session of the pool could be started: {error}")
+        self.busy[id(driver)] = driver
+        return driver
+
+
+    def Release(self, driver, failed: bool = False) -> None:
+        """
+        Gives a session back to the pool.
+
+        The session is replaced by a fresh one if it failed, reached `recycle_pages` or uses more
+        than `max_memory_mb`.
+
+        Args:
+            driver (FirefoxWebDriver): The session taken with `Acquire`.
+            failed (bool, optional): True if the session raised a WebDriverException. Defaults to False.
+        """
+        self.busy.pop(id(driver), None)
+        self.pages[id(driver)] = self.pages.get(id(driver), 0) + 1
+        reason = None
+        if failed:
+            reason = 'crashed'
+        elif self.recycle_pages and self.pages[id(driver)] >= self.recycle_pages:
+            reason = f'{self.pages[id(driver)]} pages loaded'
+        elif self.max_memory_mb:
+            memory = driver.MemoryUsageMB()
+            if memory is not None and memory > self.max_memory_mb:
+                reason = f'{memory:.0f} MB in use'
+        if reason:
+            LogMessage("INFO", f"Recycling browser session: {reason}.")
+            self._replace(driver)
+        else:
+            self.idle.put(driver)
+
+
+    def Run(self, func, retries: int = 1):
+        """
+        Runs a function with a session of the pool, retrying on a fresh session if it crashes.
+
+        The session is stopped if the run is interrupted, such as with Ctrl-C.
+
+        Args:
+            func (callable): Receives a FirefoxWebDriver and does the work.
+            retries (int, optional): Attempts on a fresh session after a WebDriverException. Defaults to 1.
+
+        Returns:
+            The value returned by `func`.
+        """
+        attempt = 0
+        while True:
+            driver = self.Acquire()
+            try:
+                result = func(driver)
+            except WebDriverException as error:
+                self.Release(driver, failed=True)
+                if attempt >= retries:
+                    raise
+                attempt += 1
+                LogMessage("WARNING", f"Browser session failed, retrying on a fresh session: {error}")
+                continue
+            except Exception:
+                self.Release(driver)
+                raise
+            except BaseException:
+                self.busy.pop(id(driver), None)
+                _stop_quietly(driver)
+                raise
+            self.Release(driver)
+            return result
+
+
+    def Stop(self) -> None:
+        """
+        Stops every session of the pool, including the spare sessions and the ones still in use.
+        """
+        for thread in list(self.threads):
+            thread.join()
+        for sessions in [self.idle, self.warm]:
+            while not sessions.empty():
+                driver = sessions.get_nowait()
+                if driver is not None:
+                    _stop_quietly(driver)
+        while self.busy:
+            _stop_quietly(self.busy.popitem()[1])
+
+
+    def _replace(self, driver) -> None:
+        """
+        Replaces a session with a warm spare, or with a new session if there is none.
+
+        The old session is stopped in the background, unless a new session has to be started
+        right away, which waits for it to stop first.
+
+        Args:
+            driver (FirefoxWebDriver): The session to discard.
+        """
+        self.pages.pop(id(driver), None)
+        stopper = threading.Thread(target=_stop_quietly, args=(driver,), daemon=True)
+        stopper.start()
+        self.threads.append(stopper)
+        try:
+            spare = self.warm.get_nowait()
+        except queue.Empty:
+            spare = None
+        if spare is None:
+            LogMessage("WARNING", "No warm session available, starting a new one.")
+            # Without a spare the new session may run on the same profile, which Firefox keeps
+            # locked until the old browser has exited
+            stopper.join()
+            try:
+                spare = self._start()
+            except Exception as error:
+                LogMessage("ERROR", f"Could not start a replacement browser session: {error}")
+                spare = None  # Started again by the next Acquire
+        else:
+            self._start_async(self.warm)
+        self.idle.put(spare)
+
+
+    def _start(self):
+        """
+        Creates and starts a new session.
+
+        Returns:
+            FirefoxWebDriver: The started session.
+        """
+        driver = self.factory()
+        try:
+            driver.StartDriver()
+        except Exception:
+            _stop_quietly(driver)
+            raise
+        return driver
+
+
+    def _start_async(self, target: queue.Queue) -> None:
+        """
+        Starts a new session in a background thread and puts it in a queue.
+
+        Args:
+            target (queue.Queue): The queue that receives the session.
+        """
+        def start():
+            try:
+                target.put(self._start())
+            except Exception as error:
+                LogMessage("ERROR", f"Could not start a browser session for the pool: {error}")
+
+        self.threads = [thread for thread in self.threads if thread.is_alive()]
+        thread = threading.Thread(target=start, daemon=True)
+        thread.start()
+        self.threads.append(thread)
+
+
+def _stop_quietly(driver) -> None:
+    """
+    Stops a session, ignoring the errors of a browser that already crashed.
+
+    Args:
+        driver (FirefoxWebDriver): The session to stop.
+    """
+    try:
+        driver.StopDriver()
+    except Exception as error:
+        LogMessage("WARNING", f"Could not stop browser session cleanly: {error}")
@@ -15,48 +15,117 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 
+import datetime
 import inspect
 import time
 import json
-import random
 import os
-from concurrent.futures import ThreadPoolExecutor, as_completed
-
-
 from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.common.exceptions import NoSuchElementException
+from selenium.common.exceptions import NoSuchElementException, WebDriverException
 from app.services.files.actions import LogMessage
-
-
-def ExtractDataPageTiktok(driver: webdriver.Firefox, name_folder: str, name_file: str):
+from app.services.utils.errors import BlockedPageError
+from app.services.utils.metrics import Timed
+from app.services.utils.pacing import Backoff, Pace
+
+
+# Comment container, or a captcha or login wall that the extractor has to handle
+READY_XPATH = (
+    '//div[contains(@class, "DivCommentListContainer")]'
+    ' | //div[contains(@class, "DivCommentItemContainer")]'
+    ' | //a[@id="verify-bar-close"]'
+    ' | //div[@id="loginContainer"]'
+)
+
+COMMENT_FIELDS = ['username', 'text', 'n_like', 'n_response', 'date']
+
+# Reads every comment container not read by a previous pass and marks it, in a single round trip
+_EXTRACT_SCRIPT = """
+const containers = document.querySelectorAll(
+    'div[class*="css-1i7ohvi-DivCommentItemContainer"]:not([data-digimonitor-seen])'
+);
+const read = (root, selector) => {
+    const element = root.querySelector(selector);
+    return element ? element.innerText : null;
+};
+return Array.from(containers, (container) => {
+    container.setAttribute('data-digimonitor-seen', '1');
+    const link = container.querySelector('a');
+    const text = container.querySelector('p[class*="css-xm2h10-PCommentText"] span');
+    return {
+        username: link ? link.href : null,
+        text: text ? (text.innerText || text.getAttribute('href')) : null,
+        n_like: read(container, 'span[class*="css-gb2mrc-SpanCount"]'),
+        date: read(container, 'span[class*="css-1esugaz-SpanCreatedTime"]'),
+        n_response: read(container, 'p[class*="css-16xv7y2-PReplyActionTex"]') || 0
+    };
+});
+"""
+
+DEFAULT_MAX_STALLS = 5  # Passes without new comments that end an unattended extraction
+CAPTCHA_CLOSE_WAIT = 2  # Seconds to wait after closing a captcha
+
+
+def ExtractDataPageTiktok(driver: webdriver.Firefox, name_folder: str, name_file: str, unattended: bool = False,
+                          target_comments: int = None, max_stalls: int = None, time_budget: float = None):
     """
     Scroll through the webpage, handle captcha, and extract data.
 
+    Every pass only reads the comments loaded since the previous one and appends them to a
+    `CommentHarvest`, so the cost of a pass does not grow with the comments already collected
+    and those comments are saved even if a later pass fails.
+
+    By default the extraction asks on the console whether to go on after every pass, and waits for
+    the operator to close captcha and login windows. In `unattended` mode it never reads from the
+    console: it stops on the first stop rule that is met, and a captcha that cannot be dismissed or
+    a login wall raises a `BlockedPageError` after saving what was extracted, so the URL can be
+    retried later. The stop rules also apply to the interactive mode when they are given.
+
     Args:
         driver: The Selenium WebDriver instance used to interact with the webpage.
+        name_folder (str): The folder where the data will be saved.
+        name_file (str): The name of the JSON file.
+        unattended (bool, optional): Run without console prompts. Defaults to False.
+        target_comments (int, optional): Stop once this number of comments is extracted.
+        max_stalls (int, optional): Stop after this number of passes without new comments.
+                                    Defaults to `DEFAULT_MAX_STALLS` in unattended mode.
+        time_budget (float, optional): Stop after this number of seconds.
 
     Returns:
-        dict: The extracted data or an empty dictionary if an error occurs.
+        dict: The extracted data.
+
+    Raises:
+        BlockedPageError: In unattended mode, if the page is behind a captcha or a login wall.
+        WebDriverException: If the browser session fails, after saving what was extracted.
+        Exception: Any other error of the extraction, also after saving what was extracted.
     """
     iteration_count = 0
-    data = {}
-    previous_wait_time = None
-    previous_scroll_wait_time = None
-    tolerance = 0.01
+    harvest = CommentHarvest()
+    data = harvest.data
+    if unattended and max_stalls is None:
+        max_stalls = DEFAULT_MAX_STALLS
+    started = time.monotonic()
+    stalls = 0
 
     try:
         while True:
             try:
                 for _ in range(3):
                     if _check_captcha_exists(driver):
-                        print('Captcha detected. Please close the captcha window manually.')
-                        input('Press Enter after you have closed the captcha window to continue...')
-                        while _check_captcha_exists(driver):
-                            print('Captcha still present. Please close it.')
+                        Backoff('tiktok', 'captcha')
+                        if unattended:
+                            _dismiss_captcha(driver)
+                        else:
+                            print('Captcha detected. Please close the captcha window manually.')
                             input('Press Enter after you have closed the captcha window to continue...')
+                            while _check_captcha_exists(driver):
+                                print('Captcha still present. Please close it.')
+                                input('Press Enter after you have closed the captcha window to continue...')
 
                     if _check_login(driver):
+                        Backoff('tiktok', 'login')
+                        if unattended:
+                            raise BlockedPageError('login', driver.current_url)
                         input('Press Enter after you have closed the login window to continue...')
                         while _check_login(driver):
                             print('Login still present. Please close it.')
@@ -81,38 +150,35 @@ def ExtractDataPageTiktok(driver: webdriver.Firefox, name_folder: str, name_file
                         except:
                             pass
                         
-                    # Generate a random wait time for scrolling
-                    new_scroll_wait_time = random.uniform(0.8, 1)
-                    while previous_scroll_wait_time is not None and abs(new_scroll_wait_time - previous_scroll_wait_time) < tolerance:
-                        new_scroll_wait_time = random.uniform(0.8, 2)
-                    
-                    driver.execute_script("window.scrollBy(0, 420);")
-                    time.sleep(new_scroll_wait_time)
-                    previous_scroll_wait_time = new_scroll_wait_time
-
-                # Change wait time in each iteration of the while loop
-                new_wait_time = random.uniform(1.5, 2)
-                while previous_wait_time is not None and abs(new_wait_time - previous_wait_time) < tolerance:
-                    new_wait_time = random.uniform(2, 3)
-                
-                print(f'Waiting for {new_wait_time:.2f} seconds before the next iteration.')
-                time.sleep(new_wait_time)
-                
-                previous_wait_time = new_wait_time
+                    # Wait for the shared pacing of TikTok before scrolling
+                    Pace('tiktok')
+                    with Timed('scroll', 'tiktok'):
+                        driver.execute_script("window.scrollBy(0, 420);")
+
+                # Leave time for the comments to load before the next pass
+                Pace('tiktok', cost=2)
                 iteration_count += 1
                 
                 if iteration_count >= 1:
                     print('Data extraction in progress, please wait...')
-                    data = extract_all_data(driver)
+                    if not data['url_post']:
+                        data['url_post'] = _extract_url_post(driver)
+                    with Timed('extract_comments', 'tiktok'):
+                        added = harvest.Add(extract_all_data(driver))
+                    print(f'New comments: {added}, total: {len(harvest)}')
+
+                    # Check the stop rules
+                    stalls = 0 if added else stalls + 1
+                    reason = _stop_reason(len(harvest), stalls, time.monotonic() - started,
+                                          target_comments, max_stalls, time_budget)
+                    if reason:
+                        LogMessage("OK", f"TikTok extraction stopped: {reason}.")
+                        break
+                    if unattended:
+                        continue
 
                     # Display a message about data extraction status
-                    if all(
-                        data.get('url_post') and
-                        data.get('comment', {}).get('username') and
-                        data.get('comment', {}).get('n_like') and
-                        data.get('comment', {}).get('n_response') and
-                        data.get('comment', {}).get('date')
-                    ):
+                    if data.get('url_post') and data.get('comment', {}).get('username'):
                         print(f"Usernames count: {len(data.get('comment', {}).get('username', []))}")
                         print(f"Comments count: {len(data.get('comment', {}).get('username', []))}")  # Assuming comments and usernames are related
                         print(f"Likes count: {len(data.get('comment', {}).get('n_like', []))}")
@@ -124,12 +190,6 @@ def ExtractDataPageTiktok(driver: webdriver.Firefox, name_folder: str, name_file
                         if user_input == 'exit':
                             if data:
                                 print("Saving data...")
-                                LogMessage("INFO", f'Size of "username": {len(data.get("comment", {}).get("username", []))}')
-                                LogMessage("INFO", f'Size of "likes": {len(data.get("comment", {}).get("n_like", []))}')
-                                LogMessage("INFO", f'Size of "dates": {len(data.get("comment", {}).get("date", []))}')
-                                LogMessage("INFO", f'Size of "responses": {len(data.get("comment", {}).get("n_response", []))}')
-                                _save_to_json(data, 'out', 'tiktok.json')
-                                print("Data saved successfully.")
                             else:
                                 print("Data extraction failed or returned no data.")
                             break
@@ -138,9 +198,17 @@ def ExtractDataPageTiktok(driver: webdriver.Firefox, name_folder: str, name_file
                     else:
                         print("Some data was not extracted correctly.")
 
+            except BlockedPageError as e:
+                LogMessage("WARNING", f"{e} Saving the data extracted so far.")
+                raise
+            except WebDriverException as e:
+                # Raised so the driver pool replaces the crashed browser and retries
+                LogMessage("WARNING", f"Browser session failed: {e} Saving the data extracted so far.")
+                raise
             except Exception as e:
-                print(f'An error occurred: {e}')
-                return data
+                # Raised so the job is marked as failed and retried, not cached as a complete result
+                LogMessage("WARNING", f"TikTok extraction failed: {e} Saving the data extracted so far.")
+                raise
             finally:
                 print('Scroll operation reset.')
     finally:
@@ -150,267 +218,160 @@ def ExtractDataPageTiktok(driver: webdriver.Firefox, name_folder: str, name_file
         LogMessage("INFO", f'Size of "dates": {len(data.get("comment", {}).get("date", []))}')
         LogMessage("INFO", f'Size of "responses": {len(data.get("comment", {}).get("n_response", []))}')
         _save_to_json(data, name_folder, name_file)
+    return data
 
 
-def extract_all_data(driver) -> dict:
+def _stop_reason(count: int, stalls: int, elapsed: float, target_comments: int = None, max_stalls: int = None,
+                 time_budget: float = None) -> str:
     """
-    Extracts all required data from the webpage using concurrent futures.
+    Checks the stop rules of the TikTok extraction.
 
     Args:
-        driver (webdriver.Firefox): The Selenium WebDriver instance.
-
-    Returns:
-        dict: A dictionary containing all extracted data.
-    """
-    with ThreadPoolExecutor() as executor:
-        # Create futures for each data extraction function
-        futures = {
-            executor.submit(_extract_url_post, driver): 'url_post',
-            executor.submit(_extract_usernames_comments, driver): 'usernames',
-            executor.submit(_extract_comments, driver): 'comments',
-            executor.submit(_extract_n_likes, driver): 'likes',
-            executor.submit(_extract_dates, driver): 'dates',
-            executor.submit(_extract_n_responses, driver): 'responses'
-        }
-        
-        # Initialize results dictionary
-        results = {}
-        
-        # Collect results from futures
-        for future in as_completed(futures):
-            key = futures[future]
-            try:
-                result = future.result()
-                if key in ['usernames', 'comments', 'likes', 'responses', 'dates']:
-                    if key not in results:
-                        results[key] = result
-                else:
-                    results[key] = result
-            except Exception as e:
-                print(f'Error executing {key}: {e}')
-        
-        # Assemble the final structure
-        data = {
-            "date_scraping": "2024-07-30 03:18:56",  # Replace with dynamic timestamp if needed
-            "url_post": results.get('url_post', ''),
-            "comment": {
-                "username": results.get('usernames', []),
-                "n_like": results.get('likes', []),
-                "n_response": results.get('responses', []),
-                "date": results.get('dates', [])
-            }
-        }
-        
-        # Verify if all results are complete
-        all_data_present = all(key in results and results[key] for key in ['url_post', 'usernames', 'comments', 'likes', 'responses', 'dates',])
-        if all_data_present:
-            print("Data extraction completed successfully.")
-        else:
-            print("Some data was not extracted correctly.")
-        
-        return data
-
-
-def _save_to_json(data: dict, name_folder: str, name_file: str) -> None:
-    """
-    Saves the extracted data to a JSON file.
-
-    Args:
-        data (dict): The data to save.
-        name_folder (str): The folder name where data will be saved.
-        name_file (str): The file name for saving the extracted data.
+        count (int): Comments extracted so far.
+        stalls (int): Consecutive passes without new comments.
+        elapsed (float): Seconds since the extraction started.
+        target_comments (int, optional): Comments after which the extraction stops.
+        max_stalls (int, optional): Passes without new comments after which the extraction stops.
+        time_budget (float, optional): Seconds after which the extraction stops.
 
     Returns:
-        None
+        str: The rule that was met, or None to keep going.
     """
-    try:
-        output_path = os.path.join(name_folder, name_file)
-        os.makedirs(name_folder, exist_ok=True)  # Create the folder if it does not exist
-        with open(output_path, 'w') as f:
-            json.dump(data, f, indent=4)
-        print('OK', f"Data saved successfully in {output_path}.")
-    except Exception as error:
-        print('ERROR', f"An error occurred while saving the dictionary: {error}")
+    if target_comments and count >= target_comments:
+        return f'{count} comments extracted'
+    if max_stalls and stalls >= max_stalls:
+        return f'no new comments in {stalls} passes'
+    if time_budget and elapsed >= time_budget:
+        return f'time budget of {time_budget:.0f} seconds spent'
+    return None
 
 
-def _extract_url_post(driver: webdriver.Firefox) -> str:
+def _dismiss_captcha(driver: webdriver.Firefox) -> None:
     """
-    Extracts the current URL of the post.
+    Closes the captcha with its close button, for runs without an operator.
 
     Args:
         driver (webdriver.Firefox): The Selenium WebDriver instance.
 
-    Returns:
-        str: The current URL of the post.
+    Raises:
+        BlockedPageError: If the captcha is still present after closing it.
     """
     try:
-        return driver.current_url
+        driver.find_element(By.XPATH, '//a[@id="verify-bar-close"]').click()
+        time.sleep(CAPTCHA_CLOSE_WAIT)
     except Exception as e:
-        func_name = inspect.currentframe().f_code.co_name
-        docstring = inspect.getdoc(inspect.currentframe().f_back.f_locals[func_name])
-        print("WARNING", f"An error occurred in function '{func_name}'. Docstring: {docstring}. Error: {str(e)}")
-        return 'None'
+        LogMessage("WARNING", f"Could not close the captcha: {e}")
+    if _check_captcha_exists(driver):
+        raise BlockedPageError('captcha', driver.current_url)
+    LogMessage("INFO", "Captcha closed.")
+
+
+class CommentHarvest:
+    def __init__(self, url_post: str = ''):
+        """
+        Initializes the running result of a TikTok extraction.
+
+        Comments are appended as aligned lists, one entry per comment in each field, and a comment
+        is only added once, identified by its author link, text and date.
+
+        Args:
+            url_post (str, optional): The URL of the post.
+        """
+        self.seen = set()
+        self.data = {
+            "date_scraping": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "url_post": url_post,
+            "comment": {field: [] for field in COMMENT_FIELDS}
+        }
 
 
-def _extract_usernames_comments(driver: webdriver.Firefox) -> list:
-    """
-    Extracts usernames from comments on the webpage.
+    def Add(self, records: list) -> int:
+        """
+        Appends the comments not harvested yet.
 
-    Args:
-        driver (webdriver.Firefox): The Selenium WebDriver instance.
+        Args:
+            records (list of dict): Comments with the `COMMENT_FIELDS` as keys.
 
-    Returns:
-        list: A list of usernames.
-    """
-    try:
-        elements = []
-        xpath = '//div[contains(@class, "css-1i7ohvi-DivCommentItemContainer")]'
-        header_elements = driver.find_elements(By.XPATH, xpath)
-        for element in header_elements:
-            user_xpath = './/a'
-            user_element = element.find_element(By.XPATH, user_xpath)
-            user_link = user_element.get_attribute('href')
-            elements.append(user_link)
-        return elements
-    except NoSuchElementException:
-        func_name = inspect.currentframe().f_code.co_name
-        docstring = inspect.getdoc(inspect.currentframe().f_back.f_locals[func_name])
-        print("WARNING", f"Element with XPath '{xpath}' not found in function '{func_name}'. Docstring: {docstring}")
-        return elements
-    except Exception as e:
-        func_name = inspect.currentframe().f_code.co_name
-        docstring = inspect.getdoc(inspect.currentframe().f_back.f_locals[func_name])
-        print("WARNING", f"An error occurred in function '{func_name}'. Docstring: {docstring}. Error: {str(e)}")
-        return elements
+        Returns:
+            int: The number of comments added.
+        """
+        added = 0
+        comment = self.data['comment']
+        for record in records:
+            key = (record.get('username'), record.get('text'), record.get('date'))
+            if key in self.seen:
+                continue
+            self.seen.add(key)
+            for field in COMMENT_FIELDS:
+                comment[field].append(record.get(field))
+            added += 1
+        return added
 
 
-def _extract_comments(driver: webdriver.Firefox) -> list:
-    """
-    Extracts comments from the webpage.
+    def __len__(self) -> int:
+        return len(self.seen)
 
-    Args:
-        driver (webdriver.Firefox): The Selenium WebDriver instance.
 
-    Returns:
-        list: A list of comments.
+def extract_all_data(driver) -> list:
     """
-    try:
-        elements = []
-        xpath = '//div[@class="css-1i7ohvi-DivCommentItemContainer eo72wou0"]'
-        for element in driver.find_elements(By.XPATH, xpath):
-            xpath1 = './/p[@class="css-xm2h10-PCommentText e1g2efjf6"]/span'
-            button = element.find_element(By.XPATH, xpath1)
-            text = button.text or button.get_attribute('href')
-            elements.append(text)
-        return elements
-    except NoSuchElementException:
-        func_name = inspect.currentframe().f_code.co_name
-        docstring = inspect.getdoc(inspect.currentframe().f_back.f_locals[func_name])
-        print("WARNING", f"Element with XPath '{xpath}' not found in function '{func_name}'. Docstring: {docstring}")
-        return elements
-    except Exception as e:
-        func_name = inspect.currentframe().f_code.co_name
-        docstring = inspect.getdoc(inspect.currentframe().f_back.f_locals[func_name])
-        print("WARNING", f"An error occurred in function '{func_name}'. Docstring: {docstring}. Error: {str(e)}")
-        return elements
+    Extracts the comments of the containers not read in previous passes.
 
-
-def _extract_n_likes(driver: webdriver.Firefox) -> list:
-    """
-    Extracts the number of likes from the webpage.
+    A single injected script reads the author link, text, likes, date and replies of every new
+    container and marks it in the page, so a pass only handles the comments loaded since the
+    previous one.
 
     Args:
         driver (webdriver.Firefox): The Selenium WebDriver instance.
 
     Returns:
-        list: A list of like counts.
+        list of dict: One record per new comment, with the `COMMENT_FIELDS` as keys.
     """
-    try:
-        elements = []
-        xpath = '//div[@class="css-1i7ohvi-DivCommentItemContainer eo72wou0"]'
-        for element in driver.find_elements(By.XPATH, xpath):
-            xpath1 = './/span[@class="css-gb2mrc-SpanCount ezxoskx3"]'
-            button = element.find_element(By.XPATH, xpath1)
-            text = button.text or button.get_attribute('href')
-            elements.append(text)
-        return elements
-    except NoSuchElementException:
-        func_name = inspect.currentframe().f_code.co_name
-        docstring = inspect.getdoc(inspect.currentframe().f_back.f_locals[func_name])
-        print("WARNING", f"Element with XPath '{xpath}' not found in function '{func_name}'. Docstring: {docstring}")
-        return elements
-    except Exception as e:
-        func_name = inspect.currentframe().f_code.co_name
-        docstring = inspect.getdoc(inspect.currentframe().f_back.f_locals[func_name])
-        print("WARNING", f"An error occurred in function '{func_name}'. Docstring: {docstring}. Error: {str(e)}")
-        return elements
+    records = driver.execute_script(_EXTRACT_SCRIPT) or []
+    print(f"Data extraction completed: {len(records)} new comments.")
+    return records
 
 
-def _extract_dates(driver: webdriver.Firefox) -> list:
+def _save_to_json(data: dict, name_folder: str, name_file: str) -> None:
     """
-    Extracts dates from the comments on the webpage.
+    Saves the extracted data to a JSON file.
 
     Args:
-        driver (webdriver.Firefox): The Selenium WebDriver instance.
+        data (dict): The data to save.
+        name_folder (str): The folder name where data will be saved.
+        name_file (str): The file name for saving the extracted data.
 
     Returns:
-        list: A list of dates.
+        None
     """
     try:
-        elements = []
-        xpath = '//div[contains(@class, "css-1i7ohvi-DivCommentItemContainer")]'
-        header_elements = driver.find_elements(By.XPATH, xpath)
-        for element in header_elements:
-            user_xpath = './/span[contains(@class, "css-1esugaz-SpanCreatedTime")]'
-            user_element = element.find_element(By.XPATH, user_xpath)
-            user_link = user_element.text
-            elements.append(user_link)
-        return elements
-    except NoSuchElementException:
-        func_name = inspect.currentframe().f_code.co_name
-        docstring = inspect.getdoc(inspect.currentframe().f_back.f_locals[func_name])
-        print("WARNING", f"Element with XPath '{xpath}' not found in function '{func_name}'. Docstring: {docstring}")
-        return elements
-    except Exception as e:
-        func_name = inspect.currentframe().f_code.co_name
-        docstring = inspect.getdoc(inspect.currentframe().f_back.f_locals[func_name])
-        print("WARNING", f"An error occurred in function '{func_name}'. Docstring: {docstring}. Error: {str(e)}")
-        return elements
+        output_path = os.path.join(name_folder, name_file)
+        os.makedirs(name_folder, exist_ok=True)  # Create the folder if it does not exist
+        with Timed('serialize', 'tiktok'):
+            content = json.dumps(data, indent=4)
+        with Timed('write', 'tiktok'), open(output_path, 'w') as f:
+            f.write(content)
+        print('OK', f"Data saved successfully in {output_path}.")
+    except Exception as error:
+        print('ERROR', f"An error occurred while saving the dictionary: {error}")
 
 
-def _extract_n_responses(driver) -> list:
+def _extract_url_post(driver: webdriver.Firefox) -> str:
     """
-    Extracts the number of responses from comments on the webpage.
+    Extracts the current URL of the post.
 
     Args:
         driver (webdriver.Firefox): The Selenium WebDriver instance.
 
     Returns:
-        list: A list of response counts or zeros.
+        str: The current URL of the post.
     """
     try:
-        elements = []
-        xpath = '//div[contains(@class, "css-1i7ohvi-DivCommentItemContainer")]'
-        header_elements = driver.find_elements(By.XPATH, xpath)
-        for element in header_elements:
-            user_xpath = './/p[contains(@class, "css-16xv7y2-PReplyActionTex")]'
-            try:
-                user_element = element.find_element(By.XPATH, user_xpath)
-                user_link = user_element.text
-                elements.append(user_link)
-            except:
-                elements.append(0)
-        return elements
-    except NoSuchElementException:
-        func_name = inspect.currentframe().f_code.co_name
-        docstring = inspect.getdoc(inspect.currentframe().f_back.f_locals[func_name])
-        print("WARNING", f"Element with XPath '{xpath}' not found in function '{func_name}'. Docstring: {docstring}")
-        return elements
+        return driver.current_url
     except Exception as e:
         func_name = inspect.currentframe().f_code.co_name
         docstring = inspect.getdoc(inspect.currentframe().f_back.f_locals[func_name])
         print("WARNING", f"An error occurred in function '{func_name}'. Docstring: {docstring}. Error: {str(e)}")
-        return elements
+        return 'None'
 
 
 def _check_captcha_exists(driver: webdriver.Firefox) -> bool:
@@ -21,76 +21,238 @@ import os
 import time
 from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.common.exceptions import NoSuchElementException
-from bs4 import BeautifulSoup
-import pandas as pd
+from selenium.common.exceptions import NoSuchElementException, WebDriverException
 from app.services.files.actions import LogMessage
-
-
-def ExtractDataPageTwitch(driver: webdriver.Firefox,  name_folder: str, name_file: str) -> dict:
+from app.services.files.sink import AppendOnlyWriter
+from app.services.utils.chat import CHAT_COLUMNS, ChatBuffer, ChatDeduplicator
+from app.services.utils.metrics import Timed
+from app.services.utils.pacing import Pace
+from app.services.utils.parsing import HTMLNode, ParseHTML
+
+
+# Chat list container, also used as the readiness probe of the page
+READY_XPATH = "//div[@class='Layout-sc-1xcs6mc-0 InjectLayout-sc-1i43xsx-0 chat-list--default font-scale--default iClcoJ']"
+
+OBSERVER_COLUMNS = CHAT_COLUMNS + ['badges', 'timestamp_client']
+
+# Author and body of each chat message in the page source read by the polling capture
+USERNAME_SELECTOR = 'span.chat-author__display-name'
+MESSAGE_SELECTOR = 'span[data-a-target="chat-line-message-body"]'
+
+BUFFER_ROWS = 500  # Buffered messages that trigger a write to the chat file
+BUFFER_SECONDS = 5  # Seconds after which buffered messages are written anyway
+POLL_INTERVAL = 0.3  # Seconds between reads of the loaded chat, which are not paced with the page loads
+
+SAMPLE_COLUMNS = ['timestamp', 'viewers', 'uptime', 'online']
+SAMPLE_INTERVAL = 30  # Default seconds between viewer samples
+
+# Reads the viewer count, the live time and the offline banner in a single round trip
+_SAMPLE_SCRIPT = """
+const viewers = document.querySelector('[data-a-target="animated-channel-viewers-count"]');
+const uptime = document.querySelector('span.live-time');
+const offline = document.querySelector('.channel-status-info--offline');
+return {
+    viewers: viewers ? viewers.textContent : null,
+    uptime: uptime ? uptime.textContent : null,
+    online: !offline
+};
+"""
+
+# Buffers every chat line added to the page, marking each node so it is read only once
+_OBSERVER_SCRIPT = """
+if (window.__digimonitorChat && window.__digimonitorObserver) return true;
+window.__digimonitorChat = [];
+const maxBuffer = 50000;
+const read = (node) => {
+    if (!(node instanceof HTMLElement)) return;
+    const lines = node.matches('.chat-line__message') ? [node] : node.querySelectorAll('.chat-line__message');
+    for (const line of lines) {
+        if (line.dataset.digimonitorSeen) continue;
+        line.dataset.digimonitorSeen = '1';
+        const author = line.querySelector('.chat-author__display-name');
+        const body = line.querySelector('[data-a-target="chat-line-message-body"]');
+        const badges = Array.from(line.querySelectorAll('img.chat-badge'), (img) => img.alt);
+        window.__digimonitorChat.push({
+            username: author ? author.textContent : null,
+            comment: body ? body.textContent : '',
+            badges: badges.join('|'),
+            timestamp_client: new Date().toISOString()
+        });
+        if (window.__digimonitorChat.length > maxBuffer) window.__digimonitorChat.shift();
+    }
+};
+const chat = document.querySelector('.chat-list--default') || document.body;
+read(chat);
+window.__digimonitorObserver = new MutationObserver((mutations) => {
+    for (const mutation of mutations) mutation.addedNodes.forEach(read);
+});
+window.__digimonitorObserver.observe(chat, {childList: true, subtree: true});
+return true;
+"""
+
+# Returns and removes up to arguments[0] buffered messages, or null if the observer is gone
+_DRAIN_SCRIPT = """
+if (!window.__digimonitorChat) return null;
+return window.__digimonitorChat.splice(0, arguments[0]);
+"""
+
+
+def ExtractDataPageTwitch(driver: webdriver.Firefox, name_folder: str, name_file: str,
+                          rotate_bytes: int = None, rotate_hourly: bool = False, capture: str = 'poll',
+                          dedupe_window: float = 120, sample_interval: float = SAMPLE_INTERVAL) -> dict:
     """
     Extracts data from a Twitch chat page.
 
-    This function continuously scrapes chat data from a Twitch page, collecting usernames and comments.
-    It handles duplicate comments, saves data to a CSV file when a threshold is reached, and provides
-    mechanisms to clear chat messages when they exceed a certain length.
+    This function continuously scrapes chat data from a Twitch page, collecting usernames and comments,
+    and appends every new message to a CSV or JSON lines file through an `AppendOnlyWriter`.
+    With the 'poll' capture the page source is parsed on every poll, messages already seen within
+    `dedupe_window` seconds are skipped and the chat is cleared when it exceeds a certain length.
+    With the 'observer' capture an injected MutationObserver buffers each new message in the page and
+    only the new ones are drained, together with their badges and the client timestamp. New messages
+    are kept in a compact `ChatBuffer` and appended to the file every `BUFFER_ROWS` messages or
+    `BUFFER_SECONDS` seconds.
+
+    The viewer count, the live time and the online status are sampled by a `ViewerSampler` every
+    `sample_interval` seconds, not on every poll, and saved to a '_viewers' file next to the chat
+    file. The 'time_live' and 'views' columns of the chat hold the latest sample.
 
     Args:
         driver (webdriver.Firefox): The Selenium WebDriver instance used to interact with the web page.
+        name_folder (str): The folder where the chat file will be saved.
+        name_file (str): The name of the chat file; '.csv' or '.jsonl'.
+        rotate_bytes (int, optional): Size after which a new chat file is started. Defaults to None (never).
+        rotate_hourly (bool, optional): Start a new chat file every hour. Defaults to False.
+        capture (str, optional): 'poll' or 'observer'. Defaults to 'poll'.
+        dedupe_window (float, optional): Seconds a message is remembered after it was last seen. Defaults to 120.
+        sample_interval (float, optional): Seconds between viewer samples. Defaults to `SAMPLE_INTERVAL`.
 
     Returns:
-        dict: A dictionary containing the extracted chat data, with keys 'date_scraping', 'Username', and 'Comment'.
+        dict: A dictionary with the path of the last chat file ('file'), the number of messages saved ('count')
+              and the path of the viewers file ('viewers_file').
+
+    Raises:
+        WebDriverException: If the browser session fails, after saving the buffered messages.
     """
-    db = {'date_scraping': [], 'time_live': [], 'views': [],  'username': [], 'comment': []}
-    seen_comments = set()  # Set to track unique comments
+    if capture not in ['poll', 'observer']:
+        raise ValueError(f"Unsupported Twitch capture: '{capture}'.")
+    columns = OBSERVER_COLUMNS if capture == 'observer' else CHAT_COLUMNS
+    writer = AppendOnlyWriter(name_folder, name_file, columns, rotate_bytes=rotate_bytes, rotate_hourly=rotate_hourly)
+    dedupe = ChatDeduplicator(window_seconds=dedupe_window)
+    stem, extension = os.path.splitext(name_file)
+    sample_writer = AppendOnlyWriter(name_folder, f'{stem}_viewers{extension}', SAMPLE_COLUMNS, flush_every=1)
+    sampler = ViewerSampler(driver, sample_writer, interval=sample_interval)
+    try:
+        if capture == 'observer':
+            _capture_with_observer(driver, writer, dedupe, sampler)
+        else:
+            _capture_with_polling(driver, writer, dedupe, sampler)
+    finally:
+        writer.Close()
+        sample_writer.Close()
+    return {'file': writer.path, 'count': writer.count, 'viewers_file': sample_writer.path}
+
+
+class ViewerSampler:
+    def __init__(self, driver: webdriver.Firefox, writer: AppendOnlyWriter, interval: float = SAMPLE_INTERVAL):
+        """
+        Initializes a sampler of the audience of a Twitch stream.
+
+        Each sample reads the viewer count, the live time and the online status with a single
+        script and appends (timestamp, viewers, uptime, online) to its own file, with the viewers
+        as an integer and the uptime in seconds.
+
+        Args:
+            driver (webdriver.Firefox): The Selenium WebDriver instance used to interact with the web page.
+            writer (AppendOnlyWriter): The writer of the viewers file, with the `SAMPLE_COLUMNS`.
+            interval (float, optional): Seconds between samples. Defaults to `SAMPLE_INTERVAL`.
+        """
+        self.driver = driver
+        self.writer = writer
+        self.interval = interval
+        self.last = None
+        self.last_time = None
+
+
+    def Sample(self) -> dict:
+        """
+        Returns the latest sample, reading the page again once `interval` seconds have passed.
+
+        Returns:
+            dict: The 'timestamp', the 'viewers' and 'uptime' texts shown in the page and whether the stream is 'online'.
+        """
+        if self.last and time.monotonic() - self.last_time < self.interval:
+            return self.last
+        self.last_time = time.monotonic()
+        try:
+            values = self.driver.execute_script(_SAMPLE_SCRIPT) or {}
+        except WebDriverException as e:
+            LogMessage("WARNING", f"Could not sample the Twitch viewers. Error: {str(e)}")
+            if self.last:
+                return self.last
+            values = {}
+        online = values.get('online', True)
+        if self.last and self.last['online'] and not online:
+            LogMessage("WARNING", "Offline channel.")
+        self.last = {
+            'timestamp': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'viewers': values.get('viewers'),
+            'uptime': values.get('uptime'),
+            'online': online
+        }
+        self.writer.Write({
+            'timestamp': self.last['timestamp'],
+            'viewers': _parse_viewers(self.last['viewers']),
+            'uptime': _parse_uptime(self.last['uptime']),
+            'online': int(online)
+        })
+        return self.last
+
+
+def _capture_with_polling(driver: webdriver.Firefox, writer: AppendOnlyWriter, dedupe: ChatDeduplicator,
+                          sampler: ViewerSampler) -> None:
+    """
+    Captures the chat by parsing the page source on every poll.
+
+    The chat already loaded is read every `POLL_INTERVAL` seconds; only the page refreshes wait
+    on the pacing of Twitch, which is shared with the other workers.
+
+    Args:
+        driver (webdriver.Firefox): The Selenium WebDriver instance used to interact with the web page.
+        writer (AppendOnlyWriter): The writer of the chat file.
+        dedupe (ChatDeduplicator): The filter of messages already saved.
+        sampler (ViewerSampler): The sampler of the viewers and the online status.
+    """
+    buffer = ChatBuffer()
+    last_drain = time.monotonic()
     while True:
         try:
-            if _check_offline(driver):
-                try:
-                    for username, comment in zip(usernames, comments):
-                        if comment not in seen_comments:
-                            seen_comments.add(comment)
-                            db['date_scraping'].append(now)
-                            db['time_live'].append(time_live)
-                            db['views'].append(views)
-                            db['username'].append(username)
-                            db['comment'].append(comment)
-                    _create_csv(db,  name_folder, name_file)
-                except:
-                    break
+            last_drain = _flush_if_due(buffer, writer, last_drain)
+            sample = sampler.Sample()
+            if not sample['online']:
+                last_drain = _drain_buffer(buffer, writer)
+                writer.Flush()
             if _check_element_comments_presence(driver):
                 time.sleep(0.1)
-                # Get current HTML content
-                html_content = driver.page_source
-                # Extract usernames and comments
-                time_live = _extract_time_live(driver)
-                views = _extract_views(driver)
-                usernames = _extract_usernames_comments(html_content)
-                comments = _extract_texts_comments(html_content)
+                # Parse the current HTML content once for both fields
+                with Timed('page_source', 'twitch'):
+                    html_content = driver.page_source
+                with Timed('parse', 'twitch'):
+                    document = ParseHTML(html_content)
+                    # Extract usernames and comments
+                    usernames = _extract_usernames_comments(document)
+                    comments = _extract_texts_comments(document)
                 # Get current timestamp
                 now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                 if len(usernames) == len(comments) and len(usernames) <= 140:
                     # Filter unique comments
+                    buffer.StartBatch(now, sample['uptime'], sample['viewers'])
                     for username, comment in zip(usernames, comments):
-                        if comment not in seen_comments:
-                            seen_comments.add(comment)
-                            db['date_scraping'].append(now)
-                            db['time_live'].append(time_live)
-                            db['views'].append(views)
-                            db['username'].append(username)
-                            db['comment'].append(comment)
-                    # Check if the dictionary exceeds 1000 elements
-                    if len(db['date_scraping']) > 1000:
-                        LogMessage("OK", "Number of elements in the dictionary has exceeded 1000. Saving data...")
-                        _create_csv(db,  name_folder, name_file)
-                        db = {'date_scraping': [], 'time_live': [], 'views': [],  'username': [], 'comment': []}  # Reset the dictionary
-                    time.sleep(0.3)
-                    # Print the size of each list for verification
-                    print(len(db['date_scraping']))
-                    print(len(db['time_live']))
-                    print(len(db['views']))
-                    print(len(db['username']))
-                    print(len(db['comment']))
+                        if dedupe.IsNew(username, comment):
+                            buffer.Append(username, comment)
+                    if len(buffer) >= BUFFER_ROWS or time.monotonic() - last_drain >= BUFFER_SECONDS:
+                        last_drain = _drain_buffer(buffer, writer)
+                    time.sleep(POLL_INTERVAL)
+                    print(f'Messages saved: {writer.count + len(buffer)}')
                 elif len(usernames) > 140 or len(comments) > 140:
                     print("Either usernames or comments exceed 140 characters.")
                     script = """
@@ -101,77 +263,145 @@ def ExtractDataPageTwitch(driver: webdriver.Firefox,  name_folder: str, name_fil
                     """
                     driver.execute_script(script)
             else:
+                Pace('twitch')
                 driver.refresh()
         except KeyboardInterrupt:
             LogMessage("WARNING", "Keyboard interruption detected. Ending scraping.")
-            for username, comment in zip(usernames, comments):
-                if comment not in seen_comments:
-                    seen_comments.add(comment)
-                    db['date_scraping'].append(now)
-                    db['time_live'].append(time_live)
-                    db['views'].append(views)
-                    db['username'].append(username)
-                    db['comment'].append(comment)
-            _create_csv(db,  name_folder, name_file)
             break
+        except WebDriverException as e:
+            # Raised so the driver pool replaces the crashed browser and retries
+            LogMessage("WARNING", f"Browser session failed: {str(e)} Saving the buffered messages.")
+            _drain_buffer(buffer, writer)
+            raise
         except Exception as e:
-            for username, comment in zip(usernames, comments):
-                if comment not in seen_comments:
-                    seen_comments.add(comment)
-                    db['date_scraping'].append(now)
-                    db['time_live'].append(time_live)
-                    db['views'].append(views)
-                    db['username'].append(username)
-                    db['comment'].append(comment)
-            _create_csv(db,  name_folder, name_file)
+            LogMessage("WARNING", f"Twitch scraping stopped. Error: {str(e)}")
             break
-    return db
+    _drain_buffer(buffer, writer)
 
 
-def _extract_usernames_comments(html_content: str) -> list:
+def _capture_with_observer(driver: webdriver.Firefox, writer: AppendOnlyWriter, dedupe: ChatDeduplicator,
+                           sampler: ViewerSampler, batch_size: int = 1000, poll_interval: float = 0.3) -> None:
     """
-    Extracts usernames from the provided HTML content.
+    Captures the chat with an injected MutationObserver and drains only the new messages.
 
-    This function parses the HTML content to extract usernames from Twitch chat messages.
+    The observer is installed again whenever the page reloads. A drain returns at most `batch_size`
+    messages; when fewer are returned the function waits `poll_interval` seconds before the next one.
+    The client time is set when the observer reads a line, so it changes when a reload renders the
+    chat backlog again; messages are identified by author and text within the window of `dedupe`,
+    as in the polling capture, so the lines read again after a reload are not saved twice.
 
     Args:
-        html_content (str): The HTML content of the Twitch chat page.
+        driver (webdriver.Firefox): The Selenium WebDriver instance used to interact with the web page.
+        writer (AppendOnlyWriter): The writer of the chat file.
+        dedupe (ChatDeduplicator): The filter of messages already saved.
+        sampler (ViewerSampler): The sampler of the viewers and the online status.
+        batch_size (int, optional): Maximum number of messages fetched per drain. Defaults to 1000.
+        poll_interval (float, optional): Seconds to wait when the buffer is empty. Defaults to 0.3.
+    """
+    buffer = ChatBuffer(['badges', 'timestamp_client'])
+    last_drain = time.monotonic()
+    installed = False
+    while True:
+        try:
+            if not installed:
+                if not _check_element_comments_presence(driver):
+                    Pace('twitch')
+                    driver.refresh()
+                    continue
+                driver.execute_script(_OBSERVER_SCRIPT)
+                installed = True
+                LogMessage("OK", "Chat observer installed.")
+            with Timed('drain_observer', 'twitch'):
+                batch = driver.execute_script(_DRAIN_SCRIPT, batch_size)
+            if batch is None:
+                # The page was reloaded and the buffer is gone
+                installed = False
+                continue
+            sample = sampler.Sample()
+            if batch:
+                now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                buffer.StartBatch(now, sample['uptime'], sample['viewers'])
+                for message in batch:
+                    username, comment = message.get('username'), message.get('comment')
+                    timestamp_client = message.get('timestamp_client')
+                    if dedupe.IsNew(username, comment):
+                        buffer.Append(username, comment, badges=message.get('badges'),
+                                      timestamp_client=timestamp_client)
+                if len(buffer) >= BUFFER_ROWS or time.monotonic() - last_drain >= BUFFER_SECONDS:
+                    last_drain = _drain_buffer(buffer, writer)
+                print(f'Messages saved: {writer.count + len(buffer)}')
+            if len(batch) < batch_size:
+                if not sample['online']:
+                    last_drain = _drain_buffer(buffer, writer)
+                    writer.Flush()
+                last_drain = _flush_if_due(buffer, writer, last_drain)
+                time.sleep(poll_interval)
+        except KeyboardInterrupt:
+            LogMessage("WARNING", "Keyboard interruption detected. Ending scraping.")
+            break
+        except WebDriverException as e:
+            # Raised so the driver pool replaces the crashed browser and retries
+            LogMessage("WARNING", f"Browser session failed: {str(e)} Saving the buffered messages.")
+            _drain_buffer(buffer, writer)
+            raise
+        except Exception as e:
+            LogMessage("WARNING", f"Twitch scraping stopped. Error: {str(e)}")
+            break
+    _drain_buffer(buffer, writer)
+
+
+def _drain_buffer(buffer: ChatBuffer, writer: AppendOnlyWriter) -> float:
+    """
+    Appends the buffered messages to the chat file and empties the buffer.
+
+    Args:
+        buffer (ChatBuffer): The buffered messages.
+        writer (AppendOnlyWriter): The writer of the chat file.
 
     Returns:
-        list: A list of usernames extracted from the HTML content.
+        float: The monotonic time of the drain.
     """
-    try:
-        soup = BeautifulSoup(html_content, 'html.parser')
-        usernames = [span.get_text() for span in soup.find_all('span', class_='chat-author__display-name')]
-        return usernames
-    except NoSuchElementException:
-        func_name = inspect.currentframe().f_code.co_name
-        docstring = inspect.getdoc(inspect.currentframe().f_back.f_locals[func_name])
-        LogMessage("WARNING", f"Element not found in function '{func_name}'. Docstring: {docstring}")
-        return []
-    except Exception as e:
-        func_name = inspect.currentframe().f_code.co_name
-        docstring = inspect.getdoc(inspect.currentframe().f_back.f_locals[func_name])
-        LogMessage("WARNING", f"An error occurred in function '{func_name}'. Docstring: {docstring}. Error: {str(e)}")
-        return []
+    if len(buffer):
+        with Timed('write', 'twitch'):
+            writer.WriteMany(buffer.Rows())
+        buffer.Clear()
+    return time.monotonic()
 
 
-def _extract_texts_comments(html_content: str) -> list:
+def _flush_if_due(buffer: ChatBuffer, writer: AppendOnlyWriter, last_drain: float) -> float:
     """
-    Extracts chat messages from the provided HTML content.
+    Writes the buffered messages once `BUFFER_SECONDS` have passed and flushes the chat file when
+    its flush interval is due, so the messages of a quiet chat do not stay in memory.
+
+    Args:
+        buffer (ChatBuffer): The buffered messages.
+        writer (AppendOnlyWriter): The writer of the chat file.
+        last_drain (float): The monotonic time of the last drain.
+
+    Returns:
+        float: The monotonic time of the last drain.
+    """
+    if len(buffer) and time.monotonic() - last_drain >= BUFFER_SECONDS:
+        last_drain = _drain_buffer(buffer, writer)
+    writer.FlushIfDue()
+    return last_drain
 
-    This function parses the HTML content to extract chat messages from Twitch.
+
+def _extract_usernames_comments(document: HTMLNode) -> list:
+    """
+    Extracts usernames from the parsed HTML content.
+
+    This function queries the parsed page to extract usernames from Twitch chat messages.
 
     Args:
-        html_content (str): The HTML content of the Twitch chat page.
+        document (HTMLNode): The Twitch chat page, parsed with `ParseHTML`.
 
     Returns:
-        list: A list of chat messages extracted from the HTML content.
+        list: A list of usernames extracted from the HTML content.
     """
     try:
-        soup = BeautifulSoup(html_content, 'html.parser')
-        comments = [span.get_text() for span in soup.find_all('span', attrs={'data-a-target': 'chat-line-message-body'})]
-        return comments
+        usernames = [span.Text() for span in document.Select(USERNAME_SELECTOR)]
+        return usernames
     except NoSuchElementException:
         func_name = inspect.currentframe().f_code.co_name
         docstring = inspect.getdoc(inspect.currentframe().f_back.f_locals[func_name])
@@ -184,26 +414,21 @@ def _extract_texts_comments(html_content: str) -> list:
         return []
 
 
-def _extract_views(driver: webdriver.Firefox) -> str:
-    try:
-        xpath = '//p[@data-a-target="animated-channel-viewers-count"]'
-        return driver.find_element(By.XPATH, xpath).text
-    except NoSuchElementException:
-        func_name = inspect.currentframe().f_code.co_name
-        docstring = inspect.getdoc(inspect.currentframe().f_back.f_locals[func_name])
-        LogMessage("WARNING", f"Element not found in function '{func_name}'. Docstring: {docstring}")
-        return 'None'
-    except Exception as e:
-        func_name = inspect.currentframe().f_code.co_name
-        docstring = inspect.getdoc(inspect.currentframe().f_back.f_locals[func_name])
-        LogMessage("WARNING", f"An error occurred in function '{func_name}'. Docstring: {docstring}. Error: {str(e)}")
-        return 'None'
+def _extract_texts_comments(document: HTMLNode) -> list:
+    """
+    Extracts chat messages from the parsed HTML content.
+
+    This function queries the parsed page to extract chat messages from Twitch.
 
+    Args:
+        document (HTMLNode): The Twitch chat page, parsed with `ParseHTML`.
 
-def _extract_time_live(driver: webdriver.Firefox):
+    Returns:
+        list: A list of chat messages extracted from the HTML content.
+    """
     try:
-        xpath = '//span[@class="live-time"]'
-        return driver.find_element(By.XPATH, xpath).text
+        comments = [span.Text() for span in document.Select(MESSAGE_SELECTOR)]
+        return comments
     except NoSuchElementException:
         func_name = inspect.currentframe().f_code.co_name
         docstring = inspect.getdoc(inspect.currentframe().f_back.f_locals[func_name])
@@ -229,8 +454,7 @@ def _check_element_comments_presence(driver: webdriver.Firefox) -> bool:
         bool: True if the element is found, False otherwise.
     """
     try:
-        xpath = "//div[@class='Layout-sc-1xcs6mc-0 InjectLayout-sc-1i43xsx-0 chat-list--default font-scale--default iClcoJ']"
-        driver.find_element(By.XPATH, xpath)
+        driver.find_element(By.XPATH, READY_XPATH)
         print('Element of comments found.')
         return True
     except Exception as e:
@@ -238,38 +462,45 @@ def _check_element_comments_presence(driver: webdriver.Firefox) -> bool:
         return False
 
 
-def _check_offline(driver: webdriver.Firefox) -> bool:
-    try:
-        xpath = '//div[@class="Layout-sc-1xcs6mc-0 exGAHk channel-status-info channel-status-info--offline"]'
-        driver.find_element(By.XPATH, xpath)
-        LogMessage("WARNING", "Offline channel.")
-        return True
-    except Exception as e:
-        return False
+def _parse_viewers(text: str) -> int:
+    """
+    Converts the viewer count shown by Twitch, such as '1,234' or '1.2K', to an integer.
 
+    Args:
+        text (str): The viewer count text.
 
-def _create_csv(data: list, name_folder: str, name_file: str) -> None:
+    Returns:
+        int: The number of viewers, or None if the text is missing or not a number.
     """
-    Creates or appends data to a CSV file.
+    if not text:
+        return None
+    text = text.strip().upper().replace(',', '').replace(' ', '')
+    multiplier = 1
+    if text[-1:] in ['K', 'M']:
+        multiplier = 1000 if text[-1] == 'K' else 1000000
+        text = text[:-1]
+    try:
+        return int(float(text) * multiplier)
+    except ValueError:
+        return None
 
-    This function saves the provided data to a CSV file. If the CSV file does not exist, it will be created. 
-    If the file already exists, the new data will be appended to the existing content.
+
+def _parse_uptime(text: str) -> int:
+    """
+    Converts the live time shown by Twitch, such as '1:02:03', to seconds.
 
     Args:
-        data (list of dict): The data to be saved in the CSV file.
-        name_folder (str): The folder where the CSV file will be saved.
-        name_file (str): The name of the CSV file.
+        text (str): The live time text.
+
+    Returns:
+        int: The seconds the stream has been live, or None if the text is missing or not a time.
     """
-    df_data = pd.DataFrame(data)
-    os.makedirs(name_folder, exist_ok=True)
-    csv_file_path = os.path.join(name_folder, name_file)
-    if not os.path.isfile(csv_file_path):
-        # File does not exist, create and save it
-        df_data.to_csv(csv_file_path, index=False)
-        LogMessage('OK', f"CSV file created and data saved to {csv_file_path}.")
-    else:
-        # File exists, append data
-        df_existing = pd.read_csv(csv_file_path)
-        df_concat = pd.concat([df_existing, df_data], ignore_index=True)
-        df_concat.to_csv(csv_file_path, index=False)
-        LogMessage('OK', f"Data appended to existing CSV file {csv_file_path}.")
+    if not text:
+        return None
+    seconds = 0
+    try:
+        for part in text.strip().split(':'):
+            seconds = seconds * 60 + int(part)
+    except ValueError:
+        return None
+    return seconds
@@ -16,61 +16,376 @@
 
 
 import inspect
-import time
+import json
+import os
 import datetime
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.common.exceptions import NoSuchElementException
 from app.services.files.actions import LogMessage
+from app.services.utils.continuations import CONTINUATION_PATH, ParseCommentResponses
+from app.services.utils.metrics import Timed
+from app.services.utils.pacing import Pace
+
+
+# Watch metadata element, the readiness probe of the page
+READY_XPATH = '//ytd-watch-metadata//h1/yt-formatted-string'
+
+
+COMMENT_RECORD_FIELDS = ['username', 'text', 'emojis', 'n_like', 'n_response', 'date']
+
+
+_VIDEO_JS = """
+const first = (path) => document.evaluate(path, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+const all = (path) => {
+    const result = document.evaluate(path, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    const nodes = [];
+    for (let i = 0; i < result.snapshotLength; i++) nodes.push(result.snapshotItem(i));
+    return nodes;
+};
+const text = (node) => node ? node.innerText.trim() : 'None';
+const channel = first('//yt-formatted-string[@class="style-scope ytd-channel-name complex-string"]/a');
+const bold = all('//span[@class="style-scope yt-formatted-string bold"]');
+const info = first('//div[@id="info-container"]');
+const infoText = info ? info.innerText.replace(/\\n/g, '').trim() : 'None';
+const description = first('//ytd-text-inline-expander[@id="description-inline-expander"]//yt-attributed-string')
+    || first('//ytd-text-inline-expander[@id="description-inline-expander"]');
+const likes = first('//button[contains(@class, "yt-spec-button-shape-next--segmented-start")]//div[@class="yt-spec-button-shape-next__button-text-content"]');
+const video = {
+    url_post: window.location.href,
+    channel_name: text(channel),
+    count_subscribers: text(first('//yt-formatted-string[@class="style-scope ytd-video-owner-renderer"]')),
+    id_channel: channel ? channel.href : 'None',
+    title: text(first('//h1/yt-formatted-string[@class="style-scope ytd-watch-metadata"]')),
+    description: description ? description.textContent.trim() : 'None',
+    views: bold.length > 0 ? text(bold[0]) : infoText,
+    count_comment: all('//yt-formatted-string[contains(@class, "count-text")]//span').map(text).join(' '),
+    count_likes: text(likes),
+    upload: bold.length > 2 ? text(bold[2]) : infoText
+};
+"""
+
+
+_READ_THREAD_JS = """
+const readThread = (thread) => {
+    const header = thread.querySelector('#header-author');
+    let username = null;
+    if (header) {
+        const link = header.querySelector('a#author-text') || header.querySelector('a');
+        const span = header.querySelector('span');
+        username = link ? (link.innerText.trim() || link.href) : (span ? span.innerText.trim() : null);
+    }
+    const content = thread.querySelector('#content-text');
+    const emojis = content ? Array.from(content.querySelectorAll('img'), (img) => img.src) : [];
+    const likes = thread.querySelector('#vote-count-middle');
+    const replies = thread.querySelector('ytd-comment-replies-renderer button[aria-label]');
+    const date = thread.querySelector('#published-time-text a');
+    return {
+        username: username,
+        text: content ? content.innerText : '',
+        emojis: emojis,
+        n_like: likes ? likes.innerText.trim() : '',
+        n_response: replies ? replies.getAttribute('aria-label') : null,
+        date: date ? date.innerText.trim() : ''
+    };
+};
+"""
+
+
+_SNAPSHOT_SCRIPT = _VIDEO_JS + _READ_THREAD_JS + """
+const comments = Array.from(document.querySelectorAll('ytd-comment-thread-renderer'), readThread);
+return {video: video, comments: comments};
+"""
+
+
+_VIDEO_SCRIPT = _VIDEO_JS + """
+return video;
+"""
+
+
+# Scrolls to the comments continuation and resolves as soon as the thread count grows,
+# the continuation disappears or the timeout expires. The threads already removed by
+# `_STREAM_SCRIPT` are still counted, so the count keeps growing while comments are streamed
+_WAIT_THREADS_SCRIPT = """
+const done = arguments[arguments.length - 1];
+const previous = arguments[0];
+const timeout = arguments[1];
+const count = () => document.querySelectorAll('ytd-comment-thread-renderer').length + (window.__digimonitorStreamed || 0);
+const continuation = () => document.querySelector('ytd-comments ytd-continuation-item-renderer');
+const isEnd = () => count() > 0 && !continuation();
+let finished = false;
+let observer = null;
+let timer = null;
+const report = (reason) => {
+    if (finished) return;
+    finished = true;
+    if (observer) observer.disconnect();
+    clearTimeout(timer);
+    done({count: count(), end: isEnd(), reason: reason});
+};
+const target = continuation();
+if (target) {
+    target.scrollIntoView();
+} else {
+    window.scrollTo(0, document.documentElement.scrollHeight);
+}
+if (count() > previous) {
+    report('mutation');
+} else if (isEnd()) {
+    report('end');
+} else {
+    observer = new MutationObserver(() => {
+        if (count() > previous || isEnd()) report('mutation');
+    });
+    observer.observe(document.querySelector('ytd-comments') || document.body, {childList: true, subtree: true});
+    timer = setTimeout(() => report('timeout'), timeout);
+}
+"""
+
+
+# Reads the comment threads that have finished rendering and removes them from the DOM
+_STREAM_SCRIPT = _READ_THREAD_JS + """
+const ready = Array.from(document.querySelectorAll('ytd-comment-thread-renderer'))
+    .filter((thread) => thread.querySelector('#content-text'));
+const comments = ready.map(readThread);
+ready.forEach((thread) => thread.remove());
+window.__digimonitorStreamed = (window.__digimonitorStreamed || 0) + ready.length;
+return comments;
+"""
+
+
+# Wraps fetch and XMLHttpRequest so that the page keeps a copy of the body of every response
+# whose URL contains the path given as argument
+_CAPTURE_NETWORK_SCRIPT = """
+if (window.__digimonitorResponses) return true;
+const path = arguments[0];
+const buffer = window.__digimonitorResponses = [];
+const keep = (url, body) => {
+    if (url && String(url).indexOf(path) !== -1 && typeof body === 'string') buffer.push(body);
+};
+const originalFetch = window.fetch;
+window.fetch = function (...args) {
+    return originalFetch.apply(this, args).then((response) => {
+        if (response.url && response.url.indexOf(path) !== -1) {
+            response.clone().text().then((body) => keep(response.url, body)).catch(() => {});
+        }
+        return response;
+    });
+};
+const originalOpen = XMLHttpRequest.prototype.open;
+XMLHttpRequest.prototype.open = function (method, url, ...rest) {
+    this.__digimonitorUrl = url;
+    return originalOpen.call(this, method, url, ...rest);
+};
+const originalSend = XMLHttpRequest.prototype.send;
+XMLHttpRequest.prototype.send = function (...args) {
+    this.addEventListener('load', () => {
+        try { keep(this.__digimonitorUrl, this.responseText); } catch (e) {}
+    });
+    return originalSend.apply(this, args);
+};
+return true;
+"""
+
+
+# Hands over the response bodies captured since the previous call
+_DRAIN_NETWORK_SCRIPT = """
+const buffer = window.__digimonitorResponses || [];
+return buffer.splice(0, buffer.length);
+"""
+
+
+def ScrollDownPageYouTube(driver: webdriver.Firefox, max_comments: int = None) -> None:
+    """
+    Scrolls down the loaded YouTube page until every comment thread has been loaded.
 
+    Each step scrolls the comments continuation into view and waits, through the
+    `_WAIT_THREADS_SCRIPT` mutation observer, until new comment threads appear instead of
+    sleeping a fixed time. Scrolling stops when the continuation spinner is gone (the real end
+    of the comment list), when `max_comments` threads are loaded, or after several steps in a
+    row without new threads.
 
-def ScrollDownPageYouTube(driver: webdriver.Firefox) -> None:
+    Args:
+        driver (webdriver.Firefox): The Firefox WebDriver instance used to interact with the page.
+        max_comments (int, optional): Stop once this number of comment threads is loaded.
     """
-    Scrolls down the loaded YouTube page to load more content.
+    max_attempts = 3  # Maximum number of steps without new comments
+    current_attempt = 0
+    count = 0
+    while current_attempt < max_attempts:
+        state = _wait_for_threads(driver, count)
+        if state['count'] > count:
+            count = state['count']
+            current_attempt = 0  # Reset verification attempts
+            LogMessage("INFO", f"Comment threads loaded: {count}")
+        else:
+            current_attempt += 1
+            LogMessage('INFO', f"Attempt {current_attempt}: No new comment threads.")
+        if state['end']:
+            LogMessage("INFO", "End of the comment list reached.")
+            break
+        if max_comments and count >= max_comments:
+            LogMessage("INFO", f"Target of {max_comments} comments reached.")
+            break
+    LogMessage("INFO", "Scrolling complete or maximum attempts reached.")
+
 
-    This function uses JavaScript to determine the total height of the page and scrolls down
-    incrementally to load more comments or dynamically loaded elements. It checks if the DOM has
-    changed after each scroll to adjust the scrolling accordingly.
+def StreamDataPageYouTube(driver: webdriver.Firefox, name_folder: str, name_file: str, max_comments: int = None) -> dict:
+    """
+    Scrolls a YouTube video page and writes its comments to disk while they load.
+
+    The video metadata is read once at the start. After each scroll batch the comment threads
+    that have finished rendering are extracted with `_STREAM_SCRIPT`, appended as JSON lines to
+    a file next to `name_file` and removed from the DOM, so the browser memory and the cost of
+    each scroll stay flat however long the comment section is. Scrolling stops at the end of
+    the comment list, when `max_comments` records are written, or when several batches in a
+    row bring no new threads.
 
     Args:
-        driver (webdriver.Firefox): The Firefox WebDriver instance used to interact with the page.
+        driver (webdriver.Firefox): The WebDriver instance used to interact with the YouTube page.
+        name_folder (str): The folder where the comments file will be saved.
+        name_file (str): The name of the JSON file of the video; the comments file takes the same
+                         name with the '.jsonl' extension.
+        max_comments (int, optional): Stop once this number of comment records is written.
+
+    Returns:
+        dict: The video data with the keys of `ExtractDataPageYouTube`, where the comments are
+              replaced by:
+            - comments_file (str): Path of the JSON lines file with one comment record per line.
+            - count_records (int): Number of comment records written.
     """
-    script = """
-    return {
-        pageHeight: Math.max(document.body.scrollHeight, document.body.offsetHeight, 
-                            document.documentElement.clientHeight, document.documentElement.scrollHeight, document.documentElement.offsetHeight)
-    };
+    try:
+        video = driver.execute_script(_VIDEO_SCRIPT)
+    except Exception as e:
+        LogMessage("WARNING", f"Video metadata could not be extracted. Error: {str(e)}")
+        video = {}
+    os.makedirs(name_folder, exist_ok=True)
+    comments_path = os.path.join(name_folder, os.path.splitext(name_file)[0] + '.jsonl')
+    max_attempts = 3  # Maximum number of batches without new comments
+    current_attempt = 0
+    count = 0
+    loaded = 0  # Threads loaded so far, including the ones already removed from the DOM
+    with open(comments_path, 'a', encoding='utf-8') as comments_file:
+        while current_attempt < max_attempts:
+            state = _wait_for_threads(driver, loaded)
+            loaded = state['count']
+            batch = _filter_comment_records(driver.execute_script(_STREAM_SCRIPT) or [])
+            if batch:
+                for record in batch:
+                    comments_file.write(json.dumps(record, ensure_ascii=False) + '\n')
+                comments_file.flush()
+                count += len(batch)
+                current_attempt = 0
+                LogMessage("INFO", f"Flushed {len(batch)} comments ({count} in total).")
+            else:
+                current_attempt += 1
+                LogMessage('INFO', f"Attempt {current_attempt}: No new comments loaded.")
+            if state['end'] and not batch:
+                LogMessage("INFO", "End of the comment list reached.")
+                break
+            if max_comments and count >= max_comments:
+                LogMessage("INFO", f"Target of {max_comments} comments reached.")
+                break
+    LogMessage("INFO", f"Streaming complete: {count} comments saved in {comments_path}.")
+    data = {"date_scraping": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+    for key in ['url_post', 'channel_name', 'count_subscribers', 'id_channel', 'title', 'description',
+                'views', 'count_comment', 'count_likes', 'upload']:
+        data[key] = video.get(key, 'None')
+    data['comments_file'] = comments_path
+    data['count_records'] = count
+    return data
+
+
+def CaptureDataPageYouTube(driver: webdriver.Firefox, records: bool = False, max_comments: int = None) -> dict:
     """
-    dimensions = driver.execute_script(script)
-    page_init_height = dimensions['pageHeight']
-    LogMessage("INFO", f"Initial total page height: {page_init_height}")
-    max_attempts = 3  # Maximum number of verification attempts
+    Scrolls a YouTube video page and builds its comments from the JSON responses of the page.
+
+    Before scrolling, `_CAPTURE_NETWORK_SCRIPT` makes the page keep a copy of every comment
+    continuation response (`CONTINUATION_PATH`). After each scroll batch the captured bodies are
+    handed over and parsed with `ParseCommentResponses`, so the comments come from the data the
+    page renders instead of from its markup, and changes in the DOM of the comments do not break
+    them. The video metadata is still read from the page. If no response was captured but the
+    page shows comments, they are read from the DOM as in `ExtractDataPageYouTubeSnapshot`.
+
+    Args:
+        driver (webdriver.Firefox): The WebDriver instance used to interact with the YouTube page.
+        records (bool, optional): Return one record per comment under the 'comments' key instead
+                                  of the 'comment' lists. Defaults to False.
+        max_comments (int, optional): Stop once this number of comments is captured.
+
+    Returns:
+        dict: A dictionary with the same keys as the one returned by `ExtractDataPageYouTube`.
+    """
+    driver.execute_script(_CAPTURE_NETWORK_SCRIPT, CONTINUATION_PATH)
+    comments = []
+    seen = set()
+    responses = 0
+    max_attempts = 3  # Maximum number of batches without new comments
     current_attempt = 0
+    count = 0
     while current_attempt < max_attempts:
-        # Scroll down incrementally
-        for _ in range(5):  # Perform 5 small scrolls down
-            driver.execute_script("window.scrollBy(0, 449);")  # Scroll down 449 pixels
-            time.sleep(0.5)  # Small pause between scrolls
-        # Scroll up slightly to adjust
-        driver.execute_script("window.scrollBy(0, -169);")
-        time.sleep(0.5)
-        # Get the new page dimensions after scroll
-        dimensions = driver.execute_script(script)
-        page_last_height = dimensions['pageHeight']
-        LogMessage("INFO", f"New total page height: {page_last_height}")
-        # Check if the page height has stopped updating
-        if page_init_height == page_last_height:
-            current_attempt += 1
-            LogMessage('INFO', f"Attempt {current_attempt}: Page height has not changed.")
-            driver.execute_script("window.scrollBy(0, 449);")  # Scroll down a bit more to test
-            time.sleep(0.5)
+        state = _wait_for_threads(driver, count)
+        count = state['count']
+        bodies = driver.execute_script(_DRAIN_NETWORK_SCRIPT) or []
+        responses += len(bodies)
+        with Timed('parse_responses', 'youtube'):
+            batch = _filter_comment_records(ParseCommentResponses(bodies, seen))
+        if batch:
+            comments.extend(batch)
+            current_attempt = 0
+            LogMessage("INFO", f"Captured {len(batch)} comments ({len(comments)} in total).")
         else:
-            page_init_height = page_last_height
-            current_attempt = 0  # Reset verification attempts
-    LogMessage("INFO", "Scrolling complete or maximum attempts reached.")
+            current_attempt += 1
+            LogMessage('INFO', f"Attempt {current_attempt}: No new comment responses.")
+        if state['end'] and not batch:
+            LogMessage("INFO", "End of the comment list reached.")
+            break
+        if max_comments and len(comments) >= max_comments:
+            LogMessage("INFO", f"Target of {max_comments} comments reached.")
+            break
+    LogMessage("INFO", f"Network capture complete: {len(comments)} comments from {responses} responses.")
+    if not responses and count:
+        LogMessage("WARNING", "No comment responses were captured, reading the comments from the page.")
+        return ExtractDataPageYouTubeSnapshot(driver, records)
+    try:
+        video = driver.execute_script(_VIDEO_SCRIPT)
+    except Exception as e:
+        LogMessage("WARNING", f"Video metadata could not be extracted. Error: {str(e)}")
+        video = {}
+    data = {"date_scraping": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+    for key in ['url_post', 'channel_name', 'count_subscribers', 'id_channel', 'title', 'description',
+                'views', 'count_comment', 'count_likes', 'upload']:
+        data[key] = video.get(key, 'None')
+    if records:
+        data['comments'] = comments
+    else:
+        data['comment'] = CommentRecordsToColumns(comments)
+    _log_comment_sizes(data)
+    return data
+
 
+def _wait_for_threads(driver: webdriver.Firefox, previous: int, timeout: float = 10) -> dict:
+    """
+    Scrolls the comments continuation into view and waits until new comment threads appear.
+
+    Args:
+        driver (webdriver.Firefox): The Firefox WebDriver instance used to interact with the page.
+        previous (int): Number of comment threads already loaded.
+        timeout (float, optional): Maximum number of seconds to wait. Defaults to 10.
+
+    Returns:
+        dict: The state of the comment list with the keys:
+            - count (int): Number of comment threads loaded, in the DOM or already streamed out of it.
+            - end (bool): True if the continuation spinner is gone after some threads were loaded.
+            - reason (str): 'mutation' if new threads appeared, 'end' if the list had already ended,
+                            'timeout' otherwise.
+    """
+    Pace('youtube')
+    driver.set_script_timeout(timeout + 5)
+    return driver.execute_async_script(_WAIT_THREADS_SCRIPT, previous, int(timeout * 1000))
 
-def ExtractDataPageYouTube(driver: webdriver.Firefox) -> dict:
+
+def ExtractDataPageYouTube(driver: webdriver.Firefox, records: bool = False) -> dict:
     """
     Extracts data from a YouTube video page using the specified WebDriver instance.
 
@@ -80,6 +395,8 @@ def ExtractDataPageYouTube(driver: webdriver.Firefox) -> dict:
 
     Args:
         driver (webdriver.Firefox): The WebDriver instance used to interact with the YouTube page.
+        records (bool, optional): Walk each comment thread once and return one record per comment
+                                  under the 'comments' key instead of the 'comment' lists. Defaults to False.
 
     Returns:
         dict: A dictionary containing extracted data, including:
@@ -100,41 +417,137 @@ def ExtractDataPageYouTube(driver: webdriver.Firefox) -> dict:
                 - n_like (list of str): Number of likes on each comment.
                 - n_response (list of str): Number of responses to each comment.
                 - date (list of str): Dates of each comment.
+            - comments (list of dict): Only when `records` is enabled, replaces 'comment'. One record
+              per comment with the keys of `COMMENT_RECORD_FIELDS`.
+    """
+    fields = {
+        "url_post": _extract_url_post,
+        "channel_name": _extract_name_channel,
+        "count_subscribers": _extract_count_subscribers,
+        "id_channel": _extract_id_channel,
+        "title": _extract_title_post,
+        'description': _extract_description,
+        "views": _extract_count_views,
+        "count_comment": _extract_count_comments,
+        "count_likes": _extract_count_likes,
+        "upload": _extract_upload,
+    }
+    comment_fields = {
+        "username": _extract_usernames,
+        "emoji": _extract_comments_emojis,
+        "n_like": _extract_n_likes,
+        "n_response": _extract_n_responses,
+        "date": _extract_dates
+    }
+    data = {"date_scraping": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+    # Each field is timed on its own, to find the slow XPath lookups
+    for key, extract in fields.items():
+        with Timed(f'extract_{key}', 'youtube'):
+            data[key] = extract(driver)
+    if records:
+        with Timed('extract_comments', 'youtube'):
+            data['comments'] = _extract_comment_records(driver)
+    else:
+        data['comment'] = {}
+        for key, extract in comment_fields.items():
+            with Timed(f'extract_comment_{key}', 'youtube'):
+                data['comment'][key] = extract(driver)
+    _log_comment_sizes(data)
+    return data
+
+
+def ExtractDataPageYouTubeSnapshot(driver: webdriver.Firefox, records: bool = False) -> dict:
     """
+    Extracts data from a YouTube video page with a single injected script.
+
+    The video metadata and every comment field are gathered inside the browser by
+    `_SNAPSHOT_SCRIPT` and returned in one WebDriver round trip, so the extraction time no
+    longer grows with the number of comments on the page. Each comment thread is read once,
+    which keeps the comment lists aligned. If the script fails, the XPath based
+    `ExtractDataPageYouTube` is used instead.
+
+    Args:
+        driver (webdriver.Firefox): The WebDriver instance used to interact with the YouTube page.
+        records (bool, optional): Return one record per comment under the 'comments' key instead
+                                  of the 'comment' lists. Defaults to False.
+
+    Returns:
+        dict: A dictionary with the same keys as the one returned by `ExtractDataPageYouTube`.
+    """
+    try:
+        snapshot = driver.execute_script(_SNAPSHOT_SCRIPT)
+    except Exception as e:
+        LogMessage("WARNING", f"Snapshot script failed, falling back to XPath extraction. Error: {str(e)}")
+        return ExtractDataPageYouTube(driver, records)
+    video = snapshot.get('video', {})
+    comments = _filter_comment_records(snapshot.get('comments', []))
     data = {
         "date_scraping": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "url_post": _extract_url_post(driver),
-        "channel_name": _extract_name_channel(driver),
-        "count_subscribers": _extract_count_subscribers(driver),
-        "id_channel": _extract_id_channel(driver),
-        "title": _extract_title_post(driver),
-        'description': _extract_description(driver),
-        "views": _extract_count_views(driver),
-        "count_comment": _extract_count_comments(driver),
-        "count_likes": _extract_count_likes(driver),
-        "upload": _extract_upload(driver),
-        "comment": {
-            "username": _extract_usernames(driver),
-            "emoji": _extract_comments_emojis(driver),
-            "n_like": _extract_n_likes(driver),
-            "n_response": _extract_n_responses(driver),
-            "date": _extract_dates(driver)
-        }
+        "url_post": video.get('url_post', 'None'),
+        "channel_name": video.get('channel_name', 'None'),
+        "count_subscribers": video.get('count_subscribers', 'None'),
+        "id_channel": video.get('id_channel', 'None'),
+        "title": video.get('title', 'None'),
+        'description': video.get('description', 'None'),
+        "views": video.get('views', 'None'),
+        "count_comment": video.get('count_comment', 'None'),
+        "count_likes": video.get('count_likes', 'None'),
+        "upload": video.get('upload', 'None'),
     }
-    # Print sizes of extracted data for verification
-    username = len(data['comment'].get('username', []))
-    emoji = len(data['comment'].get('emoji', []))
-    n_like = len(data['comment'].get('n_like', []))
-    n_response = len(data['comment'].get('n_response', []))
-    date = len(data['comment'].get('date', []))
-    LogMessage("INFO", f'Size of "username": {username}')
-    LogMessage("INFO", f'Size of "emoji": {emoji}')
-    LogMessage("INFO", f'Size of "n_like": {n_like}')
-    LogMessage("INFO", f'Size of "n_response": {n_response}')
-    LogMessage("INFO", f'Size of "date": {date}')
+    if records:
+        data['comments'] = comments
+    else:
+        data['comment'] = CommentRecordsToColumns(comments)
+    _log_comment_sizes(data)
     return data
 
 
+def CommentRecordsToColumns(records: list) -> dict:
+    """
+    Converts a list of comment records into the 'comment' lists of the YouTube output.
+
+    Args:
+        records (list of dict): Comment records with the keys of `COMMENT_RECORD_FIELDS`.
+
+    Returns:
+        dict: A dictionary with the 'username', 'emoji', 'n_like', 'n_response' and 'date' lists.
+    """
+    return {
+        "username": [item.get('username') for item in records],
+        "emoji": [[item.get('text', ''), item.get('emojis', [])] for item in records],
+        "n_like": [item.get('n_like', '') for item in records],
+        "n_response": [item.get('n_response') for item in records],
+        "date": [item.get('date', '') for item in records]
+    }
+
+
+def _filter_comment_records(records: list) -> list:
+    """
+    Removes the comment records that carry no author, text or emoji.
+
+    Args:
+        records (list of dict): Comment records with the keys of `COMMENT_RECORD_FIELDS`.
+
+    Returns:
+        list of dict: The non-empty records, in their original order.
+    """
+    return [item for item in records if item.get('username') or item.get('text') or item.get('emojis')]
+
+
+def _log_comment_sizes(data: dict) -> None:
+    """
+    Logs the size of each comment list of the extracted data for verification.
+
+    Args:
+        data (dict): The data returned by a YouTube extractor.
+    """
+    if 'comments' in data:
+        LogMessage("INFO", f'Number of comment records: {len(data["comments"])}')
+        return
+    for key in ['username', 'emoji', 'n_like', 'n_response', 'date']:
+        LogMessage("INFO", f'Size of "{key}": {len(data["comment"].get(key, []))}')
+
+
 def _extract_url_post(driver: webdriver.Firefox) -> str:
     """
     Extracts the URL of the YouTube post.
@@ -478,10 +891,7 @@ def _extract_comments_emojis(driver: webdriver.Firefox) -> list:
             emoji_element = [element.get_attribute('src') for element in emojis_items]
             comentario = [com, emoji_element]
             elements.append(comentario)
-        for i in range(len(elements)):
-            for item in elements:
-                if len(item[0]) == 0 and len(item[1]) == 0:
-                    elements.remove(item)
+        elements = [item for item in elements if len(item[0]) > 0 or len(item[1]) > 0]
         return elements
     except NoSuchElementException:
         func_name = inspect.currentframe().f_code.co_name
@@ -578,3 +988,61 @@ def _extract_dates(driver: webdriver.Firefox) -> list:
         docstring = inspect.getdoc(inspect.currentframe().f_back.f_locals[func_name])
         LogMessage("WARNING", f"An error occurred in function '{func_name}'. Docstring: {docstring}. Error: {str(e)}")
         return []
+
+
+def _extract_comment_records(driver: webdriver.Firefox) -> list:
+    """
+    Extracts one record per comment by walking each comment thread once.
+
+    Every field is read relative to its own `ytd-comment-thread-renderer`, so a missing field
+    only leaves an empty value in that record instead of shifting the other comments.
+
+    Args:
+        driver (webdriver.Firefox): The WebDriver instance used to interact with the YouTube page.
+
+    Returns:
+        list of dict: List of comment records with the keys of `COMMENT_RECORD_FIELDS`.
+    """
+    records = []
+    xpath = '//ytd-comment-thread-renderer'
+    try:
+        for thread in driver.find_elements(By.XPATH, xpath):
+            username = None
+            links = thread.find_elements(By.XPATH, './/div[@id="header-author"]//a')
+            if links:
+                username = links[0].text or links[0].get_attribute('href')
+            else:
+                spans = thread.find_elements(By.XPATH, './/div[@id="header-author"]//span')
+                username = spans[0].text if spans else None
+            contents = thread.find_elements(By.XPATH, './/*[@id="content-text"]')
+            emojis = contents[0].find_elements(By.XPATH, './/img') if contents else []
+            replies = thread.find_elements(By.XPATH, './/ytd-comment-replies-renderer//button[@aria-label]')
+            records.append({
+                'username': username,
+                'text': contents[0].text if contents else '',
+                'emojis': [element.get_attribute('src') for element in emojis],
+                'n_like': _first_text(thread, './/span[@id="vote-count-middle"]'),
+                'n_response': replies[0].get_attribute('aria-label') if replies else None,
+                'date': _first_text(thread, './/span[@id="published-time-text"]/a')
+            })
+        return _filter_comment_records(records)
+    except Exception as e:
+        func_name = inspect.currentframe().f_code.co_name
+        docstring = inspect.getdoc(inspect.currentframe().f_back.f_locals[func_name])
+        LogMessage("WARNING", f"An error occurred in function '{func_name}'. Docstring: {docstring}. Error: {str(e)}")
+        return _filter_comment_records(records)
+
+
+def _first_text(element, xpath: str) -> str:
+    """
+    Returns the text of the first descendant of an element matching an XPath.
+
+    Args:
+        element (WebElement): The element to search in.
+        xpath (str): The relative XPath of the descendant.
+
+    Returns:
+        str: The text of the descendant, or an empty string if there is none.
+    """
+    found = element.find_elements(By.XPATH, xpath)
+    return found[0].text if found else ''
@@ -0,0 +1,187 @@
+# Digimonitor is part of the DIGIBOOK collection.
+# DIGIBOOK Copyright (C) 2024 Daniel Alcalá.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import sys
+import time
+from array import array
+from collections import OrderedDict
+
+
+# Columns of the Twitch chat files, shared by the browser and the IRC captures
+CHAT_COLUMNS = ['date_scraping', 'time_live', 'views', 'username', 'comment']
+
+class ChatDeduplicator:
+    def __init__(self, window_seconds: float = 120, max_entries: int = 50000):
+        """
+        Initializes a bounded filter of repeated chat messages.
+
+        A message is identified by (user, text, message time). It counts as a repetition while it
+        has been seen within the last `window_seconds`; every sighting refreshes its time, so a
+        message that stays visible in the chat is never saved twice. Older entries expire and, in
+        any case, at most `max_entries` are kept, evicting the least recently seen ones.
+
+        Args:
+            window_seconds (float, optional): Seconds a message is remembered after its last sighting.
+                                              Defaults to 120.
+            max_entries (int, optional): Maximum number of messages remembered. Defaults to 50000.
+
+        Example:
+            >>> dedupe = ChatDeduplicator()
+            >>> dedupe.IsNew('user', 'LUL'), dedupe.IsNew('other', 'LUL'), dedupe.IsNew('user', 'LUL')
+            (True, True, False)
+        """
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+        self.seen = OrderedDict()
+
+
+    def IsNew(self, username: str, comment: str, message_time: str = None) -> bool:
+        """
+        Checks whether a message was not seen within the window, and remembers it.
+
+        Args:
+            username (str): The author of the message.
+            comment (str): The text of the message.
+            message_time (str, optional): The time of the message, if the source provides one.
+
+        Returns:
+            bool: True if the message is new.
+        """
+        now = time.monotonic()
+        self._expire(now)
+        key = (username, comment, message_time)
+        is_new = key not in self.seen
+        self.seen[key] = now
+        self.seen.move_to_end(key)
+        if len(self.seen) > self.max_entries:
+            self.seen.popitem(last=False)
+        return is_new
+
+
+    def __len__(self) -> int:
+        return len(self.seen)
+
+
+    def _expire(self, now: float) -> None:
+        """
+        Forgets the messages not seen for more than `window_seconds`.
+
+        Args:
+            now (float): The current monotonic time.
+        """
+        while self.seen:
+            key, last_seen = next(iter(self.seen.items()))
+            if now - last_seen <= self.window_seconds:
+                break
+            self.seen.popitem(last=False)
+
+
+class ChatBuffer:
+    def __init__(self, extra_columns: list = None):
+        """
+        Initializes a compact in-memory buffer of chat messages.
+
+        Usernames are interned and stored as indexes in an integer array. The sampling columns
+        (scraping time, live time and viewers) are stored once per batch, and each message only
+        keeps the index of its batch.
+
+        Args:
+            extra_columns (list of str, optional): Additional per-message columns, such as 'badges'.
+
+        Example:
+            >>> buffer = ChatBuffer()
+            >>> buffer.StartBatch('2024-07-30 03:18:56', '1:02:03', '1,234')
+            >>> buffer.Append('user', 'Hi')
+            >>> list(buffer.Rows())[0]['views']
+            '1,234'
+        """
+        self.extra_columns = extra_columns or []
+        self.Clear()
+
+
+    def StartBatch(self, date_scraping: str, time_live: str, views: str) -> None:
+        """
+        Starts a batch of messages that share the same sampling values.
+
+        Args:
+            date_scraping (str): Timestamp of the poll.
+            time_live (str): Time the stream has been live at the poll.
+            views (str): Viewer count at the poll.
+        """
+        self.batches.append((date_scraping, time_live, views))
+
+
+    def Append(self, username: str, comment: str, **extra) -> None:
+        """
+        Adds a message to the current batch.
+
+        Args:
+            username (str): The author of the message.
+            comment (str): The text of the message.
+            **extra: Values of the `extra_columns`.
+        """
+        if not self.batches:
+            self.StartBatch(None, None, None)
+        user_id = self.user_ids.get(username)
+        if user_id is None:
+            user_id = len(self.usernames)
+            self.user_ids[username] = user_id
+            self.usernames.append(username)
+        self.message_users.append(user_id)
+        self.message_batches.append(len(self.batches) - 1)
+        self.comments.append(comment)
+        for column in self.extra_columns:
+            value = extra.get(column)
+            self.extra[column].append(sys.intern(value) if isinstance(value, str) else value)
+
+
+    def Rows(self):
+        """
+        Yields the buffered messages as rows.
+
+        Yields:
+            dict: One row per message, with the sampling columns, 'username', 'comment' and the extra columns.
+        """
+        for index, comment in enumerate(self.comments):
+            date_scraping, time_live, views = self.batches[self.message_batches[index]]
+            row = {
+                'date_scraping': date_scraping,
+                'time_live': time_live,
+                'views': views,
+                'username': self.usernames[self.message_users[index]],
+                'comment': comment
+            }
+            for column in self.extra_columns:
+                row[column] = self.extra[column][index]
+            yield row
+
+
+    def Clear(self) -> None:
+        """
+        Empties the buffer, including the interned usernames and the batches.
+        """
+        self.usernames = []
+        self.user_ids = {}
+        self.batches = []
+        self.message_users = array('I')
+        self.message_batches = array('I')
+        self.comments = []
+        self.extra = {column: [] for column in self.extra_columns}
+
+
+    def __len__(self) -> int:
+        return len(self.comments)
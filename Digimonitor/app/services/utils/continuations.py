@@ -0,0 +1,162 @@
+# Digimonitor is part of the DIGIBOOK collection.
+# DIGIBOOK Copyright (C) 2024 Daniel Alcalá.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import json
+
+
+# Path of the YouTube endpoint that returns the comment continuations
+CONTINUATION_PATH = '/youtubei/v1/next'
+
+# Prefix that some YouTube endpoints put before their JSON
+_XSSI_PREFIX = ")]}'"
+
+
+def ParseCommentResponses(bodies: list, seen: set = None) -> list:
+    """
+    Builds the comment records of a video from the raw bodies of its continuation responses.
+
+    The bodies are parsed in order and each comment is kept once, the first time its id is
+    seen, so a continuation loaded twice or a reloaded list do not duplicate comments. Bodies
+    that are not valid JSON are skipped.
+
+    Args:
+        bodies (list of str): Bodies of the `CONTINUATION_PATH` responses, in the order they arrived.
+        seen (set, optional): Ids of the comments already returned, updated in place, to parse
+                              the responses of a video in several calls.
+
+    Returns:
+        list of dict: One record per top-level comment with the keys 'username', 'text', 'emojis',
+                      'n_like', 'n_response' and 'date'.
+
+    Example:
+        >>> with open('next.json', encoding='utf-8') as file:
+        ...     records = ParseCommentResponses([file.read()])
+    """
+    records = []
+    seen = set() if seen is None else seen
+    for body in bodies:
+        try:
+            payload = json.loads(body[len(_XSSI_PREFIX):] if body.startswith(_XSSI_PREFIX) else body)
+        except (TypeError, ValueError):
+            continue
+        for comment_id, record in ParseCommentContinuation(payload):
+            if comment_id and comment_id in seen:
+                continue
+            seen.add(comment_id)
+            records.append(record)
+    return records
+
+
+def ParseCommentContinuation(payload: dict) -> list:
+    """
+    Extracts the top-level comments of one continuation response.
+
+    Both layouts served by YouTube are read: the older one, where each thread carries a
+    `commentRenderer`, and the newer one, where the thread only points with its `commentKey`
+    to a `commentEntityPayload` sent in the `frameworkUpdates` of the same response. The
+    'n_response' of a record is the label of the replies button of the thread, the text the
+    page shows in its 'aria-label', as in the extraction from the DOM.
+
+    Args:
+        payload (dict): The decoded JSON of the response.
+
+    Returns:
+        list of tuple: (comment id, record) pairs, in the order of the page.
+    """
+    if not isinstance(payload, dict):
+        return []
+    entities = {}
+    mutations = payload.get('frameworkUpdates', {}).get('entityBatchUpdate', {}).get('mutations', [])
+    for mutation in mutations:
+        entity = mutation.get('payload', {}).get('commentEntityPayload')
+        if entity:
+            entities[mutation.get('entityKey') or entity.get('key')] = entity
+    comments = []
+    for item in _continuation_items(payload):
+        thread = item.get('commentThreadRenderer')
+        if not thread:
+            continue
+        renderer = thread.get('comment', {}).get('commentRenderer')
+        if renderer:
+            comments.append((renderer.get('commentId'), _record_from_renderer(renderer, _replies_label(thread))))
+            continue
+        view = thread.get('commentViewModel', {}).get('commentViewModel', {})
+        entity = entities.get(view.get('commentKey'))
+        if entity:
+            comments.append((entity.get('properties', {}).get('commentId'),
+                             _record_from_entity(entity, _replies_label(thread))))
+    return comments
+
+
+def _continuation_items(payload: dict) -> list:
+    items = []
+    for endpoint in payload.get('onResponseReceivedEndpoints', []):
+        for key in ('reloadContinuationItemsCommand', 'appendContinuationItemsAction'):
+            items.extend(endpoint.get(key, {}).get('continuationItems', []))
+    return items
+
+
+def _text(value: dict) -> str:
+    if not value:
+        return ''
+    if 'simpleText' in value:
+        return value['simpleText']
+    return ''.join(run.get('text', '') for run in value.get('runs', []))
+
+
+def _replies_label(thread: dict) -> str:
+    button = (thread.get('replies', {}).get('commentRepliesRenderer', {})
+              .get('viewReplies', {}).get('buttonRenderer', {}))
+    label = (button.get('accessibilityData', {}).get('accessibilityData', {}).get('label')
+             or button.get('accessibility', {}).get('label')
+             or _text(button.get('text')))
+    return label or None
+
+
+def _record_from_renderer(renderer: dict, replies: str) -> dict:
+    runs = renderer.get('contentText', {}).get('runs', [])
+    emojis = [
+        run['emoji']['image']['thumbnails'][-1]['url'] for run in runs
+        if run.get('emoji', {}).get('isCustomEmoji') and run['emoji'].get('image', {}).get('thumbnails')
+    ]
+    return {
+        'username': _text(renderer.get('authorText')) or None,
+        'text': _text(renderer.get('contentText')),
+        'emojis': emojis,
+        'n_like': _text(renderer.get('voteCount')).strip(),
+        'n_response': replies,
+        'date': _text(renderer.get('publishedTimeText')),
+    }
+
+
+def _record_from_entity(entity: dict, replies: str) -> dict:
+    properties = entity.get('properties', {})
+    toolbar = entity.get('toolbar', {})
+    content = properties.get('content', {})
+    emojis = []
+    for run in content.get('attachmentRuns', []):
+        sources = run.get('element', {}).get('type', {}).get('imageType', {}).get('image', {}).get('sources', [])
+        if sources:
+            emojis.append(sources[-1].get('url'))
+    return {
+        'username': entity.get('author', {}).get('displayName') or None,
+        'text': content.get('content', ''),
+        'emojis': emojis,
+        'n_like': (toolbar.get('likeCountNotliked') or '').strip(),
+        'n_response': replies,
+        'date': properties.get('publishedTime', ''),
+    }
@@ -17,6 +17,15 @@
 
 import re
 
+
+# Patterns of the supported URLs, compiled once, with the ID of the content in the 'id' group
+URL_PATTERNS = {
+    'youtube': re.compile(r'https?://(www\.)?(youtube\.com/watch\?([^#]*?&)?v=|youtu\.be/)(?P<id>[\w-]+)'),
+    'twitch': re.compile(r'https?://(www\.)?twitch\.tv/(?P<id>[\w-]+)'),
+    'tiktok': re.compile(r'https?://(www\.)?tiktok\.com/@[\w.]+/video/(?P<id>\d+)'),
+}
+
+
 def DetectPlatform(url: str) -> str:
     """
     Detects whether the provided URL belongs to YouTube, Twitch, TikTok, or is invalid.
@@ -32,15 +41,30 @@ def DetectPlatform(url: str) -> str:
         str: The detected platform. It returns 'youtube' if the URL matches YouTube,
              'twitch' if it matches Twitch, 'tiktok' if it matches TikTok, and 'INVALIDURL' if it matches neither.
     """
-    youtube_pattern = re.compile(r'https?://(www\.)?(youtube\.com/watch\?v=|youtu\.be/)[\w-]+')
-    twitch_pattern = re.compile(r'https?://(www\.)?twitch\.tv/[\w-]+')
-    tiktok_pattern = re.compile(r'https?://(www\.)?tiktok\.com/@[\w.]+/video/\d+')
-
-    if youtube_pattern.match(url):
-        return 'youtube'
-    elif twitch_pattern.match(url):
-        return 'twitch'
-    elif tiktok_pattern.match(url):
-        return 'tiktok'
-    else:
-        return 'INVALIDURL'
+    return CanonicalURL(url)[0]
+
+
+def CanonicalURL(url: str) -> tuple:
+    """
+    Maps a URL to its platform and the ID of its content.
+
+    Equivalent URLs map to the same pair, such as 'https://youtu.be/abc' and
+    'https://www.youtube.com/watch?v=abc&t=1s', so they can be recognised as the same content.
+
+    Args:
+        url (str): The URL to analyze.
+
+    Returns:
+        tuple: The platform, as returned by `DetectPlatform`, and the ID of the content: the video ID
+               for YouTube and TikTok, the channel in lower case for Twitch, or None for an invalid URL.
+
+    Example:
+        >>> CanonicalURL('https://youtu.be/abc?t=10')
+        ('youtube', 'abc')
+    """
+    for platform, pattern in URL_PATTERNS.items():
+        match = pattern.match(url)
+        if match:
+            content_id = match.group('id')
+            return platform, content_id.lower() if platform == 'twitch' else content_id
+    return 'INVALIDURL', None
@@ -0,0 +1,31 @@
+# Digimonitor is part of the DIGIBOOK collection.
+# DIGIBOOK Copyright (C) 2024 Daniel Alcalá.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+class BlockedPageError(Exception):
+    def __init__(self, reason: str, url: str = None):
+        """
+        Raised when a page is behind a wall, such as a captcha or a login, that an unattended run
+        cannot get through. The URL can be retried later, possibly from another session.
+
+        Args:
+            reason (str): The kind of wall, such as 'captcha' or 'login'.
+            url (str, optional): The URL of the blocked page.
+        """
+        super().__init__(f"Page blocked by a {reason}" + (f": {url}" if url else "."))
+        self.reason = reason
+        self.url = url
+        self.retryable = True
@@ -0,0 +1,269 @@
+# Digimonitor is part of the DIGIBOOK collection.
+# DIGIBOOK Copyright (C) 2024 Daniel Alcalá.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import contextlib
+import datetime
+import json
+import os
+import threading
+import time
+
+
+DEFAULT_METRICS_PATH = 'data/metrics'
+PROMETHEUS_FILE = 'digimonitor.prom'  # Overwritten by every run, for a textfile collector
+METRIC_NAME = 'digimonitor_stage_seconds'
+
+# Upper bounds, in seconds, of the histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+class StageMetrics:
+    def __init__(self, platform: str = 'none'):
+        """
+        Initializes the timing histograms of the stages of the pipeline, one per platform and stage.
+
+        Each histogram keeps the count of observations of each bucket of `BUCKETS`, with the total,
+        minimum and maximum time, so the histograms of several processes can be merged exactly.
+
+        Args:
+            platform (str, optional): Platform of the observations that do not give one. Defaults to 'none'.
+
+        Example:
+            >>> metrics = StageMetrics('youtube')
+            >>> with metrics.Stage('scroll'):
+            ...     ScrollDownPageYouTube(driver)
+        """
+        self.platform = platform
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+
+    def Observe(self, stage: str, seconds: float, platform: str = None) -> None:
+        """
+        Adds the duration of a stage to its histogram.
+
+        Args:
+            stage (str): The name of the stage, such as 'page_load'.
+            seconds (float): The duration of the stage.
+            platform (str, optional): The platform. Defaults to the platform of the metrics.
+        """
+        key = f'{platform or self.platform}/{stage}'
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {
+                    'buckets': [0] * len(BUCKETS), 'count': 0, 'sum': 0.0, 'min': seconds, 'max': seconds
+                }
+            for index, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    histogram['buckets'][index] += 1
+                    break
+            histogram['count'] += 1
+            histogram['sum'] += seconds
+            histogram['min'] = min(histogram['min'], seconds)
+            histogram['max'] = max(histogram['max'], seconds)
+
+
+    @contextlib.contextmanager
+    def Stage(self, stage: str, platform: str = None):
+        """
+        Times the block of a `with` statement as a stage, also when it raises.
+
+        Args:
+            stage (str): The name of the stage.
+            platform (str, optional): The platform. Defaults to the platform of the metrics.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.Observe(stage, time.perf_counter() - started, platform)
+
+
+    def Merge(self, histograms: dict) -> None:
+        """
+        Adds the histograms of another process, as saved by `Save`.
+
+        Args:
+            histograms (dict): The histograms by 'platform/stage' key.
+        """
+        with self.lock:
+            for key, other in histograms.items():
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    self.histograms[key] = {**other, 'buckets': list(other['buckets'])}
+                    continue
+                histogram['buckets'] = [a + b for a, b in zip(histogram['buckets'], other['buckets'])]
+                histogram['count'] += other['count']
+                histogram['sum'] += other['sum']
+                histogram['min'] = min(histogram['min'], other['min'])
+                histogram['max'] = max(histogram['max'], other['max'])
+
+
+    def Save(self, path: str) -> None:
+        """
+        Saves the raw histograms, so that another process can merge them.
+
+        Args:
+            path (str): The path of the JSON file.
+        """
+        with self.lock, open(path, 'w', encoding='utf-8') as file:
+            json.dump(self.histograms, file)
+
+
+    def Prometheus(self) -> str:
+        """
+        Formats the histograms in the Prometheus text exposition format.
+
+        Returns:
+            str: One `METRIC_NAME` histogram with 'platform' and 'stage' labels.
+        """
+        lines = [
+            f'# HELP {METRIC_NAME} Time spent in each stage of the Digimonitor pipeline.',
+            f'# TYPE {METRIC_NAME} histogram',
+        ]
+        with self.lock:
+            for key in sorted(self.histograms):
+                histogram = self.histograms[key]
+                platform, stage = key.split('/', 1)
+                labels = f'platform="{platform}",stage="{stage}"'
+                cumulative = 0
+                for bound, count in zip(BUCKETS, histogram['buckets']):
+                    cumulative += count
+                    lines.append(f'{METRIC_NAME}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{METRIC_NAME}_bucket{{{labels},le="+Inf"}} {histogram["count"]}')
+                lines.append(f'{METRIC_NAME}_sum{{{labels}}} {histogram["sum"]:.6f}')
+                lines.append(f'{METRIC_NAME}_count{{{labels}}} {histogram["count"]}')
+        return '\n'.join(lines) + '\n'
+
+
+    def Summary(self) -> dict:
+        """
+        Summarizes each histogram.
+
+        The percentiles are the upper bound of the bucket where they fall, capped by the maximum.
+
+        Returns:
+            dict: For each platform and stage, the 'count', 'total', 'mean', 'min', 'p50', 'p95'
+                  and 'max' seconds.
+        """
+        summary = {}
+        with self.lock:
+            for key in sorted(self.histograms):
+                histogram = self.histograms[key]
+                platform, stage = key.split('/', 1)
+                summary.setdefault(platform, {})[stage] = {
+                    'count': histogram['count'],
+                    'total': round(histogram['sum'], 6),
+                    'mean': round(histogram['sum'] / histogram['count'], 6),
+                    'min': round(histogram['min'], 6),
+                    'p50': _percentile(histogram, 0.5),
+                    'p95': _percentile(histogram, 0.95),
+                    'max': round(histogram['max'], 6),
+                }
+        return summary
+
+
+_metrics = StageMetrics()
+
+
+def ConfigureMetrics(platform: str) -> None:
+    """
+    Starts empty metrics for a run or a worker.
+
+    Args:
+        platform (str): Platform of the observations that do not give one.
+    """
+    global _metrics
+    _metrics = StageMetrics(platform)
+
+
+def Timed(stage: str, platform: str = None):
+    """
+    Times a block as a stage of the pipeline, see `StageMetrics.Stage`.
+
+    Args:
+        stage (str): The name of the stage, such as 'page_load' or 'extract_title'.
+        platform (str, optional): The platform. Defaults to the one given to `ConfigureMetrics`.
+
+    Example:
+        >>> with Timed('page_load', 'youtube'):
+        ...     driver.get(url)
+    """
+    return _metrics.Stage(stage, platform)
+
+
+def SaveMetrics(path: str) -> None:
+    """
+    Saves the metrics of this process, to be merged by `MergeMetrics`.
+
+    Args:
+        path (str): The path of the JSON file.
+    """
+    _metrics.Save(path)
+
+
+def MergeMetrics(path: str) -> None:
+    """
+    Adds the metrics saved by another process and removes their file.
+
+    Args:
+        path (str): The path of the JSON file saved by `SaveMetrics`.
+    """
+    if not os.path.isfile(path):
+        return
+    with open(path, 'r', encoding='utf-8') as file:
+        _metrics.Merge(json.load(file))
+    os.remove(path)
+
+
+def ExportMetrics(name_folder: str = DEFAULT_METRICS_PATH) -> tuple:
+    """
+    Writes the metrics of the run as a Prometheus text file and a JSON summary.
+
+    The Prometheus file, `PROMETHEUS_FILE`, always holds the last run, while the summary is
+    saved as '{timestamp}_metrics.json' to compare runs.
+
+    Args:
+        name_folder (str, optional): The folder of the files. Defaults to `DEFAULT_METRICS_PATH`.
+
+    Returns:
+        tuple: The paths of the Prometheus file and of the summary, or None if nothing was timed.
+    """
+    if not _metrics.histograms:
+        return None
+    os.makedirs(name_folder, exist_ok=True)
+    prometheus_path = os.path.join(name_folder, PROMETHEUS_FILE)
+    # Written next to the final file and renamed, so a collector never reads half a file
+    with open(prometheus_path + '.tmp', 'w', encoding='utf-8') as file:
+        file.write(_metrics.Prometheus())
+    os.replace(prometheus_path + '.tmp', prometheus_path)
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H_%M_%S")
+    summary_path = os.path.join(name_folder, f'{timestamp}_metrics.json')
+    with open(summary_path, 'w', encoding='utf-8') as file:
+        json.dump(_metrics.Summary(), file, ensure_ascii=False, indent=4)
+    return prometheus_path, summary_path
+
+
+def _percentile(histogram: dict, fraction: float) -> float:
+    target = fraction * histogram['count']
+    cumulative = 0
+    for bound, count in zip(BUCKETS, histogram['buckets']):
+        cumulative += count
+        if cumulative >= target:
+            return round(min(bound, histogram['max']), 6)
+    return round(histogram['max'], 6)
@@ -0,0 +1,171 @@
+# Digimonitor is part of the DIGIBOOK collection.
+# DIGIBOOK Copyright (C) 2024 Daniel Alcalá.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import random
+import threading
+import time
+from app.services.files.actions import LogMessage
+
+
+# Page loads and scrolls per second allowed for each platform
+DEFAULT_RATES = {
+    'youtube': 2.0,
+    'twitch': 3.0,
+    'tiktok': 0.8,
+}
+DEFAULT_RATE = 1.0  # For keys without a rate of their own
+
+DEFAULT_JITTER = 0.3  # Random extra wait, as a fraction of the interval between actions
+BURST = 3  # Actions that can be taken back to back after an idle period
+BACKOFF_FACTOR = 0.5  # The rate is multiplied by this factor on every block
+MIN_RATE_FACTOR = 0.05  # Lowest fraction of the configured rate
+RECOVER_AFTER = 20  # Actions without a block after which the rate recovers one step
+RECOVER_STEP = 0.1  # Fraction of the configured rate recovered per step
+
+
+class RateLimiter:
+    def __init__(self, rates: dict = None, jitter: float = DEFAULT_JITTER, state=None, lock=None):
+        """
+        Initializes a token bucket per platform that paces page loads and scrolls.
+
+        Every action takes a token; tokens refill at the rate of the platform, up to `BURST`.
+        When a captcha or a login wall shows up the rate of the platform is cut by
+        `BACKOFF_FACTOR`, and it recovers by `RECOVER_STEP` after every `RECOVER_AFTER` actions
+        without a block, so the scrapers settle just below the rate that triggers blocks.
+
+        The buckets live in `state` under `lock`. By default they are local to the process;
+        a dict and a lock from a `multiprocessing.Manager` share them between worker processes.
+
+        Args:
+            rates (dict, optional): Actions per second for each platform. Defaults to `DEFAULT_RATES`.
+            jitter (float, optional): Random extra wait as a fraction of the interval. Defaults to `DEFAULT_JITTER`.
+            state (dict, optional): Storage of the buckets. Defaults to a local dict.
+            lock (optional): Lock that guards `state`. Defaults to a local lock.
+
+        Example:
+            >>> limiter = RateLimiter({'tiktok': 1.0})
+            >>> limiter.Acquire('tiktok')
+            0.0
+        """
+        self.rates = dict(DEFAULT_RATES, **(rates or {}))
+        self.jitter = jitter
+        self.state = {} if state is None else state
+        self.lock = lock or threading.Lock()
+
+
+    def Acquire(self, key: str, cost: float = 1) -> float:
+        """
+        Waits until the platform allows another action, plus a random jitter.
+
+        Args:
+            key (str): The platform or domain of the action.
+            cost (float, optional): Tokens taken by the action. Defaults to 1.
+
+        Returns:
+            float: The seconds waited, without the jitter.
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.time()
+                tokens, last, factor, streak = self.state.get(key, (BURST, now, 1.0, 0))
+                rate = self.rates.get(key, DEFAULT_RATE) * factor
+                tokens = min(BURST, tokens + (now - last) * rate)
+                if tokens >= cost:
+                    streak += 1
+                    if factor < 1 and streak >= RECOVER_AFTER:
+                        factor, streak = min(1.0, factor + RECOVER_STEP), 0
+                    self.state[key] = (tokens - cost, now, factor, streak)
+                    wait = 0
+                else:
+                    self.state[key] = (tokens, now, factor, streak)
+                    wait = (cost - tokens) / rate
+            if not wait:
+                break
+            time.sleep(wait)
+            waited += wait
+        if self.jitter:
+            time.sleep(random.uniform(0, self.jitter * cost / rate))
+        return waited
+
+
+    def Backoff(self, key: str, reason: str = 'block') -> float:
+        """
+        Cuts the rate of a platform after a captcha or a login wall.
+
+        Args:
+            key (str): The platform or domain that was blocked.
+            reason (str, optional): What was detected, for the log. Defaults to 'block'.
+
+        Returns:
+            float: The new fraction of the configured rate.
+        """
+        with self.lock:
+            now = time.time()
+            tokens, last, factor, _ = self.state.get(key, (BURST, now, 1.0, 0))
+            factor = max(MIN_RATE_FACTOR, factor * BACKOFF_FACTOR)
+            # Drop the saved tokens so the next action already waits at the new rate
+            self.state[key] = (0, now, factor, 0)
+        rate = self.rates.get(key, DEFAULT_RATE) * factor
+        LogMessage("WARNING", f"{reason.capitalize()} on {key}: slowing down to {rate:.2f} actions per second.")
+        return factor
+
+
+_limiter = RateLimiter()
+
+
+def ConfigurePacing(rates: dict = None, jitter: float = None, shared: tuple = None) -> None:
+    """
+    Configures the rate limiter used by `Pace` and `Backoff`.
+
+    Args:
+        rates (dict, optional): Actions per second for some platforms, such as {'tiktok': 0.5}.
+        jitter (float, optional): Random extra wait as a fraction of the interval.
+        shared (tuple, optional): A (dict, lock) pair from a `multiprocessing.Manager`, to share
+                                  the buckets between worker processes.
+    """
+    global _limiter
+    state, lock = shared if shared else (None, None)
+    _limiter = RateLimiter(rates, DEFAULT_JITTER if jitter is None else jitter, state, lock)
+
+
+def Pace(key: str, cost: float = 1) -> float:
+    """
+    Waits until the platform allows another page load or scroll, see `RateLimiter.Acquire`.
+
+    Args:
+        key (str): The platform or domain of the action.
+        cost (float, optional): Tokens taken by the action. Defaults to 1.
+
+    Returns:
+        float: The seconds waited, without the jitter.
+    """
+    return _limiter.Acquire(key, cost)
+
+
+def Backoff(key: str, reason: str = 'block') -> float:
+    """
+    Slows down a platform after a captcha or a login wall, see `RateLimiter.Backoff`.
+
+    Args:
+        key (str): The platform or domain that was blocked.
+        reason (str, optional): What was detected, for the log.
+
+    Returns:
+        float: The new fraction of the configured rate.
+    """
+    return _limiter.Backoff(key, reason)
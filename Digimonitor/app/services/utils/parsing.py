@@ -0,0 +1,184 @@
+# Digimonitor is part of the DIGIBOOK collection.
+# DIGIBOOK Copyright (C) 2024 Daniel Alcalá.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import functools
+import soupsieve
+from bs4 import BeautifulSoup
+
+# Optional C-backed parsers, tried in this order before BeautifulSoup
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+try:
+    from lxml.cssselect import CSSSelector  # Needs the cssselect package
+except ImportError:
+    CSSSelector = None
+
+
+BACKENDS = ['selectolax', 'lxml', 'beautifulsoup']
+
+
+def AvailableBackends() -> list:
+    """
+    Returns the parser backends installed, fastest first.
+
+    Returns:
+        list of str: Some of `BACKENDS`; 'beautifulsoup' is always available.
+    """
+    available = []
+    if LexborHTMLParser is not None:
+        available.append('selectolax')
+    if CSSSelector is not None:
+        available.append('lxml')
+    available.append('beautifulsoup')
+    return available
+
+
+def ParseHTML(html: str, backend: str = None) -> 'HTMLNode':
+    """
+    Parses an HTML document once, to run several CSS queries on it.
+
+    The fastest installed backend is used: selectolax (lexbor), then lxml with cssselect, then
+    BeautifulSoup, which uses the lxml parser when lxml is installed and 'html.parser' otherwise.
+    Every backend is wrapped in an `HTMLNode`, so the extractors do not depend on the one in use.
+
+    Args:
+        html (str): The HTML of the page.
+        backend (str, optional): One of `BACKENDS`, to force a backend. Defaults to the fastest one.
+
+    Returns:
+        HTMLNode: The root of the document.
+
+    Example:
+        >>> document = ParseHTML('<p><span class="name">I</span></p>')
+        >>> [node.Text() for node in document.Select('span.name')]
+        ['I']
+    """
+    backend = backend or AvailableBackends()[0]
+    if backend not in AvailableBackends():
+        raise ValueError(f"HTML parser backend not available: '{backend}'.")
+    if backend == 'selectolax':
+        return HTMLNode(LexborHTMLParser(html).root, backend)
+    if backend == 'lxml':
+        return HTMLNode(lxml.html.document_fromstring(html or '<html></html>'), backend)
+    return HTMLNode(BeautifulSoup(html, 'lxml' if lxml else 'html.parser'), backend)
+
+
+class HTMLNode:
+    def __init__(self, node, backend: str):
+        """
+        Wraps an element of a document parsed by `ParseHTML`.
+
+        Args:
+            node: The element of the backend.
+            backend (str): The backend that parsed the document.
+        """
+        self.node = node
+        self.backend = backend
+
+
+    def Select(self, query: str) -> list:
+        """
+        Returns the descendants that match a CSS selector.
+
+        Args:
+            query (str): The CSS selector. It is compiled once per backend and reused.
+
+        Returns:
+            list of HTMLNode: The matching elements, in document order.
+        """
+        if self.node is None:
+            return []
+        if self.backend == 'selectolax':
+            found = self.node.css(query)
+        elif self.backend == 'lxml':
+            found = _lxml_selector(query)(self.node)
+        else:
+            found = _soup_selector(query).select(self.node)
+        return [HTMLNode(node, self.backend) for node in found]
+
+
+    def SelectOne(self, query: str):
+        """
+        Returns the first descendant that matches a CSS selector.
+
+        Args:
+            query (str): The CSS selector.
+
+        Returns:
+            HTMLNode: The first matching element, or None.
+        """
+        if self.node is None:
+            return None
+        if self.backend == 'selectolax':
+            node = self.node.css_first(query)
+        elif self.backend == 'lxml':
+            found = _lxml_selector(query)(self.node)
+            node = found[0] if found else None
+        else:
+            node = _soup_selector(query).select_one(self.node)
+        return HTMLNode(node, self.backend) if node is not None else None
+
+
+    def Text(self) -> str:
+        """
+        Returns the text of the element and its descendants.
+
+        Returns:
+            str: The text, without any change to its white space.
+        """
+        if self.backend == 'selectolax':
+            return self.node.text(deep=True)
+        if self.backend == 'lxml':
+            return self.node.text_content()
+        return self.node.get_text()
+
+
+    def Attr(self, name: str, default: str = None) -> str:
+        """
+        Returns an attribute of the element.
+
+        Args:
+            name (str): The name of the attribute.
+            default (str, optional): The value if the attribute is missing.
+
+        Returns:
+            str: The value of the attribute.
+        """
+        if self.backend == 'selectolax':
+            value = self.node.attributes.get(name)
+        elif self.backend == 'lxml':
+            value = self.node.get(name)
+        else:
+            value = self.node.get(name)
+            value = ' '.join(value) if isinstance(value, list) else value
+        return default if value is None else value
+
+
+@functools.lru_cache(maxsize=256)
+def _lxml_selector(query: str):
+    return CSSSelector(query)
+
+
+@functools.lru_cache(maxsize=256)
+def _soup_selector(query: str):
+    return soupsieve.compile(query)
@@ -0,0 +1,579 @@
+# Digimonitor is part of the DIGIBOOK collection.
+# DIGIBOOK Copyright (C) 2024 Daniel Alcalá.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import datetime
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from app.services.files import actions as files_actions
+from app.services.files.actions import ConfigureLogging, DictionarySaveJSON, FlushLogs, LogMessage
+from app.services.files.archive import ARCHIVED_PLATFORMS, SnapshotArchive
+from app.services.files.cache import ResultCache
+from app.services.files.jobs import DEFAULT_JOBS_PATH, JobStore
+from app.services.utils.detected import CanonicalURL, DetectPlatform
+from app.services.utils.errors import BlockedPageError
+from app.services.utils.metrics import ConfigureMetrics, MergeMetrics, SaveMetrics, Timed
+from app.services.utils.pacing import ConfigurePacing
+
+
+PLATFORMS = ['youtube', 'twitch', 'tiktok']
+
+
+def CreateDriver(root_path: str = None, platform: str = 'youtube', options: dict = None,
+                 copy_profile: bool = False):
+    """
+    Creates a FirefoxWebDriver configured for a platform and the command line options.
+
+    In lean mode images stay enabled only for the XPath YouTube extractor, which reads the
+    emojis from loaded images. The other extractors read the emoji URL from the 'src' attribute.
+
+    Args:
+        root_path (str, optional): Path to the Firefox profile.
+        platform (str): The platform that will be processed.
+        options (dict, optional): Command line options, such as 'lean'.
+        copy_profile (bool, optional): Run on a private copy of the profile, deleted when the driver
+                                       stops, so that several browsers can use it at once. Defaults to False.
+
+    Returns:
+        FirefoxWebDriver: The driver, not started yet.
+    """
+    # Imported here so the worker helpers can be loaded without Selenium
+    from app.services.selenium.driver.actions import FirefoxWebDriver
+
+    options = options or {}
+    keep_images = platform == 'youtube' and not any(
+        options.get(key) for key in ['snapshot', 'records', 'stream']
+    ) and options.get('comment_capture') != 'network'
+    temporary_profile = bool(root_path and copy_profile)
+    if temporary_profile:
+        root_path = _copy_profile(root_path)
+    return FirefoxWebDriver(
+        root_path,
+        lean=options.get('lean', False),
+        keep_images=keep_images,
+        temporary_profile=temporary_profile
+    )
+
+
+def CreateDriverPool(root_path: str = None, platform: str = 'youtube', options: dict = None):
+    """
+    Creates a DriverPool with one session configured by the command line options.
+
+    A warm spare session is kept ready, so a session that crashes or is recycled ('recycle_pages'
+    or 'max_memory' options) is replaced without a cold start of Firefox. Since the session and
+    its spare run at the same time, each of them runs on its own copy of the profile.
+
+    Args:
+        root_path (str, optional): Path to the Firefox profile.
+        platform (str): The platform that will be processed.
+        options (dict, optional): Command line options.
+
+    Returns:
+        DriverPool: The pool, not started yet.
+    """
+    # Imported here so the worker helpers can be loaded without Selenium
+    from app.services.selenium.driver.pool import DriverPool
+
+    options = options or {}
+    return DriverPool(
+        lambda: CreateDriver(root_path, platform, options, copy_profile=True),
+        size=1,
+        spares=1,
+        recycle_pages=options.get('recycle_pages'),
+        max_memory_mb=options.get('max_memory')
+    )
+
+
+def ProcessURL(driver, url: str, platform: str, suffix: str = '', options: dict = None) -> str:
+    """
+    Opens a URL in the given driver and runs the extractor of its platform.
+
+    Args:
+        driver (FirefoxWebDriver): A started FirefoxWebDriver instance.
+        url (str): The URL to process.
+        platform (str): The platform of the URL ('youtube', 'twitch' or 'tiktok').
+        suffix (str, optional): Text appended to the output file name, used to keep
+                                the files of parallel workers apart.
+        options (dict, optional): Extraction options taken from the command line, such as
+                                  'snapshot', 'records', 'stream', 'comment_capture' or 'max_comments' for YouTube,
+                                  'chat_format', 'chat_capture', 'rotate_mb', 'rotate_hourly',
+                                  'dedupe_window' or 'sample_interval' for Twitch, 'unattended',
+                                  'target_comments', 'max_stalls' or 'time_budget' for TikTok, and
+                                  'archive' with the folder where the page snapshots are kept.
+
+    Returns:
+        str: The path of the file where the extracted data was saved.
+    """
+    options = options or {}
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H_%M_%S")
+    name_folder = f'data/{platform}'
+    driver.OpenPage(url, platform)
+    if platform == 'youtube':
+        name_file = f'{timestamp}_extract_{platform}{suffix}.json'
+        if options.get('stream'):
+            data = driver.StreamDataPageYT(
+                name_folder=name_folder,
+                name_file=name_file,
+                max_comments=options.get('max_comments')
+            )
+        elif options.get('comment_capture') == 'network':
+            data = driver.CaptureDataPageYT(
+                records=options.get('records', False),
+                max_comments=options.get('max_comments')
+            )
+        else:
+            driver.ScrollDownPageYT(max_comments=options.get('max_comments'))
+            data = driver.ExtractDataPageYT(
+                snapshot=options.get('snapshot', False),
+                records=options.get('records', False)
+            )
+        DictionarySaveJSON(data, name_folder=name_folder, name_file=name_file, platform=platform)
+    elif platform == 'twitch':
+        name_file = f'{timestamp}_extract_{platform}{suffix}.{options.get("chat_format") or "csv"}'
+        rotate_mb = options.get('rotate_mb')
+        driver.ExtractDataPageTW(
+            name_folder=name_folder,
+            name_file=name_file,
+            rotate_bytes=int(rotate_mb * 1024 * 1024) if rotate_mb else None,
+            rotate_hourly=options.get('rotate_hourly', False),
+            capture=options.get('chat_capture') or 'poll',
+            dedupe_window=options.get('dedupe_window') or 120,
+            sample_interval=options.get('sample_interval') or 30
+        )
+    elif platform == 'tiktok':
+        name_file = f'{timestamp}_extract_{platform}{suffix}.json'
+        driver.ExtractDataPageTK(
+            name_folder=name_folder,
+            name_file=name_file,
+            unattended=options.get('unattended', False),
+            target_comments=options.get('target_comments'),
+            max_stalls=options.get('max_stalls'),
+            time_budget=options.get('time_budget')
+        )
+    else:
+        raise ValueError(f"Plataforma no soportada especificada: '{platform}'.")
+    if options.get('archive') and platform == 'youtube' and options.get('stream'):
+        # The streamed comment threads are removed from the page, so the snapshot would have none
+        LogMessage("WARNING", f"Page snapshot of {url} not saved: --archive is not available with --stream.")
+    elif options.get('archive') and platform in ARCHIVED_PLATFORMS:
+        try:
+            snapshot = SnapshotArchive(options['archive']).Save(
+                platform, CanonicalURL(url)[1], url, driver.PageSource()
+            )
+            LogMessage("INFO", f"Page snapshot saved in {snapshot}.")
+        except Exception as error:
+            LogMessage("WARNING", f"The page snapshot could not be saved: {error}")
+    return os.path.join(name_folder, name_file)
+
+
+def ProcessTwitchChannels(url_list: list, options: dict = None) -> dict:
+    """
+    Saves the chat of several Twitch channels over IRC with a single connection and no browser.
+
+    Each channel is written to '{timestamp}_extract_twitch_{channel}' with the same columns as the
+    browser capture, until the run is interrupted.
+
+    Args:
+        url_list (list): The URLs of the Twitch channels.
+        options (dict, optional): Command line options, such as 'chat_format', 'rotate_mb',
+                                  'rotate_hourly' or 'irc_server'.
+
+    Returns:
+        dict: For each channel, the path of its last chat file and the number of messages saved.
+    """
+    from app.services.irc.client import FollowTwitchChats, TwitchChannelFromURL, TWITCH_IRC_SERVER
+
+    options = options or {}
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H_%M_%S")
+    channels = list(dict.fromkeys(TwitchChannelFromURL(url) for url in url_list))
+    extension = options.get('chat_format') or 'csv'
+    rotate_mb = options.get('rotate_mb')
+    return FollowTwitchChats(
+        channels,
+        name_folder='data/twitch',
+        name_files={channel: f'{timestamp}_extract_twitch_{channel}.{extension}' for channel in channels},
+        server=options.get('irc_server') or TWITCH_IRC_SERVER,
+        rotate_bytes=int(rotate_mb * 1024 * 1024) if rotate_mb else None,
+        rotate_hourly=options.get('rotate_hourly', False)
+    )
+
+
+def PacingRates(platform: str, options: dict = None) -> dict:
+    """
+    Returns the pacing rates set on the command line.
+
+    Args:
+        platform (str): The platform of the run, or 'auto' to apply 'rate' to every platform.
+        options (dict, optional): Command line options, such as 'rate' for the platform of the run,
+                                  or 'platform_rates' with the rate of some platforms, which wins.
+
+    Returns:
+        dict: The actions per second of the platforms, or None to keep the default rates.
+
+    Example:
+        >>> PacingRates('auto', {'rate': 1.0, 'platform_rates': {'tiktok': 0.5}})
+        {'youtube': 1.0, 'twitch': 1.0, 'tiktok': 0.5}
+    """
+    options = options or {}
+    platforms = PLATFORMS if platform == 'auto' else [platform]
+    rates = {name: options['rate'] for name in platforms} if options.get('rate') else {}
+    rates.update(options.get('platform_rates') or {})
+    return rates or None
+
+
+def GroupURLsByPlatform(url_list: list) -> dict:
+    """
+    Groups the URLs of a mixed list by the platform detected for each of them.
+
+    URLs of an unknown platform are logged and left out. Repeated URLs are kept once.
+
+    Args:
+        url_list (list): The URLs to group.
+
+    Returns:
+        dict: The URLs of each platform, in their original order.
+
+    Example:
+        >>> GroupURLsByPlatform(['https://www.twitch.tv/channel', 'https://example.com'])
+        {'twitch': ['https://www.twitch.tv/channel']}
+    """
+    groups = {}
+    for url in dict.fromkeys(url_list):
+        platform = DetectPlatform(url)
+        if platform in PLATFORMS:
+            groups.setdefault(platform, []).append(url)
+        else:
+            LogMessage("WARNING", f'URL: {url} no pertenece a ninguna plataforma soportada')
+    return groups
+
+
+def SkipKnownURLs(url_list: list, platform: str, cache: ResultCache = None, ttl: float = None) -> list:
+    """
+    Removes the URLs that point to content already in the list or extracted recently.
+
+    URLs are compared by their content ID, see `CanonicalURL`, so 'https://youtu.be/abc' and
+    'https://www.youtube.com/watch?v=abc&t=1s' are processed once. With a `cache` and a `ttl`,
+    the content extracted less than `ttl` seconds ago is skipped too.
+
+    Args:
+        url_list (list): The URLs of the run, all of them of the given platform.
+        platform (str): The platform of the URLs.
+        cache (ResultCache, optional): The index of the results of previous runs.
+        ttl (float, optional): Seconds during which a previous result is reused.
+
+    Returns:
+        list: The URLs left to process, in their original order.
+    """
+    unique = {}
+    for url in url_list:
+        content_id = CanonicalURL(url)[1] or url
+        if content_id in unique:
+            LogMessage("INFO", f"URL: {url} repetida, ya está en la lista como {unique[content_id]}")
+        else:
+            unique[content_id] = url
+    fresh = cache.Fresh(platform, list(unique), ttl) if cache and ttl else {}
+    for content_id, output in fresh.items():
+        LogMessage("INFO", f"URL: {unique[content_id]} extraída recientemente en {output}")
+    return [url for content_id, url in unique.items() if content_id not in fresh]
+
+
+def RunJobs(store: JobStore, url_list: list, platform: str, process, retries: int = 2,
+            cache: ResultCache = None) -> list:
+    """
+    Processes the URLs of a run through the job store, retrying the failed ones.
+
+    Every attempt is recorded in the store. A failed URL, or one blocked by a captcha or login
+    wall, is retried after an exponential backoff, up to `retries` more times in this run. Each
+    URL processed is also recorded in the `cache`, if given, under its content ID.
+
+    Args:
+        store (JobStore): The job store of the run.
+        url_list (list): The URLs to process, already registered in the store.
+        platform (str): The platform of the URLs.
+        process (callable): Receives a URL, does the work and returns the output path.
+        retries (int, optional): Attempts after the first one for each URL. Defaults to 2.
+        cache (ResultCache, optional): The index of the results, updated after each URL processed.
+
+    Returns:
+        list of dict: The final state of each URL in the store.
+    """
+    while True:
+        due, wait = store.Next(url_list, platform, retries + 1)
+        if not due:
+            if wait is None:
+                break
+            LogMessage("INFO", f"Waiting {wait:.0f} seconds before retrying failed URLs.")
+            time.sleep(wait)
+            continue
+        for url in due:
+            store.Start(url, platform)
+            try:
+                with Timed('url_total', platform):
+                    output = process(url)
+                store.Finish(url, platform, output)
+                if cache:
+                    cache.Record(platform, CanonicalURL(url)[1], url, output)
+                continue
+            except BlockedPageError as error:
+                delay = store.Fail(url, platform, str(error), status='blocked')
+                message = f"URL {url} blocked: {error}"
+            except Exception as error:
+                delay = store.Fail(url, platform, str(error))
+                message = f"URL {url} failed: {error}"
+            if store.Get(url, platform)['tries'] > retries:
+                LogMessage("WARNING", f"{message} No retries left in this run.")
+            else:
+                LogMessage("WARNING", f"{message} Retrying in {delay:.0f} seconds.")
+    return [store.Get(url, platform) for url in url_list]
+
+
+def SplitURLs(url_list: list, workers: int) -> list:
+    """
+    Splits a list of URLs into round-robin chunks, one per worker.
+
+    Args:
+        url_list (list): The URLs to split.
+        workers (int): The number of workers.
+
+    Returns:
+        list of list: The non-empty chunks of URLs.
+
+    Example:
+        >>> SplitURLs(['a', 'b', 'c'], 2)
+        [['a', 'c'], ['b']]
+    """
+    chunks = [url_list[index::workers] for index in range(workers)]
+    return [chunk for chunk in chunks if chunk]
+
+
+def RunWorkerPool(url_list: list, root_path: str = None, platform: str = 'youtube', workers: int = 2,
+                  options: dict = None) -> list:
+    """
+    Processes a list of URLs with several independent Firefox processes.
+
+    The list is split across `workers` processes, see `RunPlatformPools`.
+
+    Args:
+        url_list (list): The URLs to process, all of them of the given platform.
+        root_path (str, optional): Path to the Firefox profile to copy for each worker.
+        platform (str): The platform of the URLs.
+        workers (int): The number of parallel browsers.
+        options (dict, optional): Extraction options passed to `ProcessURL`.
+
+    Returns:
+        list of dict: One entry per URL with the keys 'url', 'worker', 'status', 'attempts', 'output'
+                      and 'error'. The status is 'ok', 'error', or 'blocked' for a page behind a
+                      captcha or login wall that can be retried.
+    """
+    return RunPlatformPools({platform: url_list}, root_path, {platform: workers}, options)[platform]
+
+
+def RunPlatformPools(urls_by_platform: dict, root_path: str = None, workers_by_platform: dict = None,
+                     options: dict = None) -> dict:
+    """
+    Processes the URLs of one or several platforms with independent Firefox processes.
+
+    The URLs of each platform are split across the number of workers of that platform, and the
+    workers of every platform run at the same time, so a mixed run lasts as long as its slowest
+    platform. Each worker starts its own FirefoxWebDriver on a private copy of the Firefox profile
+    and writes its own log file. A failure inside a worker only affects the URLs of that worker,
+    and each worker records its URLs in the job store and retries the failed ones, see `RunJobs`.
+    When every worker has finished, the worker logs are merged into the main log and a summary
+    with the result of each URL is saved for each platform.
+
+    Args:
+        urls_by_platform (dict): The URLs to process, grouped by platform.
+        root_path (str, optional): Path to the Firefox profile to copy for each worker.
+        workers_by_platform (dict, optional): The number of parallel browsers of each platform.
+                                              Defaults to one per platform.
+        options (dict, optional): Extraction options passed to `ProcessURL`.
+
+    Returns:
+        dict: For each platform, the list of results described in `RunWorkerPool`.
+    """
+    workers_by_platform = workers_by_platform or {}
+    tasks = []
+    for platform, url_list in urls_by_platform.items():
+        for chunk in SplitURLs(url_list, max(1, workers_by_platform.get(platform) or 1)):
+            tasks.append((len(tasks), platform, chunk))
+    results = {platform: [] for platform in urls_by_platform}
+    if not tasks:
+        return results
+    LogMessage("OK", f"Starting {len(tasks)} workers for " + ', '.join(
+        f"{len(url_list)} {platform} URLs" for platform, url_list in urls_by_platform.items()
+    ) + '.')
+    # The workers share the pacing of each platform, so together they keep to its rate
+    with multiprocessing.Manager() as manager, ProcessPoolExecutor(max_workers=len(tasks)) as executor:
+        pacing_state = (manager.dict(), manager.Lock())
+        futures = {
+            executor.submit(_run_worker, worker_id, chunk, root_path, platform, options, pacing_state): (worker_id, platform, chunk)
+            for worker_id, platform, chunk in tasks
+        }
+        for future in as_completed(futures):
+            worker_id, platform, chunk = futures[future]
+            try:
+                results[platform].extend(future.result())
+            except Exception as error:
+                LogMessage("ERROR", f"Worker {worker_id} failed: {error}")
+                results[platform].extend(
+                    {'url': url, 'worker': worker_id, 'status': 'error', 'output': None, 'error': str(error)}
+                    for url in chunk
+                )
+    _merge_worker_logs(len(tasks))
+    for worker_id, _, _ in tasks:
+        MergeMetrics(_worker_metrics_path(worker_id))
+    for platform, url_list in urls_by_platform.items():
+        order = {url: index for index, url in enumerate(url_list)}
+        results[platform].sort(key=lambda item: order.get(item['url'], len(order)))
+        failed = sum(1 for item in results[platform] if item['status'] not in ['ok', 'blocked'])
+        blocked = sum(1 for item in results[platform] if item['status'] == 'blocked')
+        LogMessage("OK", f"Workers of {platform} finished: {len(results[platform]) - failed - blocked} URLs processed, "
+                         f"{failed} failed, {blocked} blocked.")
+        DictionarySaveJSON(
+            {'platform': platform, 'workers': sum(1 for task in tasks if task[1] == platform), 'results': results[platform]},
+            name_folder=f'data/{platform}',
+            name_file=f'{datetime.datetime.now().strftime("%Y-%m-%d_%H_%M_%S")}_summary_{platform}.json',
+            platform=platform
+        )
+    return results
+
+
+def _worker_log_path(worker_id: int) -> str:
+    """
+    Returns the path of the log file used by a worker.
+
+    Args:
+        worker_id (int): The index of the worker.
+
+    Returns:
+        str: The path of the worker log file.
+    """
+    folder = os.path.dirname(files_actions.LOG_FILE_PATH)
+    return os.path.join(folder, f'worker_{worker_id}.txt')
+
+
+def _worker_metrics_path(worker_id: int) -> str:
+    """
+    Returns the path of the file where a worker leaves its stage metrics.
+
+    Args:
+        worker_id (int): The index of the worker.
+
+    Returns:
+        str: The path of the worker metrics file.
+    """
+    folder = os.path.dirname(_worker_log_path(worker_id))
+    return os.path.join(folder, f'worker_{worker_id}_metrics.json')
+
+
+def _copy_profile(root_path: str) -> str:
+    """
+    Copies a Firefox profile into a temporary folder.
+
+    Lock files are skipped so that each copy can be opened by its own Firefox process.
+
+    Args:
+        root_path (str): Path to the Firefox profile to copy.
+
+    Returns:
+        str: The path of the copied profile.
+    """
+    profile_path = tempfile.mkdtemp(prefix='digimonitor_profile_')
+    shutil.copytree(
+        root_path,
+        profile_path,
+        dirs_exist_ok=True,
+        ignore=shutil.ignore_patterns('lock', '.parentlock', 'parent.lock')
+    )
+    return profile_path
+
+
+def _run_worker(worker_id: int, url_list: list, root_path: str, platform: str, options: dict = None,
+                pacing_state: tuple = None) -> list:
+    """
+    Processes a chunk of URLs inside a worker process.
+
+    Args:
+        worker_id (int): The index of the worker.
+        url_list (list): The URLs assigned to this worker.
+        root_path (str): Path to the Firefox profile to copy, or None.
+        platform (str): The platform of the URLs.
+        options (dict, optional): Extraction options passed to `ProcessURL`.
+        pacing_state (tuple, optional): The (dict, lock) pair of the pacing shared by the workers.
+
+    Returns:
+        list of dict: The result of each URL of the chunk.
+    """
+    options = options or {}
+    files_actions.LOG_FILE_PATH = _worker_log_path(worker_id)
+    ConfigureLogging(level=options.get('log_level'), log_format=options.get('log_format'))
+    ConfigurePacing(PacingRates(platform, options), options.get('jitter'), shared=pacing_state)
+    ConfigureMetrics(platform)
+    results = []
+    store = JobStore(options.get('jobs') or DEFAULT_JOBS_PATH)
+    cache = ResultCache(store.path)
+    pool = CreateDriverPool(root_path, platform, options)
+    try:
+        pool.Start()
+        jobs = RunJobs(
+            store, url_list, platform,
+            lambda url: pool.Run(
+                lambda driver: ProcessURL(driver, url, platform, suffix=f'_w{worker_id}', options=options)
+            ),
+            retries=options.get('retries', 2),
+            cache=cache
+        )
+        results = [
+            {'url': job['url'], 'worker': worker_id, 'status': job['status'], 'attempts': job['attempts'],
+             'output': job['output'], 'error': job['last_error']}
+            for job in jobs
+        ]
+    except Exception as error:
+        LogMessage("ERROR", f"Worker {worker_id} could not start: {error}")
+        results = [
+            {'url': url, 'worker': worker_id, 'status': 'error', 'output': None, 'error': str(error)}
+            for url in url_list
+        ]
+    finally:
+        pool.Stop()
+        store.Close()
+        cache.Close()
+        SaveMetrics(_worker_metrics_path(worker_id))
+        FlushLogs()
+    return results
+
+
+def _merge_worker_logs(workers: int) -> None:
+    """
+    Appends the log file of each worker to the main log file and removes it.
+
+    Args:
+        workers (int): The number of workers that were started.
+    """
+    FlushLogs()
+    with open(files_actions.LOG_FILE_PATH, 'a', encoding='utf-8') as log_file:
+        for worker_id in range(workers):
+            worker_log = _worker_log_path(worker_id)
+            if not os.path.isfile(worker_log):
+                continue
+            with open(worker_log, 'r', encoding='utf-8') as file:
+                log_file.write(file.read())
+            os.remove(worker_log)
@@ -16,12 +16,21 @@
 
 
 import argparse
-import datetime
+import sys
 
 from selenium.common.exceptions import WebDriverException
-from app.services.selenium.driver.actions import FirefoxWebDriver
 from app.services.utils.detected import DetectPlatform
-from app.services.files.actions import DictionarySaveJSON, LogMessage
+from app.services.files.archive import DEFAULT_ARCHIVE_PATH
+from app.services.files.cache import ResultCache
+from app.services.files.jobs import DEFAULT_JOBS_PATH, JobStore
+from app.services.files.actions import ConfigureLogging, LogMessage
+from app.services.offline.replay import ReplayArchive
+from app.services.utils.metrics import DEFAULT_METRICS_PATH, ConfigureMetrics, ExportMetrics
+from app.services.utils.pacing import ConfigurePacing
+from app.services.workers.actions import (
+    PLATFORMS, CreateDriverPool, GroupURLsByPlatform, PacingRates, ProcessTwitchChannels, ProcessURL, RunJobs,
+    RunPlatformPools, RunWorkerPool, SkipKnownURLs
+)
 
 
 def read_urls_from_file(file_path: str) -> list:
@@ -39,49 +48,121 @@ def read_urls_from_file(file_path: str) -> list:
     return urls
 
 
-def main(url: str, root_path: str = None, platform: str = 'youtube'):
-    driver = None
+def platform_values(cast):
+    """
+    Returns an argparse type that reads a value for each platform, such as 'youtube=3,tiktok=1'.
+
+    Parameters:
+    cast (callable): Converts each value, such as int or float.
+
+    Returns:
+    callable: The function that parses the argument into a dict.
+    """
+    def parse(text: str) -> dict:
+        values = {}
+        for item in filter(None, text.split(',')):
+            name, _, value = item.partition('=')
+            if name.strip() not in PLATFORMS or not value:
+                raise argparse.ArgumentTypeError(f"'{item}' no tiene la forma plataforma=valor.")
+            try:
+                values[name.strip()] = cast(value)
+            except ValueError:
+                raise argparse.ArgumentTypeError(f"Valor no válido para {name.strip()}: '{value}'.")
+        return values
+    return parse
+
+
+def main(url: str, root_path: str = None, platform: str = 'youtube', workers: int = 1, options: dict = None):
+    pool = None
+    store = None
+    cache = None
+    options = options or {}
     try:
+        ConfigureLogging(level=options.get('log_level'), log_format=options.get('log_format'))
+        ConfigurePacing(PacingRates(platform, options), options.get('jitter'))
+        ConfigureMetrics(platform)
+
         # Validar la plataforma
-        if platform not in ['youtube', 'twitch', 'tiktok']:
+        if platform not in PLATFORMS + ['auto']:
             raise ValueError(f"Plataforma no soportada especificada: '{platform}'.")
 
-        # Inicializar el driver del navegador
-        driver = FirefoxWebDriver(root_path)
-        driver.StartDriver()
-
         # Leer URLs
         if url.endswith('.txt'):
             url_list = read_urls_from_file(url)
         else:
             url_list = [url]
 
-        # Procesar cada URL
+        # Contenido extraído hace menos de --cache-ttl horas que no se vuelve a procesar
+        cache_ttl = options.get('cache_ttl')
+        cache_ttl = cache_ttl * 3600 if cache_ttl else None
+
+        # Repartir una lista mixta por plataforma y procesar todas a la vez
+        if platform == 'auto':
+            if options.get('transport') == 'irc':
+                raise ValueError("--transport irc solo está disponible con --platform twitch.")
+            store = JobStore(options.get('jobs') or DEFAULT_JOBS_PATH)
+            cache = ResultCache(store.path)
+            pending = {}
+            for current_platform, platform_urls in GroupURLsByPlatform(url_list).items():
+                platform_urls = SkipKnownURLs(platform_urls, current_platform, cache, cache_ttl)
+                store.Add(platform_urls, current_platform, resume=options.get('resume', False))
+                remaining = store.Remaining(platform_urls, current_platform)
+                if len(remaining) < len(platform_urls):
+                    LogMessage("INFO", f"{len(platform_urls) - len(remaining)} URLs de {current_platform} ya procesadas en una ejecución anterior.")
+                if remaining:
+                    pending[current_platform] = remaining
+            platform_workers = options.get('platform_workers') or {}
+            RunPlatformPools(
+                pending, root_path,
+                {current_platform: platform_workers.get(current_platform, workers) for current_platform in pending},
+                options
+            )
+            return
+
+        # Descartar URLs de otras plataformas
+        valid_urls = []
         for current_url in url_list:
-            platform_detected = DetectPlatform(current_url)
-            if platform_detected == platform:
-                driver.OpenPage(current_url)
-                if platform == 'youtube':
-                    driver.ScrollDownPageYT()
-                    data = driver.ExtractDataPageYT()
-                    DictionarySaveJSON(
-                        data,
-                        name_folder='data/youtube',
-                        name_file=f'{datetime.datetime.now().strftime("%Y-%m-%d_%H_%M_%S")}_extract_{platform}.json'
-                    )
-                elif platform == 'twitch':
-                    driver.ExtractDataPageTW(
-                        name_folder='data/twitch',
-                        name_file=f'{datetime.datetime.now().strftime("%Y-%m-%d_%H_%M_%S")}_extract_{platform}.csv'
-                    )
-                elif platform == 'tiktok':
-                    driver.ExtractDataPageTK(
-                        name_folder='data/tiktok',
-                        name_file=f'{datetime.datetime.now().strftime("%Y-%m-%d_%H_%M_%S")}_extract_{platform}.json'
-                    )
+            if DetectPlatform(current_url) == platform:
+                valid_urls.append(current_url)
             else:
                 LogMessage("WARNING", f'URL: {current_url} no válida para la plataforma {platform}')
 
+        # Leer el chat de Twitch directamente por IRC, sin navegador
+        if platform == 'twitch' and options.get('transport') == 'irc':
+            ProcessTwitchChannels(valid_urls, options)
+            return
+
+        # Registrar las URLs en el almacén de trabajos y saltar las ya procesadas
+        store = JobStore(options.get('jobs') or DEFAULT_JOBS_PATH)
+        cache = ResultCache(store.path)
+        valid_urls = SkipKnownURLs(valid_urls, platform, cache, cache_ttl)
+        store.Add(valid_urls, platform, resume=options.get('resume', False))
+        pending_urls = store.Remaining(valid_urls, platform)
+        if len(pending_urls) < len(valid_urls):
+            LogMessage("INFO", f"{len(valid_urls) - len(pending_urls)} URLs ya procesadas en una ejecución anterior.")
+        if not pending_urls:
+            return
+
+        # Procesar las URLs en varios navegadores
+        if workers > 1 and len(pending_urls) > 1:
+            RunWorkerPool(pending_urls, root_path, platform, workers, options)
+            return
+
+        # Inicializar el pool de navegadores
+        pool = CreateDriverPool(root_path, platform, options)
+        pool.Start()
+
+        # Procesar cada URL, reintentando en un navegador nuevo si el actual falla y
+        # más tarde, con una espera exponencial, si la extracción no se completa
+        jobs = RunJobs(
+            store, pending_urls, platform,
+            lambda current_url: pool.Run(lambda driver: ProcessURL(driver, current_url, platform, options=options)),
+            retries=options.get('retries', 2),
+            cache=cache
+        )
+        failed = [job['url'] for job in jobs if job['status'] != 'ok']
+        LogMessage("OK", f"{len(jobs) - len(failed)} URLs procesadas, {len(failed)} pendientes para --resume.")
+
     except ValueError as error:
         LogMessage("ERROR", str(error))
     except WebDriverException as error:
@@ -89,17 +170,134 @@ def main(url: str, root_path: str = None, platform: str = 'youtube'):
     except KeyboardInterrupt:
         LogMessage("WARNING", "Programa interrumpido por el usuario.")
     finally:
-        if driver:
-            driver.StopDriver()
+        if pool:
+            pool.Stop()
+        if store:
+            store.Close()
+        if cache:
+            cache.Close()
+        # Tiempos de cada etapa por plataforma, para Prometheus y en JSON
+        try:
+            exported = ExportMetrics(options.get('metrics') or DEFAULT_METRICS_PATH)
+            if exported:
+                LogMessage("OK", f"Métricas guardadas en {exported[0]} y {exported[1]}.")
+        except OSError as error:
+            LogMessage("WARNING", f"No se pudieron guardar las métricas: {error}")
+        LogMessage("OK", 'Ciao')
+
+
+def replay(archive: str = DEFAULT_ARCHIVE_PATH, platform: str = None, workers: int = None, records: bool = False,
+           latest: bool = False, options: dict = None):
+    """
+    Runs the extractors again on the pages archived with --archive, without a browser.
+
+    Parameters:
+    archive (str): Folder of the archive.
+    platform (str): Only replay the pages of this platform, or None for all of them.
+    workers (int): Number of processes, or None for one per CPU core.
+    records (bool): Save the YouTube comments as one record per comment.
+    latest (bool): Only replay the last snapshot of each video.
+    options (dict): Logging options.
+    """
+    options = options or {}
+    try:
+        ConfigureLogging(level=options.get('log_level'), log_format=options.get('log_format'))
+        ReplayArchive(archive, platform, workers, records, latest)
+    except KeyboardInterrupt:
+        LogMessage("WARNING", "Programa interrumpido por el usuario.")
+    finally:
         LogMessage("OK", 'Ciao')
 
 
-if __name__ == "__main__":
+if __name__ == "__main__" and sys.argv[1:2] == ['replay']:
+    parser = argparse.ArgumentParser(prog='digimonitor.py replay', description='Re-run the extractors on archived pages.')
+    parser.add_argument('--archive', default=DEFAULT_ARCHIVE_PATH, help='Folder of the page archive (optional)')
+    parser.add_argument('-p', '--platform', choices=['youtube', 'tiktok'], default=None, help='Only replay the pages of this platform (optional)')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='Number of processes, one per CPU core by default (optional)')
+    parser.add_argument('--records', action='store_true', help='Save YouTube comments as one record per comment (optional)')
+    parser.add_argument('--latest', action='store_true', help='Only replay the last snapshot of each video (optional)')
+    parser.add_argument('--log-level', choices=['INFO', 'OK', 'WARNING', 'ERROR'], default='INFO', help='Minimum level written to the log (optional)')
+    parser.add_argument('--log-format', choices=['text', 'json'], default='text', help='Format of the log file (optional)')
+
+    args = parser.parse_args(sys.argv[2:])
+
+    replay(args.archive, args.platform, args.workers, args.records, args.latest,
+           {'log_level': args.log_level, 'log_format': args.log_format})
+
+elif __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Web data extraction tool.')
     parser.add_argument('url', help='A single URL or a .txt file with URLs (mandatory)')
     parser.add_argument('-r', '--root', default=None, help='Path to Firefox profile (optional)')
-    parser.add_argument('-p', '--platform', choices=['youtube', 'twitch', 'tiktok'], required=True, help='Platform to process (mandatory)')
+    parser.add_argument('-p', '--platform', choices=['youtube', 'twitch', 'tiktok', 'auto'], required=True, help='Platform to process, or auto to detect it for each URL (mandatory)')
+    parser.add_argument('-w', '--workers', type=int, default=1, help='Number of parallel Firefox processes for a .txt list (optional)')
+    parser.add_argument('--platform-workers', type=platform_values(int), default=None, help='Parallel Firefox processes of each platform with -p auto, such as youtube=3,tiktok=1 (optional)')
+    parser.add_argument('--snapshot', action='store_true', help='Extract YouTube data with a single injected script (optional)')
+    parser.add_argument('--records', action='store_true', help='Save YouTube comments as one record per comment (optional)')
+    parser.add_argument('--stream', action='store_true', help='Write YouTube comments to disk while scrolling (optional)')
+    parser.add_argument('--comment-capture', choices=['dom', 'network'], default='dom', help='Read YouTube comments from the page or from its network responses (optional)')
+    parser.add_argument('--max-comments', type=int, default=None, help='Stop scrolling YouTube comments at this number (optional)')
+    parser.add_argument('--lean', action='store_true', help='Run Firefox headless without media, images, fonts or trackers (optional)')
+    parser.add_argument('--recycle-pages', type=int, default=None, help='Restart the browser session after this number of pages (optional)')
+    parser.add_argument('--max-memory', type=float, default=None, help='Restart the browser session above this memory in MB (optional)')
+    parser.add_argument('--chat-format', choices=['csv', 'jsonl'], default='csv', help='Format of the Twitch chat file (optional)')
+    parser.add_argument('--chat-capture', choices=['poll', 'observer'], default='poll', help='How the Twitch chat is captured (optional)')
+    parser.add_argument('--rotate-mb', type=float, default=None, help='Start a new Twitch chat file at this size in MB (optional)')
+    parser.add_argument('--rotate-hourly', action='store_true', help='Start a new Twitch chat file every hour (optional)')
+    parser.add_argument('--sample-interval', type=float, default=30, help='Seconds between samples of the Twitch viewers and live time (optional)')
+    parser.add_argument('--transport', choices=['browser', 'irc'], default='browser', help='Read the Twitch chat with Firefox or over IRC without a browser (optional)')
+    parser.add_argument('--irc-server', default=None, help='Twitch IRC server as ircs://host:port or irc://host:port (optional)')
+    parser.add_argument('--dedupe-window', type=float, default=120, help='Seconds a Twitch message is remembered to skip repetitions (optional)')
+    parser.add_argument('--unattended', action='store_true', help='Run TikTok without console prompts (optional)')
+    parser.add_argument('--target-comments', type=int, default=None, help='Stop TikTok once this number of comments is extracted (optional)')
+    parser.add_argument('--max-stalls', type=int, default=None, help='Stop TikTok after this number of passes without new comments (optional)')
+    parser.add_argument('--time-budget', type=float, default=None, help='Stop TikTok after this number of seconds (optional)')
+    parser.add_argument('--rate', type=float, default=None, help='Page loads and scrolls per second for the platform, or for each platform with -p auto (optional)')
+    parser.add_argument('--platform-rates', type=platform_values(float), default=None, help='Page loads and scrolls per second of each platform, such as tiktok=0.5 (optional)')
+    parser.add_argument('--jitter', type=float, default=None, help='Random extra wait as a fraction of the interval between actions (optional)')
+    parser.add_argument('--resume', action='store_true', help='Skip the URLs already processed by a previous run (optional)')
+    parser.add_argument('--retries', type=int, default=2, help='Retries of a failed URL, with an exponential backoff (optional)')
+    parser.add_argument('--archive', nargs='?', const=DEFAULT_ARCHIVE_PATH, default=None, help='Keep a compressed snapshot of each YouTube and TikTok page, to replay it later (optional)')
+    parser.add_argument('--cache-ttl', type=float, default=None, help='Skip YouTube and TikTok videos extracted less than this number of hours ago (optional)')
+    parser.add_argument('--jobs', default=None, help='Path of the SQLite job store (optional)')
+    parser.add_argument('--metrics', default=None, help='Folder of the stage timing metrics, Prometheus text and JSON (optional)')
+    parser.add_argument('--log-level', choices=['INFO', 'OK', 'WARNING', 'ERROR'], default='INFO', help='Minimum level written to the log (optional)')
+    parser.add_argument('--log-format', choices=['text', 'json'], default='text', help='Format of the log file (optional)')
 
     args = parser.parse_args()
 
-    main(args.url, args.root, args.platform)
+    options = {
+        'snapshot': args.snapshot,
+        'records': args.records,
+        'stream': args.stream,
+        'comment_capture': args.comment_capture,
+        'max_comments': args.max_comments,
+        'lean': args.lean,
+        'recycle_pages': args.recycle_pages,
+        'max_memory': args.max_memory,
+        'chat_format': args.chat_format,
+        'chat_capture': args.chat_capture,
+        'rotate_mb': args.rotate_mb,
+        'rotate_hourly': args.rotate_hourly,
+        'dedupe_window': args.dedupe_window,
+        'sample_interval': args.sample_interval,
+        'transport': args.transport,
+        'irc_server': args.irc_server,
+        'unattended': args.unattended,
+        'target_comments': args.target_comments,
+        'max_stalls': args.max_stalls,
+        'time_budget': args.time_budget,
+        'rate': args.rate,
+        'platform_rates': args.platform_rates,
+        'platform_workers': args.platform_workers,
+        'jitter': args.jitter,
+        'resume': args.resume,
+        'retries': args.retries,
+        'archive': args.archive,
+        'cache_ttl': args.cache_ttl,
+        'jobs': args.jobs,
+        'metrics': args.metrics,
+        'log_level': args.log_level,
+        'log_format': args.log_format,
+    }
+
+    main(args.url, args.root, args.platform, args.workers, options)
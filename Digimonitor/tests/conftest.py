@@ -0,0 +1,35 @@
+# Digimonitor is part of the DIGIBOOK collection.
+# DIGIBOOK Copyright (C) 2024 Daniel Alcalá.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.files import actions as files_actions
+
+
+@pytest.fixture(autouse=True)
+def log_file(tmp_path, monkeypatch):
+    """
+    Writes the log of each test to its own temporary file instead of 'logs/log.txt'.
+    """
+    path = tmp_path / 'log.txt'
+    monkeypatch.setattr(files_actions, 'LOG_FILE_PATH', str(path))
+    yield path
+    files_actions.FlushLogs()
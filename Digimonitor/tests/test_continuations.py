@@ -0,0 +1,65 @@
+# Digimonitor is part of the DIGIBOOK collection.
+# DIGIBOOK Copyright (C) 2024 Daniel Alcalá.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import json
+import os
+from app.services.utils.continuations import ParseCommentContinuation, ParseCommentResponses
+
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), 'data')
+
+
+def read_body(name: str) -> str:
+    with open(os.path.join(DATA_PATH, name), encoding='utf-8') as file:
+        return file.read()
+
+
+def test_renderer_layout():
+    records = ParseCommentResponses([read_body('youtubei_next_renderer.json')])
+    assert records == [
+        {'username': '@maria', 'text': 'Great video :hand-pink-waving:',
+         'emojis': ['https://yt3.ggpht.com/emoji=w48-h48'], 'n_like': '1.2K', 'n_response': '3 replies',
+         'date': '2 days ago'},
+        {'username': '@jon', 'text': 'First', 'emojis': [], 'n_like': '', 'n_response': None,
+         'date': '3 days ago (edited)'},
+    ]
+
+
+def test_entity_layout():
+    records = ParseCommentResponses([read_body('youtubei_next_entities.json')])
+    assert records == [
+        {'username': '@ana', 'text': 'Thanks for the tutorial ',
+         'emojis': ['https://yt3.ggpht.com/emoji2=w48-h48'], 'n_like': '87', 'n_response': '12 replies',
+         'date': '1 month ago'},
+        {'username': '@luis', 'text': 'No replies here', 'emojis': [], 'n_like': '', 'n_response': None,
+         'date': '1 month ago'},
+    ]
+
+
+def test_responses_of_a_video_in_several_calls():
+    renderer, entities = read_body('youtubei_next_renderer.json'), read_body('youtubei_next_entities.json')
+    seen = set()
+    first = ParseCommentResponses([")]}'\n" + renderer, 'not json', renderer], seen)
+    second = ParseCommentResponses([renderer, entities], seen)
+    assert [record['username'] for record in first] == ['@maria', '@jon']
+    assert [record['username'] for record in second] == ['@ana', '@luis']
+    assert seen == {'UgxA1', 'UgxB2', 'UgxC3', 'UgxD4'}
+
+
+def test_continuation_without_comments():
+    assert ParseCommentContinuation({'onResponseReceivedEndpoints': []}) == []
+    assert ParseCommentContinuation(json.loads('[]')) == []
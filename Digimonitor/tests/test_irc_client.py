@@ -0,0 +1,128 @@
+# Digimonitor is part of the DIGIBOOK collection.
+# DIGIBOOK Copyright (C) 2024 Daniel Alcalá.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import asyncio
+import pytest
+from app.services.irc.client import ChatSinkError, ParseIRCMessage, TwitchChannelFromURL, TwitchChatClient
+
+
+class StandInServer:
+    def __init__(self, lines: list):
+        """
+        A local stand-in of the Twitch chat server. It welcomes the client a moment after its
+        login, then sends `lines`. Every line received is recorded, and '<welcome>' marks when
+        the welcome was sent.
+        """
+        self.lines = lines
+        self.received = []
+        self.pong = asyncio.Event()
+        self.server = None
+
+    async def __aenter__(self):
+        self.server = await asyncio.start_server(self._client, '127.0.0.1', 0)
+        return self
+
+    async def __aexit__(self, *args):
+        self.server.close()
+        await self.server.wait_closed()
+
+    @property
+    def url(self) -> str:
+        return f'irc://127.0.0.1:{self.server.sockets[0].getsockname()[1]}'
+
+    async def _client(self, reader, writer):
+        try:
+            while True:
+                line = (await reader.readline()).decode('utf-8').rstrip('\r\n')
+                if not line:
+                    break
+                self.received.append(line)
+                if line.startswith('CAP '):
+                    # Welcomed later, while the lines that arrive in between are still read
+                    asyncio.ensure_future(self._welcome(writer))
+                elif line.startswith('PONG '):
+                    self.pong.set()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def _welcome(self, writer):
+        await asyncio.sleep(0.1)
+        self.received.append('<welcome>')
+        writer.write(b':tmi.twitch.tv 001 justinfan :Welcome, GLHF!\r\n')
+        writer.write(''.join(f'{item}\r\n' for item in self.lines).encode('utf-8'))
+        await writer.drain()
+
+
+def test_parse_irc_message_with_tags():
+    message = ParseIRCMessage(r'@badges=subscriber/12;display-name=Foo\sBar :foo!foo@foo.tmi.twitch.tv PRIVMSG #bar :Hi there')
+    assert message['tags'] == {'badges': 'subscriber/12', 'display-name': 'Foo Bar'}
+    assert message['prefix'] == 'foo!foo@foo.tmi.twitch.tv'
+    assert message['command'] == 'PRIVMSG'
+    assert message['params'] == ['#bar', 'Hi there']
+
+
+def test_twitch_channel_from_url():
+    assert TwitchChannelFromURL('https://www.twitch.tv/SomeChannel?x=1') == 'somechannel'
+
+
+def test_client_against_a_stand_in_server():
+    lines = [
+        'PING :tmi.twitch.tv',
+        '@display-name=Ana;badges=vip/1;tmi-sent-ts=1700000000000 :ana!ana@ana.tmi.twitch.tv PRIVMSG #chan :hola',
+        ':bob!bob@bob.tmi.twitch.tv PRIVMSG #chan :\x01ACTION waves\x01',
+    ]
+    messages = []
+
+    async def scenario():
+        async with StandInServer(lines) as server:
+            client = TwitchChatClient(['#Chan'], lambda channel, message: messages.append((channel, message)),
+                                      server=server.url)
+            task = asyncio.ensure_future(client.Run())
+            for _ in range(100):
+                if len(messages) == 2 and server.pong.is_set():
+                    break
+                await asyncio.sleep(0.02)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            return server.received
+
+    received = asyncio.run(scenario())
+    commands = [line.split(' ')[0] for line in received]
+    assert commands[:4] == ['PASS', 'NICK', 'CAP', '<welcome>']
+    # The channels are only joined once the server has welcomed the client
+    assert received.index('JOIN #chan') > received.index('<welcome>')
+    assert 'PONG :tmi.twitch.tv' in received
+    assert messages[0] == ('chan', {'username': 'Ana', 'comment': 'hola', 'badges': 'vip/1',
+                                    'timestamp_client': '2023-11-14T22:13:20+00:00'})
+    assert messages[1] == ('chan', {'username': 'bob', 'comment': 'waves', 'badges': None,
+                                    'timestamp_client': None})
+
+
+def test_client_stops_when_a_message_cannot_be_saved():
+    def save(channel, message):
+        raise PermissionError('read-only folder')
+
+    async def scenario():
+        async with StandInServer([':ana!ana@ana.tmi.twitch.tv PRIVMSG #chan :hola']) as server:
+            client = TwitchChatClient(['chan'], save, server=server.url)
+            await asyncio.wait_for(client.Run(), 5)
+
+    with pytest.raises(ChatSinkError):
+        asyncio.run(scenario())
@@ -0,0 +1,99 @@
+# Digimonitor is part of the DIGIBOOK collection.
+# DIGIBOOK Copyright (C) 2024 Daniel Alcalá.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import pytest
+from selenium.common.exceptions import WebDriverException
+from app.services.selenium.driver import pool as pool_module
+from app.services.selenium.driver.pool import DriverPool
+
+
+class FakeDriver:
+    def __init__(self, events: list, fail_start: bool = False):
+        self.events = events
+        self.fail_start = fail_start
+        self.name = None
+
+    def StartDriver(self):
+        if self.fail_start:
+            raise WebDriverException('no browser')
+        self.name = f'driver {sum(1 for event in self.events if event.startswith("start")) + 1}'
+        self.events.append(f'start {self.name}')
+
+    def StopDriver(self):
+        self.events.append(f'stop {self.name}')
+
+
+def make_pool(events: list, failures: list = None, **kwargs) -> DriverPool:
+    failures = list(failures or [])
+    return DriverPool(lambda: FakeDriver(events, fail_start=bool(failures and failures.pop(0))), **kwargs)
+
+
+def test_interrupted_run_stops_the_session_in_use():
+    events = []
+    pool = make_pool(events)
+    pool.Start()
+
+    def interrupted(driver):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        pool.Run(interrupted)
+    pool.Stop()
+    assert events == ['start driver 1', 'stop driver 1']
+
+
+def test_stop_quits_the_sessions_still_in_use():
+    events = []
+    pool = make_pool(events)
+    pool.Start()
+    pool.Acquire()
+    pool.Stop()
+    assert events == ['start driver 1', 'stop driver 1']
+
+
+def test_crash_is_retried_on_a_fresh_session():
+    events = []
+    pool = make_pool(events)
+    pool.Start()
+    calls = []
+
+    def crash_once(driver):
+        calls.append(driver.name)
+        if len(calls) == 1:
+            raise WebDriverException('crashed')
+        return 'done'
+
+    assert pool.Run(crash_once) == 'done'
+    pool.Stop()
+    assert calls == ['driver 1', 'driver 2']
+    assert events.index('stop driver 1') < events.index('start driver 2')
+
+
+def test_failed_replacement_is_started_again_by_the_next_acquire(monkeypatch):
+    monkeypatch.setattr(pool_module, 'ACQUIRE_TIMEOUT', 0.5)
+    events = []
+    # The first session starts, its replacement fails twice and then starts
+    pool = make_pool(events, failures=[False, True, True, False])
+    pool.Start()
+
+    def crash(driver):
+        raise WebDriverException('crashed')
+
+    with pytest.raises(WebDriverException):
+        pool.Run(crash, retries=1)
+    assert pool.Run(lambda driver: driver.name) == 'driver 2'
+    pool.Stop()